@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ShopSphere.settings')
 
 application = get_asgi_application()
+
+# Build the search autocomplete index before the first keystroke needs it
+from user import autocomplete  # noqa: E402
+
+autocomplete.warm_in_background()
@@ -0,0 +1,101 @@
+"""
+In-memory write buffer shared by the batched writers (agent location pings,
+product views).
+
+``WriteBuffer`` queues items and hands them to ``write(items)`` in one call
+once ``batch_size`` items are pending or the oldest pending item is
+``flush_interval`` seconds old. The rules every writer relies on:
+
+* A flush never runs inside the caller's transaction. When the calling
+  thread is in an ``atomic`` block the flush is deferred with
+  ``transaction.on_commit``, so a request that rolls back cannot take other
+  requests' buffered rows with it; if it does roll back, the items simply
+  stay queued for the next flush.
+* A failed write puts its items back at the front of the queue and is
+  logged, never raised: the request that happened to trigger the flush
+  still gets its response, and the rows are retried one flush_interval
+  later. At most ``max_pending`` items are kept while the database is
+  unreachable; the oldest are dropped beyond that.
+* Flushes are serialised, and the queue is flushed at interpreter exit
+  when ``atexit=True``.
+"""
+
+import atexit as atexit_module
+import logging
+import threading
+import time
+
+from django.db import transaction
+
+
+logger = logging.getLogger('shopsphere.buffers')
+
+
+class WriteBuffer:
+    """Thread-safe queue of items written in batches by ``write(items)``"""
+
+    def __init__(self, write, batch_size, flush_interval, max_pending=None, label='items', using=None,
+                 atexit=False):
+        self.write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending or batch_size * 20
+        self.label = label
+        self.using = using
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._items = []
+        self._last_flush = time.monotonic()
+        if atexit:
+            atexit_module.register(self.flush)
+
+    def __len__(self):
+        return len(self._items)
+
+    def pending(self):
+        """Copy of the queued items, oldest first"""
+        with self._lock:
+            return list(self._items)
+
+    def add(self, item):
+        with self._lock:
+            self._items.append(item)
+            pending = len(self._items)
+        if pending >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if self._items and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write every pending item; returns how many were written"""
+        if not self._items:
+            return 0
+        if transaction.get_connection(self.using).in_atomic_block:
+            transaction.on_commit(self.flush, using=self.using)
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                items, self._items = self._items, []
+                self._last_flush = time.monotonic()
+            if not items:
+                return 0
+            try:
+                self.write(items)
+            except Exception:
+                logger.exception("Failed to write %d buffered %s; keeping them for the next flush",
+                                 len(items), self.label)
+                self._restore(items)
+                return 0
+            return len(items)
+
+    def _restore(self, items):
+        with self._lock:
+            self._items[:0] = items
+            overflow = len(self._items) - self.max_pending
+            if overflow > 0:
+                del self._items[:overflow]
+                logger.error("Dropped the %d oldest buffered %s", overflow, self.label)
@@ -0,0 +1,98 @@
+"""
+Sparse fieldsets and opt-in expansion for DRF serializers.
+
+Serializers that mix in ``SparseFieldsetMixin`` honour two query parameters
+on the request found in their context:
+
+* ``?fields=id,shop_name`` keeps only the listed top-level fields
+* ``?expand=user,approval_logs`` switches on fields declared in
+  ``Meta.expandable_fields``; without it they are left out (or, for names
+  that are also plain model fields, rendered in their flat form, e.g. a pk)
+
+``Meta.expandable_fields`` maps a field name to ``(field_class, kwargs)``.
+``optimize_queryset`` then rebuilds ``select_related``/``prefetch_related``
+from the fields that are actually going to be rendered.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def parse_field_list(value):
+    """Split a comma separated query parameter into a set of names"""
+    if not value:
+        return set()
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+class SparseFieldsetMixin:
+    """Prune serializer fields from ?fields= and opt into ?expand= fields"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if request is not None:
+            if fields is None:
+                fields = parse_field_list(request.query_params.get('fields'))
+            if expand is None:
+                expand = parse_field_list(request.query_params.get('expand'))
+        fields = set(fields or ())
+        expand = set(expand or ())
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        meta_fields = getattr(self.Meta, 'fields', ())
+        if not isinstance(meta_fields, (list, tuple)):
+            meta_fields = ()
+        for name, (field_class, field_kwargs) in expandable.items():
+            if name in expand:
+                self.fields[name] = field_class(**field_kwargs)
+            elif name not in meta_fields:
+                self.fields.pop(name, None)
+
+        if fields:
+            allowed = fields | (expand & set(expandable))
+            for name in list(self.fields):
+                if name not in allowed:
+                    self.fields.pop(name)
+
+    @classmethod
+    def optimize_for(cls, queryset, context):
+        """Optimise ``queryset`` for the shape requested in ``context['request']``"""
+        return cls(context=context).optimize_queryset(queryset)
+
+    def optimize_queryset(self, queryset):
+        """Replace the queryset's joins with exactly those the rendered fields need"""
+        select, prefetch = set(), set()
+        for field in self.fields.values():
+            if field.source == '*':
+                continue
+            # A bare foreign key rendered as its pk needs no join
+            if isinstance(field, serializers.RelatedField) and '.' not in field.source:
+                continue
+            model = queryset.model
+            path = []
+            for part in field.source.split('.'):
+                try:
+                    model_field = model._meta.get_field(part)
+                except FieldDoesNotExist:
+                    break
+                if not model_field.is_relation:
+                    break
+                path.append(part)
+                if model_field.many_to_many or model_field.one_to_many:
+                    prefetch.add('__'.join(path))
+                    path = []
+                    break
+                model = model_field.related_model
+            if path:
+                select.add('__'.join(path))
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        return queryset
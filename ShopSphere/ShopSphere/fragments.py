@@ -0,0 +1,106 @@
+"""
+Per-row template fragment caching.
+
+``{% fragment name obj [batch] %} ... {% endfragment %}`` caches the
+rendered body under ``fragment:<name>:<obj.pk>:<obj.updated_at>``. Saving a
+row through the ORM bumps ``updated_at`` (auto_now), so an edited row gets
+a fresh key and the old one ages out after TEMPLATE_FRAGMENTS['TIMEOUT'].
+Changes that keep ``updated_at`` (``save(update_fields=...)`` without it,
+deletes) are covered by the post_save / post_delete receivers calling
+``invalidate``.
+
+Pass the loop's iterable as ``batch`` and the first fragment of the loop
+fetches every row's fragment with one ``get_many``, so a warm 500-row table
+costs one cache round trip plus string concatenation. Only rows that
+missed are rendered and stored.
+
+    {% load fragments %}
+    {% for product in products %}
+      {% fragment 'product_card' product products %} ... {% endfragment %}
+    {% endfor %}
+
+The body must depend only on the row: nothing per user or per request
+(CSRF tokens included) may go inside.
+
+Fragments are stored in the TEMPLATE_FRAGMENTS['CACHE'] alias, kept apart
+from the default cache so rendering a long table cannot cull its keys.
+
+The library is registered in TEMPLATES['OPTIONS']['libraries'].
+"""
+
+from django import template
+from django.conf import settings
+from django.core.cache import caches
+
+register = template.Library()
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+PRODUCT_CARD = 'product_card'
+VENDOR_PRODUCT_CARD = 'vendor_product_card'
+VENDOR_ROW = 'vendor_row'
+
+
+def get_config():
+    """Return TEMPLATE_FRAGMENTS settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'TEMPLATE_FRAGMENTS', {}))
+    return config
+
+
+def fragment_key(name, obj):
+    updated_at = getattr(obj, 'updated_at', None)
+    stamp = f"{updated_at.timestamp():.6f}" if updated_at is not None else '-'
+    return f"fragment:{name}:{obj.pk}:{stamp}"
+
+
+def invalidate(name, obj):
+    """Drop the fragment cached for the row as it is now"""
+    caches[get_config()['CACHE']].delete(fragment_key(name, obj))
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, obj, batch):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+        self.batch = batch
+
+    def _prefetched(self, context, name, batch, cache):
+        """The batch's cached fragments, fetched once per template render"""
+        slot = (self, name, id(batch))
+        found = context.render_context.get(slot)
+        if found is None:
+            found = cache.get_many([fragment_key(name, row) for row in batch])
+            context.render_context[slot] = found
+        return found
+
+    def render(self, context):
+        config = get_config()
+        cache = caches[config['CACHE']]
+        name = self.name.resolve(context)
+        obj = self.obj.resolve(context)
+        key = fragment_key(name, obj)
+        batch = self.batch.resolve(context) if self.batch is not None else None
+        if batch is not None:
+            html = self._prefetched(context, name, batch, cache).get(key)
+        else:
+            html = cache.get(key)
+        if html is None:
+            html = self.nodelist.render(context)
+            cache.set(key, html, config['TIMEOUT'])
+        return html
+
+
+@register.tag('fragment')
+def do_fragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) not in (3, 4):
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a name, a row and optionally the rows of the loop")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    batch = parser.compile_filter(bits[3]) if len(bits) == 4 else None
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]), batch)
@@ -0,0 +1,244 @@
+"""
+Serving uploaded media without tying up Python workers.
+
+MEDIA_URL is routed to the two views below instead of
+``django.conf.urls.static``:
+
+* ``serve_public`` - files under MEDIA_SERVING['PUBLIC_PREFIXES'] (product
+  images). Sent with ``Cache-Control: public, max-age=<PUBLIC_MAX_AGE>,
+  immutable``: the file storage never overwrites a name, a new upload gets
+  a new name and so a new URL.
+* ``serve_private`` - KYC documents under PRIVATE_PREFIXES. Their model
+  fields use ``private_storage``, whose ``url()`` is
+  ``/media/private/<name>?token=<timestamp:signature>``, valid for
+  SIGNED_URL_MAX_AGE seconds, so templates, serializers and the admin keep
+  using ``.url``. Sent with ``Cache-Control: private, no-store``.
+
+Django only decides whether and how a file may be sent. SENDFILE picks who
+sends the bytes:
+
+    'nginx'   X-Accel-Redirect to ACCEL_PREFIX + name, e.g.
+                  location /protected-media/ { internal; alias /srv/shopsphere/media/; }
+    'apache'  X-Sendfile with the absolute path (mod_xsendfile)
+    None      FileResponse, which uses the server's wsgi.file_wrapper
+              (sendfile) for whole files. Single byte ranges get 206
+              responses, and ETag / Last-Modified allow 304s.
+
+A front server can also serve PUBLIC_PREFIXES straight from MEDIA_ROOT, in
+which case those requests never reach Django at all.
+"""
+
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+
+DEFAULTS = {
+    'SENDFILE': None,
+    'ACCEL_PREFIX': '/protected-media/',
+    'PUBLIC_PREFIXES': ('products/',),
+    'PRIVATE_PREFIXES': ('vendor_docs/', 'pan_cards/'),
+    'PUBLIC_MAX_AGE': 60 * 60 * 24 * 365,
+    'SIGNED_URL_MAX_AGE': 60 * 10,
+    'CHUNK_SIZE': 64 * 1024,
+}
+
+SIGNING_SALT = 'ShopSphere.media'
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_config():
+    """Return MEDIA_SERVING settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'MEDIA_SERVING', {}))
+    return config
+
+
+# ============================================================================
+# SIGNED URLS FOR PRIVATE FILES
+# ============================================================================
+
+def _signer():
+    return signing.TimestampSigner(salt=SIGNING_SALT)
+
+
+def signed_url(name):
+    """Expiring URL of a private media file"""
+    token = _signer().sign(name)[len(name) + 1:]
+    return f"{reverse('private_media', args=[name])}?{urlencode({'token': token})}"
+
+
+def check_token(name, token, max_age=None):
+    try:
+        _signer().unsign(f"{name}:{token}", max_age=max_age or get_config()['SIGNED_URL_MAX_AGE'])
+    except signing.BadSignature:
+        return False
+    return True
+
+
+class PrivateMediaStorage(FileSystemStorage):
+    """MEDIA_ROOT storage whose URLs are signed and expire"""
+
+    def url(self, name):
+        return signed_url(name)
+
+
+def private_storage():
+    return PrivateMediaStorage()
+
+
+# ============================================================================
+# SENDING FILES
+# ============================================================================
+
+def _resolve(name):
+    """Absolute path of a media name; 404 for anything outside MEDIA_ROOT"""
+    try:
+        return safe_join(settings.MEDIA_ROOT, name)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404("Not found")
+
+
+def _normalized(path):
+    """The media name a URL path stands for; '..' may not climb out of a prefix"""
+    name = posixpath.normpath(path).lstrip('/')
+    if name.startswith('..'):
+        raise Http404("Not found")
+    return name
+
+
+def _content_type(name):
+    content_type, encoding = mimetypes.guess_type(name)
+    return 'application/octet-stream' if encoding or not content_type else content_type
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = parse_etags(if_none_match)
+        return tags == ['*'] or etag in tags
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since'))
+    return since is not None and int(mtime) <= since
+
+
+def byte_range(request, size, etag, last_modified):
+    """
+    (start, end) of a single satisfiable ``Range``, inclusive; None to send
+    the whole file (no range, multiple or malformed ranges, stale
+    If-Range); False when the range cannot be satisfied.
+    """
+    header = request.headers.get('Range')
+    if not header:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range is not None and if_range not in (etag, last_modified):
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            return False
+        start, end = max(size - suffix, 0), size - 1
+    if start >= size:
+        return False
+    return start, end
+
+
+def _read_range(fh, start, length, chunk_size):
+    try:
+        fh.seek(start)
+        while length > 0:
+            data = fh.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        fh.close()
+
+
+def _file_response(request, name, config, filename=None):
+    path = _resolve(name)
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("Not found")
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = http_date(stat.st_mtime)
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        requested = byte_range(request, stat.st_size, etag, last_modified)
+        if requested is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif requested is None:
+            response = FileResponse(open(path, 'rb'), content_type=_content_type(name), filename=filename or '')
+        else:
+            start, end = requested
+            response = StreamingHttpResponse(
+                _read_range(open(path, 'rb'), start, end - start + 1, config['CHUNK_SIZE']),
+                status=206, content_type=_content_type(name))
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = end - start + 1
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _send(request, name, config, cache_control, filename=None):
+    path = _resolve(name)
+    if config['SENDFILE'] == 'nginx':
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response = HttpResponse(content_type=_content_type(name))
+        response['X-Accel-Redirect'] = quote(config['ACCEL_PREFIX'] + relative)
+    elif config['SENDFILE'] == 'apache':
+        response = HttpResponse(content_type=_content_type(name))
+        response['X-Sendfile'] = path
+    else:
+        response = _file_response(request, name, config, filename)
+    if filename and config['SENDFILE']:
+        response['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(filename)}"
+    response['Cache-Control'] = cache_control
+    return response
+
+
+@require_safe
+def serve_public(request, path):
+    config = get_config()
+    path = _normalized(path)
+    if not path.startswith(tuple(config['PUBLIC_PREFIXES'])):
+        raise Http404("Not found")
+    return _send(request, path, config, f"public, max-age={config['PUBLIC_MAX_AGE']}, immutable")
+
+
+@require_safe
+def serve_private(request, path):
+    config = get_config()
+    path = _normalized(path)
+    if not path.startswith(tuple(config['PRIVATE_PREFIXES'])):
+        raise Http404("Not found")
+    if not check_token(path, request.GET.get('token', ''), config['SIGNED_URL_MAX_AGE']):
+        raise PermissionDenied("This link is invalid or has expired")
+    return _send(request, path, config, 'private, no-store', filename=os.path.basename(path))
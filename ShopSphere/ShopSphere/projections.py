@@ -0,0 +1,106 @@
+"""
+Read-only serialization fast path for high-volume list endpoints.
+
+``ValuesProjection`` takes an existing ``ModelSerializer`` class and compiles
+its readable fields into a single ``values_list()`` query plus a per-column
+converter, so list endpoints produce the same JSON shape without building a
+model instance (or a serializer field bind) per row:
+
+* ``source='vendor.shop_name'`` becomes the join lookup ``vendor__shop_name``
+* ``source='get_status_display'`` reads ``status`` and maps it through a
+  label dict precomputed from the model field's choices
+* decimals, datetimes and files are rendered with the same rules DRF uses
+
+Only flat fields are supported; nested serializers and method fields raise
+``ImproperlyConfigured`` when the projection is built.
+"""
+
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+
+
+_DISPLAY_RE = re.compile(r'^(?:(?P<path>.+)\.)?get_(?P<field>\w+)_display$')
+
+# Field types whose ``to_representation`` is an identity for values coming
+# straight from the database driver.
+_PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.FloatField,
+    serializers.RelatedField,
+)
+
+
+def _resolve_model_field(model, lookup):
+    """Follow a ``__`` lookup across relations and return the final model field"""
+    parts = lookup.split('__')
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).related_model
+    return model._meta.get_field(parts[-1])
+
+
+class ValuesProjection:
+    """Compile a flat ModelSerializer into a values_list() based serializer"""
+
+    def __init__(self, serializer_class, context=None):
+        serializer = serializer_class(context=context or {})
+        self.model = serializer.Meta.model
+        self.request = serializer.context.get('request')
+        self.columns = []
+        self.plan = []
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            lookup, converter = self._compile(name, field)
+            self.plan.append((name, len(self.columns), converter))
+            self.columns.append(lookup)
+
+    def _compile(self, name, field):
+        if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)) \
+                or field.source == '*':
+            raise ImproperlyConfigured(
+                f"{self.model.__name__}.{name} cannot be projected with values()"
+            )
+
+        display = _DISPLAY_RE.match(field.source)
+        if display:
+            path = display.group('path')
+            lookup = f"{path.replace('.', '__')}__{display.group('field')}" if path else display.group('field')
+            labels = {
+                key: str(label)
+                for key, label in _resolve_model_field(self.model, lookup).flatchoices
+            }
+            return lookup, lambda value, labels=labels: labels.get(value, value)
+
+        lookup = field.source.replace('.', '__')
+        if isinstance(field, serializers.FileField):
+            storage = _resolve_model_field(self.model, lookup).storage
+            return lookup, lambda name, storage=storage: self._file_url(storage, name)
+        if isinstance(field, _PASSTHROUGH_FIELDS):
+            return lookup, None
+        return lookup, field.to_representation
+
+    def _file_url(self, storage, name):
+        if not name:
+            return None
+        url = storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    def serialize(self, queryset):
+        """Return the serialized rows of ``queryset`` as a list of dicts"""
+        plan = self.plan
+        rows = queryset.values_list(*self.columns)
+        return [
+            {
+                name: (value if converter is None or value is None else converter(value))
+                for name, index, converter in plan
+                for value in (row[index],)
+            }
+            for row in rows
+        ]
@@ -0,0 +1,108 @@
+"""
+Drop-in JSON renderer and parser for the REST API.
+
+``FastJSONRenderer`` encodes with orjson when it is installed: one C call
+per response, with datetimes, dates, UUIDs and NumPy values handled
+natively and only Decimal, lazy strings and DRF's odd types going through
+``default``. Without orjson it falls back to the standard library's C
+encoder with the same ``default``, which skips DRF's JSONEncoder class
+machinery. Either way the bytes match ``rest_framework.renderers.JSONRenderer``
+for the compact output the API uses: UTC datetimes end in 'Z', Decimals
+become numbers, U+2028/U+2029 are escaped. Requests for indented output
+(``Accept: application/json; indent=4``) and settings the fast path does not
+cover (UNICODE_JSON / COMPACT_JSON off) are handed to DRF's renderer.
+
+``FastJSONParser`` parses request bodies with orjson and falls back to
+DRF's JSONParser.
+"""
+
+import datetime
+import decimal
+import json
+import uuid
+
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """Types neither encoder knows, converted the way DRF's JSONEncoder does"""
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, datetime.datetime):
+        representation = obj.isoformat()
+        return representation[:-6] + 'Z' if representation.endswith('+00:00') else representation
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, QuerySet):
+        return tuple(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__getitem__'):
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            pass
+    if hasattr(obj, '__iter__'):
+        return tuple(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_stdlib(data):
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':'),
+                      allow_nan=not api_settings.STRICT_JSON).encode()
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(data):
+        return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS)
+else:
+    dumps = dumps_stdlib
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer with a single-call encoder; see the module docstring"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (self.get_indent(accepted_media_type, renderer_context or {})
+                or not (self.ensure_ascii is False and self.compact)):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = dumps(data)
+        # Same as DRF: keep the output safe to embed in a <script> block
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
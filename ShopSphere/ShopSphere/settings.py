@@ -55,27 +55,38 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'ShopSphere.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'superAdmin.middleware.QueryLogMiddleware',
+    'superAdmin.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'ShopSphere.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates are kept in memory; under runserver the autoreloader resets them when a template changes
+            'loaders': [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
+            # {% fragment %} per-row caching, see ShopSphere/fragments.py
+            'libraries': {'fragments': 'ShopSphere.fragments'},
         },
     },
 ]
@@ -94,6 +105,25 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Per-process LocMem for development. Production needs a shared backend (Redis, Memcached) for
+# 'default': the flash-sale queue and the cache version keys live there (see user/checks.py).
+# Template fragments get their own alias so a full page of rows cannot cull the other keys.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -146,6 +176,17 @@ EMAIL_SSL_KEYFILE = None
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# How MEDIA_URL is served (see ShopSphere/media.py). Behind nginx set 'SENDFILE': 'nginx' and map
+# ACCEL_PREFIX to MEDIA_ROOT in an internal location; 'apache' uses mod_xsendfile.
+MEDIA_SERVING = {
+    'SENDFILE': None,
+    'ACCEL_PREFIX': '/protected-media/',
+    'PUBLIC_PREFIXES': ('products/',),
+    'PRIVATE_PREFIXES': ('vendor_docs/', 'pan_cards/'),
+    'PUBLIC_MAX_AGE': 60 * 60 * 24 * 365,
+    'SIGNED_URL_MAX_AGE': 60 * 10,
+}
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -156,6 +197,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed when installed, see ShopSphere/renderers.py
+    'DEFAULT_RENDERER_CLASSES': [
+        'ShopSphere.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'ShopSphere.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
@@ -164,6 +215,13 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Response compression for JSON and text (see ShopSphere/compression.py); brotli needs the brotli package
+COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,
+}
+
 # CORS Configuration for Frontend Integration
 CORS_ALLOW_CREDENTIALS = True
 #CORS_ALLOW_ALL_ORIGINS = True
@@ -187,6 +245,8 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
+    'admission-token',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -206,4 +266,175 @@ SIMPLE_JWT = {
 }
 
 # Disable automatic trailing slash append
-APPEND_SLASH = False
\ No newline at end of file
+APPEND_SLASH = False
+
+# Slow-query log (see superAdmin/querylog.py, dump with `manage.py querylog_top`)
+QUERYLOG = {
+    'ENABLED': True,
+    'SLOW_MS': 100,
+    'MAX_FINGERPRINTS': 500,
+    'MAX_VIEW_FINGERPRINTS': 2000,
+    'RECENT_SLOW': 200,
+    'SNAPSHOT_DIR': BASE_DIR / 'var' / 'querylog',
+    'SNAPSHOT_INTERVAL': 30,
+    'SNAPSHOT_RETENTION': 60 * 60,
+}
+
+# Opt-in request profiler (see superAdmin/profiling.py)
+# SAMPLE_RATES maps URL names to the fraction of requests to profile, e.g. {'home': 0.01}
+PROFILING = {
+    'ENABLED': True,
+    'MODE': 'sampler',
+    'SAMPLE_INTERVAL': 0.005,
+    'SAMPLE_RATES': {},
+    'HEADER': 'X-Profile',
+    'QUERY_PARAM': '_profile',
+    'TOKEN_MAX_AGE': 60 * 60,
+    'DIRECTORY': BASE_DIR / 'var' / 'profiles',
+    'MAX_FILES': 200,
+    'MAX_BYTES': 200 * 1024 * 1024,
+}
+
+# Approval audit log detail-page bound and retention (see superAdmin/auditlog.py)
+AUDIT_LOG = {
+    'DETAIL_LIMIT': 20,
+    'PAGE_SIZE': 50,
+    'RETENTION_MONTHS': 24,
+}
+
+# Price bands (low, high) for catalog facets; high=None means open-ended
+CATALOG_PRICE_BANDS = [(0, 500), (500, 1000), (1000, 5000), (5000, None)]
+
+# Delivery dispatch (see deliveryAgent/assignment.py, run `manage.py dispatch_orders`)
+DELIVERY = {
+    'VEHICLE_CAPACITY': {'bike': 5, 'van': 20, 'truck': 50},
+    'DEFAULT_CAPACITY': 5,
+    'MIN_PREFIX': 3,
+    'BATCH_SIZE': 5000,
+    'TICK_SECONDS': 5,
+    # Unassignable orders are retried after RETRY_BASE_SECONDS, doubling up to RETRY_MAX_SECONDS
+    'RETRY_BASE_SECONDS': 60,
+    'RETRY_MAX_SECONDS': 60 * 30,
+    # CSV of pincode,latitude,longitude used for stop ordering; None uses the bundled sample
+    'PINCODE_CENTROIDS_FILE': None,
+}
+
+# Live agent tracking: ring size per agent, track downsampling and batch writes (see deliveryAgent/tracking.py)
+TRACKING = {
+    'RING_SIZE': 120,
+    'PERSIST_INTERVAL': 30,
+    'PERSIST_DISTANCE': 100,
+    'FLUSH_INTERVAL': 10,
+    'BATCH_SIZE': 1000,
+    # Pings more than MAX_CLOCK_SKEW seconds ahead or MAX_PING_AGE seconds behind the server clock are rejected
+    'MAX_CLOCK_SKEW': 300,
+    'MAX_PING_AGE': 60 * 60,
+}
+
+# Order status push over server-sent events (see user/events.py; needs the ASGI app, e.g. uvicorn ShopSphere.asgi:application)
+ORDER_EVENTS = {
+    'POLL_INTERVAL': 1.0,
+    'KEEPALIVE': 15,
+    'QUEUE_SIZE': 32,
+    'BACKLOG_LIMIT': 100,
+    'RETRY_MS': 3000,
+}
+
+# Domain event outbox (see superAdmin/outbox.py, run `manage.py dispatch_outbox`)
+OUTBOX = {
+    'BATCH_SIZE': 200,
+    'TICK_SECONDS': 1,
+    'LEASE_SECONDS': 60,
+    'MAX_ATTEMPTS': 8,
+    'RETRY_BASE_SECONDS': 5,
+    'RETENTION_DAYS': 7,
+}
+
+# Database-backed background jobs (see superAdmin/jobs.py, run `manage.py run_jobs`)
+JOBS = {
+    'THREADS': 4,
+    'PROCESSES': 1,
+    'BATCH_SIZE': 20,
+    'POLL_SECONDS': 1,
+    'LEASE_SECONDS': 300,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BASE_SECONDS': 10,
+    'RETRY_MAX_SECONDS': 3600,
+    'RETENTION_DAYS': 7,
+    'STAGING_DIR': 'var/uploads',
+}
+
+# Idempotency-Key handling for payment/cart POSTs (see user/idempotency.py)
+IDEMPOTENCY = {
+    'TTL': 60 * 60 * 24,
+    'LOCK_TIMEOUT': 30,
+    'WAIT_TIMEOUT': 10,
+    'PURGE_INTERVAL': 600,
+}
+
+# Limited-use coupon counters (see user/coupons.py; limits and shard counts live on Coupon rows)
+COUPONS = {
+    'RESERVATION_TTL': 900,
+}
+
+# Flash-sale waiting room (see user/waiting_room.py; rates live on FlashSale rows).
+# The queue is kept in the default cache, which must be shared between processes in production.
+FLASH_SALES = {
+    'PASS_HEADER': 'Admission-Token',
+    'POLL_SECONDS': 2,
+    'TICKET_TTL': 60 * 60,
+}
+
+# "Frequently bought together" tables (see user/recommendations.py, rebuild with `manage.py build_recommendations`)
+RECOMMENDATIONS = {
+    'DIRECTORY': BASE_DIR / 'var' / 'recommendations',
+    'TOP_K': 20,
+    'MIN_COUNT': 1,
+    'RELOAD_CHECK': 5,
+    # Also count each customer's product views of one day as a basket (full rebuilds only)
+    'INCLUDE_VIEWS': False,
+}
+
+# Search-box autocomplete (see user/autocomplete.py; built per process at startup)
+AUTOCOMPLETE = {
+    'MAX_NAME_LENGTH': 64,
+    'WORD_KEYS': 3,
+    'COMPACT_AT': 20000,
+    'CHANGE_LOG_TTL': 600,
+    'MAX_REPLAY': 200,
+    'MAX_CATCH_UP_ROWS': 5000,
+    'HOT_PREFIX_LENGTH': 2,
+    'WARM_ON_STARTUP': True,
+}
+
+# Memory-mapped storefront snapshot shared by all workers (see user/snapshot.py, `manage.py build_catalog_snapshot`)
+CATALOG_SNAPSHOT = {
+    'PATH': BASE_DIR / 'var' / 'catalog' / 'catalog.snap',
+    'RELOAD_CHECK': 1,
+    'REBUILD_DELAY': 1,
+}
+
+# Time-decayed popularity for "sort by popular" (see user/popularity.py, backfill with `manage.py score_popularity`)
+POPULARITY = {
+    'HALF_LIFE_DAYS': 7,
+    'ORDER_WEIGHT': 1.0,
+    'VIEW_WEIGHT': 0.05,
+    'BATCH_SIZE': 500,
+}
+
+# Per-customer recently viewed rings (see user/recently_viewed.py); views reach the database in batches
+RECENTLY_VIEWED = {
+    'RING_SIZE': 20,
+    'RING_TTL': 60 * 60 * 24 * 30,
+    'FLUSH_INTERVAL': 30,
+    'BATCH_SIZE': 1000,
+}
+
+# Cached per-row template fragments (see ShopSphere/fragments.py)
+TEMPLATE_FRAGMENTS = {
+    'CACHE': 'fragments',
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+# Seconds between checks of the tables behind per-process caches (pricing, facets, autocomplete; see ShopSphere/versions.py)
+TABLE_VERSION_INTERVAL = 5
@@ -0,0 +1,420 @@
+import decimal
+import gzip
+import os
+import tempfile
+import uuid
+import time
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from superAdmin.serializers import AdminProductListSerializer, AdminVendorListSerializer
+from user.models import Product as StorefrontProduct
+from user.serializers import ProductSerializer
+from vendor.models import Product, VendorProfile
+from vendor.serializers import ProductListSerializer
+from . import compression, fragments, media, renderers
+from .buffers import WriteBuffer
+from .projections import ValuesProjection
+
+
+class WriteBufferTests(SimpleTestCase):
+    def setUp(self):
+        self.written = []
+        self.fail = False
+
+    def _write(self, items):
+        if self.fail:
+            raise RuntimeError("database is down")
+        self.written.append(list(items))
+
+    def test_flushes_once_batch_is_full(self):
+        buffer = WriteBuffer(self._write, batch_size=3, flush_interval=3600)
+        for item in range(4):
+            buffer.add(item)
+        self.assertEqual(self.written, [[0, 1, 2]])
+        self.assertEqual(len(buffer), 1)
+
+    def test_flushes_when_interval_elapsed(self):
+        buffer = WriteBuffer(self._write, batch_size=100, flush_interval=0)
+        buffer.add('a')
+        self.assertEqual(self.written, [['a']])
+
+    def test_failed_write_keeps_items_in_order_and_does_not_raise(self):
+        buffer = WriteBuffer(self._write, batch_size=100, flush_interval=3600)
+        buffer.add(1)
+        buffer.add(2)
+        self.fail = True
+        with self.assertLogs('shopsphere.buffers', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        buffer.add(3)
+        self.fail = False
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(self.written, [[1, 2, 3]])
+
+    def test_max_pending_drops_oldest(self):
+        buffer = WriteBuffer(self._write, batch_size=100, flush_interval=3600, max_pending=2)
+        for item in range(3):
+            buffer.add(item)
+        self.fail = True
+        with self.assertLogs('shopsphere.buffers', 'ERROR'):
+            buffer.flush()
+        self.fail = False
+        buffer.flush()
+        self.assertEqual(self.written, [[1, 2]])
+
+
+class WriteBufferTransactionTests(TransactionTestCase):
+    def setUp(self):
+        self.written = []
+        self.buffer = WriteBuffer(self.written.extend, batch_size=100, flush_interval=3600)
+
+    def test_flush_waits_for_commit(self):
+        with transaction.atomic():
+            self.buffer.add('row')
+            self.assertEqual(self.buffer.flush(), 0)
+            self.assertEqual(self.written, [])
+        self.assertEqual(self.written, ['row'])
+
+    def test_rollback_keeps_items_queued(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.buffer.add('row')
+                self.buffer.flush()
+                raise ValueError
+        self.assertEqual(self.written, [])
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.written, ['row'])
+
+
+class FragmentTests(SimpleTestCase):
+    template = Template(
+        "{% load fragments %}{% for row in rows %}"
+        "{% fragment 'card' row rows %}[{{ row.label }}]{% endfragment %}"
+        "{% endfor %}"
+    )
+
+    def setUp(self):
+        self.cache = caches[fragments.get_config()['CACHE']]
+        self.cache.clear()
+        self.rendered = []
+        stamp = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.rows = [self._row(pk, stamp) for pk in range(1, 4)]
+
+    def _row(self, pk, updated_at):
+        row = SimpleNamespace(pk=pk, updated_at=updated_at)
+        row.label = lambda: self.rendered.append(row.pk) or f"row {row.pk}"
+        return row
+
+    def _render(self, template=None):
+        return (template or self.template).render(Context({'rows': self.rows}))
+
+    def test_dedicated_cache_is_configured(self):
+        self.assertEqual(fragments.get_config()['CACHE'], 'fragments')
+        self.assertIsNot(self.cache, caches['default'])
+
+    def test_warm_batch_is_one_get_many_and_no_render(self):
+        html = self._render()
+        self.assertEqual(html, "[row 1][row 2][row 3]")
+        self.assertEqual(self.rendered, [1, 2, 3])
+
+        self.rendered.clear()
+        with mock.patch.object(self.cache, 'get_many', wraps=self.cache.get_many) as get_many, \
+                mock.patch.object(self.cache, 'set', wraps=self.cache.set) as cache_set:
+            self.assertEqual(self._render(), html)
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(cache_set.call_count, 0)
+        self.assertEqual(self.rendered, [])
+
+    def test_only_missed_rows_are_rendered(self):
+        self._render()
+        self.rendered.clear()
+        fragments.invalidate('card', self.rows[0])
+        self.rows[2].updated_at += timedelta(seconds=1)
+        self.assertEqual(self._render(), "[row 1][row 2][row 3]")
+        self.assertEqual(self.rendered, [1, 3])
+
+    def test_without_a_batch_each_row_is_read_on_its_own(self):
+        template = Template(
+            "{% load fragments %}{% for row in rows %}"
+            "{% fragment 'card' row %}[{{ row.label }}]{% endfragment %}"
+            "{% endfor %}"
+        )
+        self._render(template)
+        self.rendered.clear()
+        with mock.patch.object(self.cache, 'get', wraps=self.cache.get) as get:
+            self._render(template)
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(self.rendered, [])
+
+
+class ValuesProjectionParityTests(TestCase):
+    """Every serializer served through ValuesProjection must produce Serializer(many=True).data"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for index, status in enumerate(['approved', 'pending', 'legacy']):
+            user = User.objects.create_user(f"vendor{index}", email=f"vendor{index}@example.com", password='x')
+            vendor = VendorProfile.objects.create(
+                user=user, shop_name=f"Shop {index}", shop_description='-', address='-', business_type='retail',
+                approval_status=status, is_blocked=index == 1)
+            Product.objects.create(vendor=vendor, name='Lamp', description='-', price='10.50', quantity=3)
+            Product.objects.create(vendor=vendor, name='Desk', description='-', price='1200.00', quantity=0,
+                                   status='inactive' if index else 'active', image='products/desk top.jpg')
+        StorefrontProduct.objects.create(name='Unlinked', price='5.00', image='products/a+b.png', stock=None)
+
+    def assertParity(self, serializer_class, queryset, context=None):
+        expected = [dict(row) for row in serializer_class(queryset, many=True, context=context or {}).data]
+        self.assertTrue(expected)
+        self.assertEqual(ValuesProjection(serializer_class, context=context).serialize(queryset), expected)
+
+    def _contexts(self):
+        yield None
+        yield {'request': Request(RequestFactory().get('/'))}
+
+    def test_admin_vendor_list(self):
+        # Nested user.email and approval status labels, including a value outside the choices
+        self.assertParity(AdminVendorListSerializer, VendorProfile.objects.order_by('id'))
+
+    def test_admin_product_list(self):
+        self.assertParity(AdminProductListSerializer, Product.objects.order_by('id'))
+
+    def test_vendor_product_list(self):
+        for context in self._contexts():
+            self.assertParity(ProductListSerializer, Product.objects.order_by('id'), context)
+
+    def test_storefront_products_and_snapshot_rows(self):
+        # Image URLs with and without a request, empty images and untracked stock
+        self.assertEqual(sorted(StorefrontProduct.objects.values_list('image', flat=True)),
+                         ['', 'products/a+b.png', 'products/desk top.jpg'])
+        for context in self._contexts():
+            self.assertParity(ProductSerializer, StorefrontProduct.objects.order_by('id'), context)
+
+    def test_nested_serializers_are_refused(self):
+        class Nested(serializers.ModelSerializer):
+            vendor = AdminVendorListSerializer()
+
+            class Meta:
+                model = Product
+                fields = ['id', 'vendor']
+
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesProjection(Nested)
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    data = {
+        'price': decimal.Decimal('10.50'),
+        'total': [decimal.Decimal('0.1'), decimal.Decimal('1200')],
+        'utc': datetime(2026, 3, 1, 9, 30, 15, 123456, tzinfo=timezone.utc),
+        'ist': datetime(2026, 3, 1, 9, 30, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+        'naive': datetime(2026, 3, 1, 9, 30, 15),
+        'day': date(2026, 3, 1),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'label': gettext_lazy('Pending'),
+        'text': 'caf\u00e9 \u2028 line \u2029 para',
+        'nested': [{'empty': None, 'flag': True, 'count': 3}],
+    }
+
+    def _encoders(self):
+        yield 'default', renderers.dumps
+        yield 'stdlib', renderers.dumps_stdlib
+
+    def test_compact_output_matches_drf(self):
+        expected = JSONRenderer().render(self.data)
+        for label, dumps in self._encoders():
+            with self.subTest(label), mock.patch.object(renderers, 'dumps', dumps):
+                self.assertEqual(renderers.FastJSONRenderer().render(self.data), expected)
+
+    def test_line_separators_are_escaped(self):
+        output = renderers.FastJSONRenderer().render({'text': '\u2028\u2029'})
+        self.assertEqual(output, b'{"text":"\\u2028\\u2029"}')
+
+    def test_indented_requests_fall_back_to_drf(self):
+        media_type = 'application/json; indent=4'
+        with mock.patch.object(renderers, 'dumps', side_effect=AssertionError) as dumps:
+            output = renderers.FastJSONRenderer().render(self.data, media_type)
+        dumps.assert_not_called()
+        self.assertEqual(output, JSONRenderer().render(self.data, media_type))
+        self.assertIn(b'\n    ', output)
+
+    def test_none_renders_empty(self):
+        self.assertEqual(renderers.FastJSONRenderer().render(None), b'')
+
+
+class ChooseEncodingTests(SimpleTestCase):
+    def test_q_values(self):
+        with mock.patch.object(compression, 'brotli', object()):
+            cases = {
+                '': None,
+                'identity': None,
+                'gzip': 'gzip',
+                'GZIP, deflate': 'gzip',
+                'gzip, br': 'br',
+                'gzip;q=1.0, br;q=0.5': 'gzip',
+                'br;q=0, gzip;q=0.1': 'gzip',
+                'gzip;q=0': None,
+                '*': 'br',
+                '*;q=0.5, br;q=0': 'gzip',
+                'br;q=oops, gzip;q=1.2.3': None,
+            }
+            for header, expected in cases.items():
+                with self.subTest(header):
+                    self.assertEqual(compression.choose_encoding(header), expected)
+
+    def test_brotli_needs_the_package(self):
+        with mock.patch.object(compression, 'brotli', None):
+            self.assertEqual(compression.choose_encoding('br'), None)
+            self.assertEqual(compression.choose_encoding('br, gzip;q=0.5'), 'gzip')
+
+
+@override_settings(COMPRESSION={'MIN_SIZE': 100})
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"rows":[' + b','.join(b'{"id":%d,"name":"Lamp"}' % i for i in range(50)) + b']}'
+
+    def setUp(self):
+        patcher = mock.patch.object(compression, 'brotli', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, response, accept_encoding='gzip'):
+        middleware = compression.CompressionMiddleware(lambda request: response)
+        return middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def test_json_is_compressed(self):
+        response = HttpResponse(self.body, content_type='application/json; charset=utf-8')
+        response['ETag'] = '"v1"'
+        response = self._get(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"v1"')
+
+    def test_small_bodies_are_sent_as_is(self):
+        response = self._get(HttpResponse(b'{"ok":true}', content_type='application/json'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_other_content_types_are_skipped(self):
+        for content_type in ('text/html; charset=utf-8', 'image/png', ''):
+            with self.subTest(content_type):
+                response = self._get(HttpResponse(self.body, content_type=content_type))
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertFalse(response.has_header('Vary'))
+
+    def test_streaming_and_encoded_responses_are_skipped(self):
+        streaming = self._get(StreamingHttpResponse(iter([self.body]), content_type='application/json'))
+        self.assertFalse(streaming.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(streaming.streaming_content), self.body)
+
+        encoded = HttpResponse(self.body, content_type='application/json')
+        encoded['Content-Encoding'] = 'identity'
+        self.assertEqual(self._get(encoded).content, self.body)
+
+    def test_no_acceptable_encoding_or_no_gain(self):
+        self.assertFalse(self._get(HttpResponse(self.body, content_type='application/json'), 'identity')
+                         .has_header('Content-Encoding'))
+        noise = os.urandom(2048)
+        response = self._get(HttpResponse(noise, content_type='text/plain'))
+        self.assertEqual(response.content, noise)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class ByteRangeTests(SimpleTestCase):
+    etag, last_modified = '"abc-10"', 'Thu, 01 Jan 2026 00:00:00 GMT'
+
+    def _range(self, header, size=100, **headers):
+        request = RequestFactory().get('/', HTTP_RANGE=header, **headers)
+        return media.byte_range(request, size, self.etag, self.last_modified)
+
+    def test_single_ranges(self):
+        self.assertEqual(self._range('bytes=0-9'), (0, 9))
+        self.assertEqual(self._range('bytes=90-'), (90, 99))
+        self.assertEqual(self._range('bytes=50-500'), (50, 99))
+        self.assertEqual(self._range('bytes=-10'), (90, 99))
+        self.assertEqual(self._range('bytes=-500'), (0, 99))
+
+    def test_unsatisfiable_ranges(self):
+        self.assertIs(self._range('bytes=100-'), False)
+        self.assertIs(self._range('bytes=-0'), False)
+        self.assertIs(self._range('bytes=-5', size=0), False)
+
+    def test_whole_file_for_ignored_ranges(self):
+        for header in ('bytes=9-0', 'bytes=-', 'bytes=0-1,5-6', 'items=0-1'):
+            self.assertIsNone(self._range(header), header)
+        self.assertIsNone(media.byte_range(RequestFactory().get('/'), 100, self.etag, self.last_modified))
+
+    def test_if_range_must_match(self):
+        self.assertEqual(self._range('bytes=0-9', HTTP_IF_RANGE=self.etag), (0, 9))
+        self.assertEqual(self._range('bytes=0-9', HTTP_IF_RANGE=self.last_modified), (0, 9))
+        self.assertIsNone(self._range('bytes=0-9', HTTP_IF_RANGE='"stale"'))
+
+
+class MediaServingTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        for name in ('products/lamp.jpg', 'vendor_docs/gst.pdf'):
+            os.makedirs(os.path.join(root.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(root.name, name), 'wb') as fh:
+                fh.write(bytes(range(100)))
+        settings_override = override_settings(MEDIA_ROOT=root.name, MEDIA_SERVING={'SENDFILE': None})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.factory = RequestFactory()
+
+    def _private(self, name, token):
+        return media.serve_private(self.factory.get('/', {'token': token}), name)
+
+    def _token(self, name):
+        return parse_qs(urlsplit(media.signed_url(name)).query)['token'][0]
+
+    def test_range_request_gets_partial_content(self):
+        response = media.serve_public(self.factory.get('/', HTTP_RANGE='bytes=10-19'), 'products/lamp.jpg')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+
+        response = media.serve_public(self.factory.get('/', HTTP_RANGE='bytes=200-'), 'products/lamp.jpg')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */100'))
+
+    def test_conditional_request_gets_not_modified(self):
+        etag = media.serve_public(self.factory.get('/'), 'products/lamp.jpg')['ETag']
+        response = media.serve_public(self.factory.get('/', HTTP_IF_NONE_MATCH=etag), 'products/lamp.jpg')
+        self.assertEqual(response.status_code, 304)
+
+    def test_paths_outside_their_prefix_are_not_served(self):
+        for name in ('vendor_docs/gst.pdf', 'products/../vendor_docs/gst.pdf', '../etc/passwd'):
+            with self.assertRaises(Http404, msg=name):
+                media.serve_public(self.factory.get('/'), name)
+
+    def test_private_files_need_a_valid_signature(self):
+        name = 'vendor_docs/gst.pdf'
+        response = self._private(name, self._token(name))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-store')
+        for token in ('', 'forged:signature', self._token('vendor_docs/other.pdf')):
+            with self.assertRaises(PermissionDenied, msg=token):
+                self._private(name, token)
+
+    def test_signature_expires(self):
+        name = 'vendor_docs/gst.pdf'
+        token = self._token(name)
+        later = time.time() + media.get_config()['SIGNED_URL_MAX_AGE'] + 1
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            with self.assertRaises(PermissionDenied):
+                self._private(name, token)
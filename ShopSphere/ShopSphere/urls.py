@@ -1,10 +1,9 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 
 from django.urls import path
-from . import views
+from . import media, views
 
 urlpatterns = [
     # Admin Authentication
@@ -35,5 +34,8 @@ urlpatterns = [
     path('products/<int:product_id>/unblock/', views.unblock_product, name='unblock_product'),
 ]
 
-
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Uploaded media (see ShopSphere/media.py); private files need a signed URL
+urlpatterns += [
+    path(f"{settings.MEDIA_URL.lstrip('/')}private/<path:path>", media.serve_private, name='private_media'),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", media.serve_public, name='media'),
+]
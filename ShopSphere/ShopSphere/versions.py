@@ -0,0 +1,56 @@
+"""
+Database-derived versions for the per-process caches (pricing engine,
+facet bitmaps, autocomplete index).
+
+Those caches used to learn about changes made by other processes only
+through a version number in the default cache. Without a shared CACHES
+backend every process has its own LocMem cache, so a promotion saved in
+the admin never reached the gunicorn workers. ``TableVersion`` reads the
+version from the table itself instead: the row count and the latest
+``updated_at`` of a queryset. Inserts and saves move the latest timestamp,
+deletes change the count. The aggregate is re-read at most every
+TABLE_VERSION_INTERVAL seconds, so a change made elsewhere is picked up
+within that delay for the cost of one indexed query per interval.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+
+DEFAULT_INTERVAL = 5
+
+
+def check_interval():
+    return getattr(settings, 'TABLE_VERSION_INTERVAL', DEFAULT_INTERVAL)
+
+
+class TableVersion:
+    """(row count, latest ``field`` value) of ``queryset()``, re-read at most every ``interval`` seconds"""
+
+    def __init__(self, queryset, field='updated_at', interval=None):
+        self.queryset = queryset
+        self.field = field
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._value = None
+        self._checked = None
+
+    def get(self):
+        interval = check_interval() if self.interval is None else self.interval
+        now = time.monotonic()
+        with self._lock:
+            if self._checked is not None and now - self._checked < interval:
+                return self._value
+        row = self.queryset().aggregate(count=Count('pk'), latest=Max(self.field))
+        value = (row['count'], row['latest'])
+        with self._lock:
+            self._value, self._checked = value, now
+        return value
+
+    def expire(self):
+        """Re-read on the next get(), e.g. after this process changed the table itself"""
+        with self._lock:
+            self._checked = None
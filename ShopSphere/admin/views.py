@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import user_passes_test
 from ecommapp.models import VendorProfile, Product
+from superAdmin import auditlog
 
 
 def is_admin(user):
@@ -82,7 +83,7 @@ def vendor_details(request, vendor_id):
     
     vendor = get_object_or_404(VendorProfile, id=vendor_id)
     products = vendor.products.all()
-    approval_logs = vendor.approval_logs.all()
+    approval_logs = auditlog.latest_vendor_logs(vendor)
 
     context = {
         'vendor': vendor,
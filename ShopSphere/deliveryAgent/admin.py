@@ -1,16 +1,43 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Agent
+from .models import Agent, AgentRoute, DeliveryAssignment, DispatchBackoff, LocationPing
 
 class AgentAdmin(UserAdmin):
     model = Agent
     # This adds your custom fields to the admin "Change User" page
     fieldsets = UserAdmin.fieldsets + (
-        (None, {'fields': ('mobile', 'license_number', 'company_name', 'vehicle_type')}),
+        (None, {'fields': ('mobile', 'license_number', 'company_name', 'vehicle_type', 'pincode', 'is_available')}),
     )
     # This adds your custom fields to the "Add User" page
     add_fieldsets = UserAdmin.add_fieldsets + (
         (None, {'fields': ('mobile', 'license_number', 'company_name', 'vehicle_type')}),
     )
 
-admin.site.register(Agent, AgentAdmin)
\ No newline at end of file
+admin.site.register(Agent, AgentAdmin)
+
+
+@admin.register(DeliveryAssignment)
+class DeliveryAssignmentAdmin(admin.ModelAdmin):
+    list_display = ('order', 'agent', 'status', 'assigned_at', 'delivered_at')
+    list_filter = ('status', 'assigned_at')
+    search_fields = ('agent__username',)
+
+
+@admin.register(DispatchBackoff)
+class DispatchBackoffAdmin(admin.ModelAdmin):
+    list_display = ('order', 'attempts', 'retry_after')
+    raw_id_fields = ('order',)
+
+
+@admin.register(AgentRoute)
+class AgentRouteAdmin(admin.ModelAdmin):
+    list_display = ('agent', 'distance_km', 'updated_at')
+    search_fields = ('agent__username',)
+    readonly_fields = ('stops', 'distance_km', 'updated_at')
+
+
+@admin.register(LocationPing)
+class LocationPingAdmin(admin.ModelAdmin):
+    list_display = ('agent', 'latitude', 'longitude', 'recorded_at')
+    list_filter = ('recorded_at',)
+    search_fields = ('agent__username',)
@@ -0,0 +1,197 @@
+"""
+Batch assignment of placed orders to delivery agents.
+
+Agents are indexed by every prefix of their service pincode (6 digits down
+to DELIVERY['MIN_PREFIX']). Indian pincodes are hierarchical - the first
+three digits identify the sorting district - so walking from the exact
+pincode to shorter prefixes finds the nearest agents first without any
+coordinates.
+
+Each tick loads a batch of unassigned orders and the available agents with
+their remaining vehicle capacity, matches them in memory with
+``assign_batch`` and writes all assignments with one bulk insert.
+
+An order that finds no agent gets a DispatchBackoff row and is skipped
+until its retry_after: RETRY_BASE_SECONDS after the first miss, doubling
+up to RETRY_MAX_SECONDS. Orders in pincodes nobody serves therefore cannot
+fill every batch and starve newer orders behind them.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from user import events
+from user.models import Order
+from .models import Agent, DeliveryAssignment, DispatchBackoff
+from . import routing
+
+
+DEFAULTS = {
+    'VEHICLE_CAPACITY': {'bike': 5, 'van': 20, 'truck': 50},
+    'DEFAULT_CAPACITY': 5,
+    'MIN_PREFIX': 3,
+    'BATCH_SIZE': 5000,
+    'TICK_SECONDS': 5,
+    'RETRY_BASE_SECONDS': 60,
+    'RETRY_MAX_SECONDS': 60 * 30,
+    'PINCODE_CENTROIDS_FILE': None,
+}
+
+
+def get_config():
+    """Return DELIVERY settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'DELIVERY', {}))
+    return config
+
+
+def vehicle_capacity(vehicle_type, config=None):
+    config = config or get_config()
+    return config['VEHICLE_CAPACITY'].get((vehicle_type or '').lower(), config['DEFAULT_CAPACITY'])
+
+
+def assign_batch(orders, agents, min_prefix=3):
+    """
+    Match orders to agents.
+
+    ``orders`` is a sequence of (order_id, pincode) in dispatch priority
+    order; ``agents`` a sequence of (agent_id, pincode, remaining_capacity).
+    Orders sharing a pincode are packed onto the same agent where capacity
+    allows, which keeps each agent's stops together for route planning.
+
+    Returns (assignments, unassigned) where assignments is a list of
+    (order_id, agent_id).
+    """
+    remaining = {}
+    buckets = defaultdict(list)
+    for agent_id, pincode, capacity in agents:
+        if capacity <= 0 or not pincode:
+            continue
+        remaining[agent_id] = capacity
+        for length in range(len(pincode), min_prefix - 1, -1):
+            buckets[pincode[:length]].append(agent_id)
+
+    by_pincode = defaultdict(list)
+    for order_id, pincode in orders:
+        by_pincode[pincode or ''].append(order_id)
+
+    cursors = defaultdict(int)
+    assignments = []
+    unassigned = []
+    for pincode, order_ids in by_pincode.items():
+        total = len(order_ids)
+        done = 0
+        for length in range(len(pincode), min_prefix - 1, -1):
+            key = pincode[:length]
+            bucket = buckets.get(key)
+            if not bucket:
+                continue
+            cursor = cursors[key]
+            while done < total and cursor < len(bucket):
+                agent_id = bucket[cursor]
+                capacity = remaining[agent_id]
+                if capacity <= 0:
+                    # Filled up through another prefix bucket
+                    cursor += 1
+                    continue
+                take = min(capacity, total - done)
+                assignments.extend((order_id, agent_id) for order_id in order_ids[done:done + take])
+                remaining[agent_id] = capacity - take
+                done += take
+                if take == capacity:
+                    cursor += 1
+            cursors[key] = cursor
+            if done == total:
+                break
+        unassigned.extend(order_ids[done:])
+    return assignments, unassigned
+
+
+def pending_orders(limit, now=None):
+    """Oldest placed orders that have a delivery address, no agent yet and no pending backoff"""
+    now = now or timezone.now()
+    return list(
+        Order.objects
+        .filter(delivery_assignment__isnull=True, delivery_address__isnull=False)
+        .filter(Q(dispatch_backoff__isnull=True) | Q(dispatch_backoff__retry_after__lte=now))
+        .order_by('id')
+        .values_list('id', 'delivery_address__pincode')[:limit]
+    )
+
+
+def available_agents(config=None):
+    """(agent_id, pincode, remaining capacity) for every agent that can take orders"""
+    config = config or get_config()
+    rows = (
+        Agent.objects
+        .filter(is_active=True, is_available=True, pincode__isnull=False)
+        .annotate(active=Count('assignments', filter=Q(assignments__status__in=DeliveryAssignment.ACTIVE_STATUSES)))
+        .values_list('id', 'pincode', 'vehicle_type', 'active')
+    )
+    return [
+        (agent_id, pincode, vehicle_capacity(vehicle_type, config) - active)
+        for agent_id, pincode, vehicle_type, active in rows
+    ]
+
+
+def back_off(order_ids, now=None, config=None):
+    """Push the next dispatch attempt of unassignable orders out, doubling each time"""
+    if not order_ids:
+        return
+    config = config or get_config()
+    now = now or timezone.now()
+    existing = {backoff.order_id: backoff for backoff in DispatchBackoff.objects.filter(order_id__in=order_ids)}
+    created = []
+    for order_id in order_ids:
+        backoff = existing.get(order_id)
+        if backoff is None:
+            backoff = DispatchBackoff(order_id=order_id)
+            created.append(backoff)
+        backoff.attempts += 1
+        delay = min(config['RETRY_BASE_SECONDS'] * 2 ** (backoff.attempts - 1), config['RETRY_MAX_SECONDS'])
+        backoff.retry_after = now + timedelta(seconds=delay)
+    DispatchBackoff.objects.bulk_create(created, batch_size=1000, ignore_conflicts=True)
+    DispatchBackoff.objects.bulk_update(existing.values(), ['attempts', 'retry_after'], batch_size=1000)
+
+
+def dispatch_pending(batch_size=None):
+    """
+    Run one dispatch tick. Returns (assignments, unassigned order ids); the
+    one-to-one order constraint makes concurrent dispatchers harmless.
+    Only assignments this tick actually inserted are returned, published
+    and routed.
+    """
+    config = get_config()
+    now = timezone.now()
+    orders = pending_orders(batch_size or config['BATCH_SIZE'], now)
+    if not orders:
+        return [], []
+    agents = available_agents(config)
+    assignments, unassigned = assign_batch(orders, agents, config['MIN_PREFIX'])
+    with transaction.atomic():
+        DeliveryAssignment.objects.bulk_create(
+            [DeliveryAssignment(order_id=order_id, agent_id=agent_id, assigned_at=now)
+             for order_id, agent_id in assignments],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        # Rows a concurrent dispatcher inserted first were skipped by ignore_conflicts
+        attempted = dict(assignments)
+        landed = [
+            (order_id, agent_id)
+            for order_id, agent_id in DeliveryAssignment.objects
+            .filter(order_id__in=list(attempted), assigned_at=now)
+            .values_list('order_id', 'agent_id')
+            if attempted[order_id] == agent_id
+        ]
+        DispatchBackoff.objects.filter(order_id__in=[order_id for order_id, _ in landed]).delete()
+        back_off(unassigned, now, config)
+        events.publish('assigned', [order_id for order_id, _ in landed])
+        order_pincodes = dict(orders)
+        transaction.on_commit(lambda: routing.update_routes(landed, order_pincodes))
+    return landed, unassigned
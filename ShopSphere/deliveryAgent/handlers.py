@@ -0,0 +1,12 @@
+from superAdmin import outbox
+from . import assignment
+
+
+# ============================================================================
+# OUTBOX HANDLERS (run by `manage.py dispatch_outbox`)
+# ============================================================================
+
+@outbox.handler(outbox.ORDER_PLACED)
+def dispatch_new_orders(batch):
+    """Assign freshly placed orders now instead of waiting for the next dispatch_orders tick"""
+    assignment.dispatch_pending()
@@ -0,0 +1,45 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from deliveryAgent import assignment
+
+
+class Command(BaseCommand):
+    help = "Benchmark the in-memory order/agent matcher on synthetic pincodes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--agents', type=int, default=1000)
+        parser.add_argument('--districts', type=int, default=40, help="Distinct 3-digit pincode prefixes")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        config = assignment.get_config()
+        districts = [f"{rng.randint(110, 859)}" for _ in range(options['districts'])]
+
+        def pincode():
+            return f"{rng.choice(districts)}{rng.randint(0, 40):03d}"
+
+        orders = [(order_id, pincode()) for order_id in range(options['orders'])]
+        vehicles = list(config['VEHICLE_CAPACITY'])
+        agents = [
+            (agent_id, pincode(), assignment.vehicle_capacity(rng.choice(vehicles), config))
+            for agent_id in range(options['agents'])
+        ]
+
+        timings = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            assigned, unassigned = assignment.assign_batch(orders, agents, config['MIN_PREFIX'])
+            timings.append(time.perf_counter() - start)
+
+        capacity = sum(agent[2] for agent in agents)
+        self.stdout.write(
+            f"{len(orders)} orders, {len(agents)} agents (capacity {capacity}): "
+            f"{len(assigned)} assigned, {len(unassigned)} unassigned"
+        )
+        self.stdout.write(f"best {min(timings) * 1000:.1f} ms, worst {max(timings) * 1000:.1f} ms")
@@ -0,0 +1,82 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from deliveryAgent import tracking, views
+from deliveryAgent.models import Agent
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Load-test location ingestion: raw ring-buffer writes and the ping view, single process"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=2000)
+        parser.add_argument('--pings', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        agents, pings = options['agents'], options['pings']
+        start_ts = time.time() - pings * 0.01
+        positions = {agent_id: (rng.uniform(12.8, 13.1), rng.uniform(77.4, 77.8)) for agent_id in range(1, agents + 1)}
+        workload = []
+        for n in range(pings):
+            agent_id = rng.randint(1, agents)
+            lat, lng = positions[agent_id]
+            lat, lng = lat + rng.uniform(-2e-4, 2e-4), lng + rng.uniform(-2e-4, 2e-4)
+            positions[agent_id] = (lat, lng)
+            workload.append((agent_id, lat, lng, start_ts + n * 0.01))
+
+        # Flushes are timed separately below
+        config = dict(tracking.get_config(), BATCH_SIZE=10 ** 9, FLUSH_INTERVAL=10 ** 9)
+
+        store = tracking.LocationStore(config)
+        begin = time.perf_counter()
+        for agent_id, lat, lng, ts in workload:
+            store.record(agent_id, lat, lng, ts)
+        elapsed = time.perf_counter() - begin
+        pending = len(store.buffer)
+        self.stdout.write(f"store.record: {pings / elapsed:,.0f} pings/s, {pending} of {pings} queued for persistence")
+
+        try:
+            with transaction.atomic():
+                rows = store.buffer.pending()
+                begin = time.perf_counter()
+                tracking.write_pings(rows)
+                written = len(rows)
+                flush_time = time.perf_counter() - begin
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(f"flush: {written} rows in {flush_time * 1000:.0f} ms (rolled back)")
+
+        # Full request path: token check, JSON parsing, ring write
+        original = tracking._store
+        tracking._store = tracking.LocationStore(config)
+        factory = RequestFactory()
+        tokens = {agent_id: tracking.make_token(Agent(pk=agent_id)) for agent_id in positions}
+        requests = [
+            factory.post(
+                '/tracking/ping/',
+                data=json.dumps({'lat': lat, 'lng': lng, 'ts': ts}),
+                content_type='application/json',
+                HTTP_AUTHORIZATION=f"Agent {tokens[agent_id]}",
+            )
+            for agent_id, lat, lng, ts in workload
+        ]
+        try:
+            begin = time.perf_counter()
+            for request in requests:
+                views.post_location(request)
+            elapsed = time.perf_counter() - begin
+        finally:
+            tracking._store = original
+        self.stdout.write(f"post_location view: {pings / elapsed:,.0f} pings/s")
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from deliveryAgent import assignment
+
+
+class Command(BaseCommand):
+    help = "Assign pending orders to available delivery agents, one batch per tick"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run a single tick and exit")
+        parser.add_argument('--interval', type=float, default=None, help="Seconds between ticks")
+        parser.add_argument('--batch-size', type=int, default=None, help="Orders per tick")
+
+    def handle(self, *args, **options):
+        config = assignment.get_config()
+        interval = options['interval'] or config['TICK_SECONDS']
+        while True:
+            start = time.perf_counter()
+            assigned, unassigned = assignment.dispatch_pending(options['batch_size'])
+            if assigned or unassigned:
+                self.stdout.write(
+                    f"Assigned {len(assigned)} orders, {len(unassigned)} left unassigned "
+                    f"({(time.perf_counter() - start) * 1000:.1f} ms)"
+                )
+            if options['once']:
+                return
+            time.sleep(interval)
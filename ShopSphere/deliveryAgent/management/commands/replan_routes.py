@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from deliveryAgent import routing
+
+
+class Command(BaseCommand):
+    help = "Recompute delivery routes from active assignments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('agents', nargs='*', type=int, help="Agent ids (default: all agents)")
+
+    def handle(self, *args, **options):
+        count = routing.replan(options['agents'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Replanned {count} routes"))
@@ -1,11 +1,14 @@
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.db import models
+from django.utils import timezone
 
 class Agent(AbstractUser):
     mobile = models.CharField(max_length=15, blank=True, null=True)
     license_number = models.CharField(max_length=50, blank=True, null=True)
     company_name = models.CharField(max_length=100, blank=True, null=True)
     vehicle_type = models.CharField(max_length=20, blank=True, null=True)
+    pincode = models.CharField(max_length=6, blank=True, null=True, db_index=True, help_text="Service area pincode")
+    is_available = models.BooleanField(default=True)
 
     # Overriding these to resolve clashes with default auth.User
     groups = models.ManyToManyField(
@@ -24,4 +27,71 @@ class Agent(AbstractUser):
     )
 
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+
+class DeliveryAssignment(models.Model):
+    """An order dispatched to a delivery agent by deliveryAgent/assignment.py"""
+
+    STATUS_CHOICES = [
+        ('assigned', 'Assigned'),
+        ('picked_up', 'Picked Up'),
+        ('delivered', 'Delivered'),
+    ]
+    ACTIVE_STATUSES = ('assigned', 'picked_up')
+
+    order = models.OneToOneField('user.Order', on_delete=models.CASCADE, related_name='delivery_assignment')
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='assignments')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='assigned')
+    assigned_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-assigned_at']
+        indexes = [
+            models.Index(fields=['agent', 'status'], name='assignment_agent_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id} -> {self.agent.username} ({self.status})"
+
+
+class DispatchBackoff(models.Model):
+    """An order no agent could take yet; dispatch skips it until retry_after"""
+
+    order = models.OneToOneField('user.Order', on_delete=models.CASCADE, related_name='dispatch_backoff')
+    attempts = models.PositiveIntegerField(default=0)
+    retry_after = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.attempts} attempts, retry after {self.retry_after}"
+
+
+class AgentRoute(models.Model):
+    """Current stop sequence of an agent, maintained by deliveryAgent/routing.py"""
+
+    agent = models.OneToOneField(Agent, on_delete=models.CASCADE, related_name='route')
+    # [{"pincode": "560034", "orders": [12, 15]}, ...] in visiting order
+    stops = models.JSONField(default=list)
+    distance_km = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.agent.username}: {len(self.stops)} stops, {self.distance_km:.1f} km"
+
+
+class LocationPing(models.Model):
+    """Downsampled GPS track of an agent, written in batches by deliveryAgent/tracking.py"""
+
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='location_pings')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['agent', '-recorded_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.agent_id} @ {self.latitude:.5f},{self.longitude:.5f} ({self.recorded_at})"
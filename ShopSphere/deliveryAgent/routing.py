@@ -0,0 +1,289 @@
+"""
+Multi-stop route planning for delivery agents.
+
+An agent's assigned orders are grouped into one stop per delivery pincode.
+Stops are ordered from the agent's own pincode with a nearest-neighbour
+tour improved by 2-opt, both working on a NumPy distance matrix between
+pincode centroids loaded from a bundled CSV.
+
+Routes are incremental: when new orders reach an agent, orders for a
+pincode already on the route just join that stop, new pincodes are placed
+by cheapest insertion and only that agent's route is re-optimised. Other
+agents' routes are not touched. Incremental updates read and rewrite a
+route under ``select_for_update`` so concurrent dispatch and delivery
+updates cannot lose each other's stops.
+"""
+
+import csv
+import os
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Agent, AgentRoute, DeliveryAssignment
+
+
+EARTH_RADIUS_KM = 6371.0
+FULL_MATRIX_LIMIT = 4000
+DEFAULT_CENTROIDS_FILE = os.path.join(os.path.dirname(__file__), 'data', 'pincode_centroids.csv')
+
+
+def haversine_matrix(a, b):
+    """Pairwise great-circle distances (km) between two (n, 2) arrays of radians"""
+    lat1, lon1 = a[:, 0][:, None], a[:, 1][:, None]
+    lat2, lon2 = b[:, 0][None, :], b[:, 1][None, :]
+    h = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+class CentroidTable:
+    """Pincode -> centroid lookup with prefix fallback and a cached distance matrix"""
+
+    def __init__(self, path):
+        codes, coords = [], []
+        with open(path, newline='') as fh:
+            rows = csv.DictReader(line for line in fh if not line.startswith('#'))
+            for row in rows:
+                codes.append(row['pincode'].strip())
+                coords.append((float(row['latitude']), float(row['longitude'])))
+
+        self.index = {code: i for i, code in enumerate(codes)}
+        self.coords = np.radians(np.array(coords, dtype=np.float64).reshape(-1, 2))
+        self.prefix_means = {}
+        for length in range(1, 6):
+            groups = defaultdict(list)
+            for code, i in self.index.items():
+                groups[code[:length]].append(i)
+            for prefix, members in groups.items():
+                self.prefix_means[prefix] = self.coords[members].mean(axis=0)
+        self.matrix = None
+        if len(codes) <= FULL_MATRIX_LIMIT:
+            self.matrix = haversine_matrix(self.coords, self.coords).astype(np.float32)
+
+    def coordinate(self, pincode):
+        """Centroid (radians) of a pincode, falling back to its longest known prefix"""
+        pincode = (pincode or '').strip()
+        if pincode in self.index:
+            return self.coords[self.index[pincode]]
+        for length in range(min(len(pincode), 5), 0, -1):
+            mean = self.prefix_means.get(pincode[:length])
+            if mean is not None:
+                return mean
+        return self.coords.mean(axis=0)
+
+    def distances(self, pincodes):
+        """Distance matrix (km) between the given pincodes"""
+        if self.matrix is not None and all(code in self.index for code in pincodes):
+            idx = np.fromiter((self.index[code] for code in pincodes), dtype=np.intp, count=len(pincodes))
+            return self.matrix[np.ix_(idx, idx)]
+        points = np.array([self.coordinate(code) for code in pincodes]).reshape(-1, 2)
+        return haversine_matrix(points, points)
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_table():
+    """Process-wide centroid table"""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                path = getattr(settings, 'DELIVERY', {}).get('PINCODE_CENTROIDS_FILE') or DEFAULT_CENTROIDS_FILE
+                _table = CentroidTable(path)
+    return _table
+
+
+# ============================================================================
+# TOUR HEURISTICS (node 0 is the agent's start and stays first)
+# ============================================================================
+
+def nearest_neighbour(D):
+    """Greedy open tour starting at node 0"""
+    n = len(D)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    tour = [0]
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, D[tour[-1]])
+        nxt = int(np.argmin(row))
+        visited[nxt] = True
+        tour.append(nxt)
+    return tour
+
+
+def two_opt(D, tour, max_passes=20):
+    """Improve an open tour by segment reversal; each pass scans all j for every i at once"""
+    tour = np.array(tour, dtype=np.intp)
+    n = len(tour)
+    if n < 4:
+        return tour.tolist()
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            a, b = tour[i - 1], tour[i]
+            js = np.arange(i + 1, n)
+            c = tour[js]
+            has_next = js + 1 < n
+            d = tour[np.minimum(js + 1, n - 1)]
+            delta = D[a, c] - D[a, b] + np.where(has_next, D[b, d] - D[c, d], 0.0)
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-9:
+                j = js[k]
+                tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return tour.tolist()
+
+
+def tour_length(D, tour):
+    """Length of an open tour in km"""
+    if len(tour) < 2:
+        return 0.0
+    tour = np.asarray(tour)
+    return float(D[tour[:-1], tour[1:]].sum())
+
+
+def cheapest_insertion(D, tour, node):
+    """Insert ``node`` where it lengthens the open tour the least"""
+    tour = np.asarray(tour)
+    prev, nxt = tour[:-1], tour[1:]
+    between = D[prev, node] + D[node, nxt] - D[prev, nxt]
+    append_cost = D[tour[-1], node]
+    if len(between) and between.min() < append_cost:
+        position = int(np.argmin(between)) + 1
+    else:
+        position = len(tour)
+    return tour[:position].tolist() + [node] + tour[position:].tolist()
+
+
+def plan_route(start_pincode, stops, table=None):
+    """
+    Order ``stops`` (list of {"pincode", "orders"}) from ``start_pincode``.
+    Returns (ordered stops, distance in km).
+    """
+    if not stops:
+        return [], 0.0
+    table = table or get_table()
+    pincodes = [start_pincode] + [stop['pincode'] for stop in stops]
+    D = table.distances(pincodes)
+    tour = two_opt(D, nearest_neighbour(D))
+    return [stops[node - 1] for node in tour[1:]], tour_length(D, tour)
+
+
+def extend_route(start_pincode, stops, new_orders, table=None):
+    """
+    Add (order_id, pincode) pairs to an existing ordered route. Orders for a
+    pincode already on the route join that stop; new pincodes are inserted
+    cheaply, then the tour is polished with 2-opt.
+    Returns (ordered stops, distance in km).
+    """
+    table = table or get_table()
+    stops = [dict(stop, orders=list(stop['orders'])) for stop in stops]
+    existing = len(stops)
+    by_pincode = {stop['pincode']: stop for stop in stops}
+    for order_id, pincode in new_orders:
+        stop = by_pincode.get(pincode)
+        if stop is None:
+            stop = {'pincode': pincode, 'orders': []}
+            by_pincode[pincode] = stop
+            stops.append(stop)
+        stop['orders'].append(order_id)
+
+    pincodes = [start_pincode] + [stop['pincode'] for stop in stops]
+    D = table.distances(pincodes)
+    # The stored route keeps its order; new stops are slotted in
+    tour = list(range(existing + 1))
+    for node in range(existing + 1, len(pincodes)):
+        tour = cheapest_insertion(D, tour, node)
+    tour = two_opt(D, tour)
+    return [stops[node - 1] for node in tour[1:]], tour_length(D, tour)
+
+
+def update_routes(assignments, order_pincodes):
+    """
+    Fold freshly dispatched (order_id, agent_id) pairs into the affected
+    agents' stored routes. ``order_pincodes`` maps order id -> pincode.
+    """
+    new_orders = defaultdict(list)
+    for order_id, agent_id in assignments:
+        new_orders[agent_id].append((order_id, order_pincodes[order_id]))
+    if not new_orders:
+        return 0
+
+    table = get_table()
+    agent_pincodes = dict(Agent.objects.filter(id__in=new_orders).values_list('id', 'pincode'))
+
+    with transaction.atomic():
+        # Every agent needs a row to lock; when two dispatchers create it, one insert is ignored
+        AgentRoute.objects.bulk_create(
+            [AgentRoute(agent_id=agent_id) for agent_id in new_orders], batch_size=500, ignore_conflicts=True)
+        # Locked in agent order so concurrent updaters cannot deadlock
+        routes = list(AgentRoute.objects.select_for_update().filter(agent_id__in=new_orders).order_by('agent_id'))
+        now = timezone.now()
+        for route in routes:
+            route.stops, route.distance_km = extend_route(
+                agent_pincodes.get(route.agent_id), route.stops, new_orders[route.agent_id], table)
+            # bulk_update() skips auto_now
+            route.updated_at = now
+        AgentRoute.objects.bulk_update(routes, ['stops', 'distance_km', 'updated_at'], batch_size=500)
+    return len(routes)
+
+
+def remove_orders(agent_id, order_ids):
+    """Drop delivered/cancelled orders from an agent's route, removing empty stops"""
+    start = Agent.objects.filter(id=agent_id).values_list('pincode', flat=True).first()
+    done = set(order_ids)
+    with transaction.atomic():
+        route = AgentRoute.objects.select_for_update().filter(agent_id=agent_id).first()
+        if route is None:
+            return
+        stops = []
+        for stop in route.stops:
+            remaining = [order_id for order_id in stop['orders'] if order_id not in done]
+            if remaining:
+                stops.append(dict(stop, orders=remaining))
+        pincodes = [start] + [stop['pincode'] for stop in stops]
+        route.stops = stops
+        route.distance_km = tour_length(get_table().distances(pincodes), list(range(len(pincodes))))
+        route.save(update_fields=['stops', 'distance_km', 'updated_at'])
+
+
+def replan(agent_ids=None):
+    """Rebuild routes from scratch from the agents' active assignments; returns routes written"""
+    assignments = DeliveryAssignment.objects.filter(status__in=DeliveryAssignment.ACTIVE_STATUSES)
+    if agent_ids:
+        assignments = assignments.filter(agent_id__in=agent_ids)
+    stops_by_agent = defaultdict(dict)
+    for agent_id, order_id, pincode in assignments.order_by('id').values_list(
+            'agent_id', 'order_id', 'order__delivery_address__pincode'):
+        stop = stops_by_agent[agent_id].setdefault(pincode, {'pincode': pincode, 'orders': []})
+        stop['orders'].append(order_id)
+
+    table = get_table()
+    agent_pincodes = dict(Agent.objects.filter(id__in=stops_by_agent).values_list('id', 'pincode'))
+    routes = []
+    for agent_id, stops in stops_by_agent.items():
+        ordered, distance = plan_route(agent_pincodes.get(agent_id), list(stops.values()), table)
+        routes.append(AgentRoute(agent_id=agent_id, stops=ordered, distance_km=distance))
+
+    with transaction.atomic():
+        stale = AgentRoute.objects.exclude(agent_id__in=stops_by_agent)
+        if agent_ids:
+            stale = stale.filter(agent_id__in=agent_ids)
+        stale.delete()
+        AgentRoute.objects.bulk_create(
+            routes,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['agent'],
+            update_fields=['stops', 'distance_km', 'updated_at'],
+        )
+    return len(routes)
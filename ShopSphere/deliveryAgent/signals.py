@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from user import events
+from .models import DeliveryAssignment
+from . import routing
+
+
+# ============================================================================
+# ORDER STATUS - delivery progress reaches the customer's event stream
+# ============================================================================
+
+@receiver(post_save, sender=DeliveryAssignment)
+def publish_delivery_status(sender, instance, raw=False, **kwargs):
+    """Assigned / picked up / delivered reach the customer's order stream"""
+    if raw:
+        return
+    events.publish(instance.status, [instance.order_id])
+
+
+# ============================================================================
+# ROUTES - drop finished orders from the agent's stop list
+# ============================================================================
+
+@receiver(post_save, sender=DeliveryAssignment)
+def prune_delivered_stop(sender, instance, raw=False, **kwargs):
+    """A delivered order no longer needs a stop"""
+    if raw or instance.status != 'delivered':
+        return
+    transaction.on_commit(lambda: routing.remove_orders(instance.agent_id, [instance.order_id]))
+
+
+@receiver(post_delete, sender=DeliveryAssignment)
+def prune_unassigned_stop(sender, instance, **kwargs):
+    """Reassigned or cancelled orders leave the old agent's route"""
+    transaction.on_commit(lambda: routing.remove_orders(instance.agent_id, [instance.order_id]))
@@ -1,3 +1,149 @@
-from django.test import TestCase
+import math
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from user.models import Address, AuthUser, Order, OrderEvent
+from . import assignment, routing, tracking
+from .models import Agent, AgentRoute, DeliveryAssignment, DispatchBackoff, LocationPing
+
+
+class DispatchTestCase(TestCase):
+    def setUp(self):
+        self.customer = AuthUser.objects.create_user(username='customer', email='customer@example.com', password='x')
+
+    def order(self, pincode):
+        address = Address.objects.create(user=self.customer, name='C', phone='9999999999', pincode=pincode,
+                                          address='-', city='-', state='-')
+        return Order.objects.create(user=self.customer, payment_mode='cod', delivery_address=address)
+
+    def agent(self, username, pincode):
+        return Agent.objects.create_user(username, password='x', pincode=pincode, vehicle_type='van')
+
+
+@override_settings(DELIVERY={'BATCH_SIZE': 2, 'RETRY_BASE_SECONDS': 60, 'RETRY_MAX_SECONDS': 600})
+class DispatchBackoffTests(DispatchTestCase):
+    def test_unservable_orders_do_not_starve_newer_ones(self):
+        self.agent('agent', '560034')
+        stuck = [self.order('999999'), self.order('999998')]
+        fresh = self.order('560034')
+
+        assigned, unassigned = assignment.dispatch_pending()
+        self.assertEqual((assigned, sorted(unassigned)), ([], sorted(order.id for order in stuck)))
+
+        assigned, _ = assignment.dispatch_pending()
+        self.assertEqual([order_id for order_id, _ in assigned], [fresh.id])
+        self.assertEqual(assignment.pending_orders(10), [])
+
+    def test_backoff_doubles_and_is_capped(self):
+        order = self.order('999999')
+        now = timezone.now()
+        for expected in (60, 120, 240, 480, 600, 600):
+            assignment.back_off([order.id], now)
+            backoff = DispatchBackoff.objects.get(order=order)
+            self.assertEqual(backoff.retry_after, now + timedelta(seconds=expected))
+        self.assertEqual(assignment.pending_orders(10, now), [])
+        self.assertEqual(assignment.pending_orders(10, now + timedelta(seconds=600)),
+                         [(order.id, '999999')])
+
+    def test_assignment_clears_backoff(self):
+        order = self.order('560034')
+        assignment.back_off([order.id], timezone.now() - timedelta(hours=1))
+        self.agent('agent', '560034')
+        assigned, _ = assignment.dispatch_pending()
+        self.assertEqual(len(assigned), 1)
+        self.assertFalse(DispatchBackoff.objects.exists())
+
+
+class DispatchConflictTests(DispatchTestCase):
+    def test_only_inserted_assignments_are_published_and_routed(self):
+        ours = self.agent('ours', '560034')
+        theirs = self.agent('theirs', '560034')
+        taken, free = self.order('560034'), self.order('560034')
+        # Another dispatcher assigned ``taken`` between our read and our insert
+        DeliveryAssignment.objects.create(order=taken, agent=theirs)
+        Agent.objects.filter(id=theirs.id).update(is_available=False)
+        published_before = OrderEvent.objects.filter(order=taken).count()
+
+        orders = [(taken.id, '560034'), (free.id, '560034')]
+        with mock.patch.object(assignment, 'pending_orders', return_value=orders), \
+                mock.patch.object(assignment.routing, 'update_routes') as update_routes, \
+                self.captureOnCommitCallbacks(execute=True):
+            assigned, _ = assignment.dispatch_pending()
+
+        self.assertEqual(assigned, [(free.id, ours.id)])
+        update_routes.assert_called_once_with([(free.id, ours.id)], dict(orders))
+        self.assertEqual(OrderEvent.objects.filter(order=taken).count(), published_before)
+        self.assertEqual(OrderEvent.objects.filter(order=free).count(), 1)
+        self.assertEqual(DeliveryAssignment.objects.get(order=taken).agent, theirs)
+
+
+class RouteUpdateTests(DispatchTestCase):
+    def test_update_and_remove_keep_other_stops(self):
+        agent = self.agent('agent', '560034')
+        first, second, third = self.order('560001'), self.order('560001'), self.order('110001')
+        pincodes = {first.id: '560001', second.id: '560001', third.id: '110001'}
+
+        routing.update_routes([(first.id, agent.id)], pincodes)
+        routing.update_routes([(second.id, agent.id), (third.id, agent.id)], pincodes)
+        route = AgentRoute.objects.get(agent=agent)
+        self.assertEqual({stop['pincode']: stop['orders'] for stop in route.stops},
+                         {'560001': [first.id, second.id], '110001': [third.id]})
+
+        routing.remove_orders(agent.id, [first.id, third.id])
+        route.refresh_from_db()
+        self.assertEqual(route.stops, [{'pincode': '560001', 'orders': [second.id]}])
+
+    def test_update_stamps_the_route(self):
+        agent = self.agent('agent', '560034')
+        first, second = self.order('560001'), self.order('110001')
+        routing.update_routes([(first.id, agent.id)], {first.id: '560001'})
+        AgentRoute.objects.filter(agent=agent).update(updated_at=timezone.now() - timedelta(hours=1))
+        before = timezone.now()
+        routing.update_routes([(second.id, agent.id)], {second.id: '110001'})
+        self.assertGreaterEqual(AgentRoute.objects.get(agent=agent).updated_at, before)
+
+    def test_routes_are_read_for_update(self):
+        agent = self.agent('agent', '560034')
+        order = self.order('560001')
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True,
+                               side_effect=lambda queryset, *args, **kwargs: queryset) as select_for_update:
+            routing.update_routes([(order.id, agent.id)], {order.id: '560001'})
+            routing.remove_orders(agent.id, [order.id])
+        self.assertEqual(select_for_update.call_count, 2)
+        self.assertTrue(all(call.args[0].model is AgentRoute for call in select_for_update.call_args_list))
+
+
+class LocationStoreTests(TransactionTestCase):
+    def setUp(self):
+        self.agent = Agent.objects.create_user('agent', password='x')
+        self.other = Agent.objects.create_user('other', password='x')
+        self.store = tracking.LocationStore(dict(tracking.get_config(), BATCH_SIZE=100, FLUSH_INTERVAL=3600))
+
+    def test_timestamps_outside_the_window_are_rejected(self):
+        now = time.time()
+        for ts in (math.nan, math.inf, -math.inf, -1e300, now - 2 * 60 * 60, now + 3600):
+            self.assertFalse(self.store.record(self.agent.id, 12.9, 77.6, ts), ts)
+        self.assertTrue(self.store.record(self.agent.id, 12.9, 77.6, now - 60))
+        self.assertEqual(len(self.store.buffer), 1)
+
+    def test_malformed_row_does_not_poison_the_batch(self):
+        now = time.time()
+        self.store.record(self.other.id, 12.9, 77.6, now)
+        # A row that slipped past validation, e.g. from an older process
+        self.store.buffer.add((self.agent.id, math.nan, 12.9, 77.6))
+        with self.assertLogs('shopsphere.tracking', 'WARNING'):
+            self.assertEqual(self.store.flush(), 2)
+        self.assertEqual(list(LocationPing.objects.values_list('agent_id', flat=True)), [self.other.id])
+
+    def test_failed_flush_keeps_pings(self):
+        self.store.record(self.agent.id, 12.9, 77.6)
+        with mock.patch.object(LocationPing.objects, 'bulk_create', side_effect=OperationalError), \
+                self.assertLogs('shopsphere.buffers', 'ERROR'):
+            self.assertEqual(self.store.flush(), 0)
+        self.assertEqual(len(self.store.buffer), 1)
@@ -0,0 +1,228 @@
+"""
+Live agent location tracking.
+
+Agents post a GPS ping every few seconds. Each ping goes into a fixed-size
+ring buffer for that agent: one ``array('d')`` holding (timestamp,
+latitude, longitude) triples, so memory per agent is constant
+(TRACKING['RING_SIZE'] * 24 bytes) whatever the ping rate.
+
+Pings must carry a finite timestamp no older than MAX_PING_AGE and no
+more than MAX_CLOCK_SKEW ahead of the server clock.
+
+Only a downsampled track reaches the database. A ping is persisted when
+PERSIST_INTERVAL seconds have passed or the agent has moved
+PERSIST_DISTANCE metres since the last persisted point. Persisted points
+are queued in a WriteBuffer (ShopSphere/buffers.py) and written with
+``bulk_create`` every FLUSH_INTERVAL seconds or BATCH_SIZE rows, and at
+interpreter exit; a failed write keeps them queued.
+
+"Where is my order" lookups read the ring buffer. Processes that have not
+seen the agent (another worker, a restart) fall back to the last persisted
+point, so ingestion is best served by one process or sticky routing.
+"""
+
+import logging
+import math
+import threading
+import time
+from array import array
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+
+from ShopSphere.buffers import WriteBuffer
+from .models import LocationPing
+
+
+logger = logging.getLogger('shopsphere.tracking')
+
+DEFAULTS = {
+    'RING_SIZE': 120,
+    'PERSIST_INTERVAL': 30,
+    'PERSIST_DISTANCE': 100,
+    'FLUSH_INTERVAL': 10,
+    'BATCH_SIZE': 1000,
+    'MAX_CLOCK_SKEW': 300,
+    'MAX_PING_AGE': 60 * 60,
+    'TOKEN_MAX_AGE': 60 * 60 * 12,
+}
+
+TOKEN_SALT = 'deliveryAgent.tracking'
+EARTH_RADIUS_M = 6371000.0
+
+
+def get_config():
+    """Return TRACKING settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'TRACKING', {}))
+    return config
+
+
+def make_token(agent):
+    """Signed bearer token an agent app sends with its pings"""
+    return signing.dumps(agent.pk, salt=TOKEN_SALT)
+
+
+def token_agent_id(token, max_age=None):
+    """Agent id carried by a valid token, or None"""
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=max_age or get_config()['TOKEN_MAX_AGE'])
+    except signing.BadSignature:
+        return None
+
+
+def distance_m(lat1, lng1, lat2, lng2):
+    """Equirectangular approximation, accurate enough at ping-to-ping distances"""
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+class Ring:
+    """Last ``size`` (timestamp, latitude, longitude) samples of one agent"""
+
+    __slots__ = ('size', 'data', 'head', 'count', 'persisted')
+
+    def __init__(self, size):
+        self.size = size
+        self.data = array('d', bytes(8 * 3 * size))
+        self.head = 0           # slot the next sample goes into
+        self.count = 0
+        self.persisted = None   # (timestamp, latitude, longitude) last written to the database
+
+    def append(self, ts, lat, lng):
+        i = self.head * 3
+        self.data[i] = ts
+        self.data[i + 1] = lat
+        self.data[i + 2] = lng
+        self.head = (self.head + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def latest(self):
+        if not self.count:
+            return None
+        i = ((self.head - 1) % self.size) * 3
+        return self.data[i], self.data[i + 1], self.data[i + 2]
+
+    def samples(self, limit=None):
+        """Samples oldest first"""
+        count = self.count if limit is None else min(limit, self.count)
+        start = (self.head - count) % self.size
+        out = []
+        for k in range(count):
+            i = ((start + k) % self.size) * 3
+            out.append((self.data[i], self.data[i + 1], self.data[i + 2]))
+        return out
+
+
+def write_pings(rows):
+    """bulk_create queued (agent_id, ts, lat, lng) rows; a malformed row is skipped, not fatal"""
+    pings = []
+    for agent_id, ts, lat, lng in rows:
+        try:
+            recorded_at = datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            logger.warning("Skipping location ping of agent %s with timestamp %r", agent_id, ts)
+            continue
+        pings.append(LocationPing(agent_id=agent_id, latitude=lat, longitude=lng, recorded_at=recorded_at))
+    LocationPing.objects.bulk_create(pings, batch_size=get_config()['BATCH_SIZE'])
+
+
+class LocationStore:
+    """Ring buffers for every agent plus the queue of points to persist"""
+
+    def __init__(self, config, atexit=False):
+        self.ring_size = config['RING_SIZE']
+        self.persist_interval = config['PERSIST_INTERVAL']
+        self.persist_distance = config['PERSIST_DISTANCE']
+        self.max_skew = config['MAX_CLOCK_SKEW']
+        self.max_age = config['MAX_PING_AGE']
+        self._lock = threading.Lock()
+        self.rings = {}
+        self.buffer = WriteBuffer(write_pings, config['BATCH_SIZE'], config['FLUSH_INTERVAL'],
+                                  label='location pings', atexit=atexit)
+
+    def accepts(self, lat, lng, ts, now):
+        """Finite coordinates on the globe and a finite timestamp inside the accepted window"""
+        return (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0
+                and math.isfinite(ts) and now - self.max_age <= ts <= now + self.max_skew)
+
+    def record(self, agent_id, lat, lng, ts=None):
+        """
+        Add one ping. Returns False when it is rejected (invalid coordinates,
+        a timestamp outside the accepted window, or older than the newest
+        sample).
+        """
+        now = time.time()
+        ts = now if ts is None else ts
+        if not self.accepts(lat, lng, ts, now):
+            return False
+        persist = None
+        with self._lock:
+            ring = self.rings.get(agent_id)
+            if ring is None:
+                ring = self.rings[agent_id] = Ring(self.ring_size)
+            latest = ring.latest()
+            if latest is not None and ts < latest[0]:
+                return False
+            ring.append(ts, lat, lng)
+            last = ring.persisted
+            if (last is None or ts - last[0] >= self.persist_interval
+                    or distance_m(last[1], last[2], lat, lng) >= self.persist_distance):
+                ring.persisted = (ts, lat, lng)
+                persist = (agent_id, ts, lat, lng)
+        if persist is not None:
+            self.buffer.add(persist)
+        return True
+
+    def latest(self, agent_id):
+        ring = self.rings.get(agent_id)
+        if ring is None:
+            return None
+        with self._lock:
+            return ring.latest()
+
+    def track(self, agent_id, limit=None):
+        ring = self.rings.get(agent_id)
+        if ring is None:
+            return []
+        with self._lock:
+            return ring.samples(limit)
+
+    def flush_if_due(self):
+        self.buffer.flush_if_due()
+
+    def flush(self):
+        return self.buffer.flush()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide LocationStore"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LocationStore(get_config(), atexit=True)
+    return _store
+
+
+def agent_position(agent_id):
+    """Latest (timestamp, latitude, longitude) of an agent, from memory or its persisted track"""
+    position = get_store().latest(agent_id)
+    if position is not None:
+        return position
+    row = (LocationPing.objects
+           .filter(agent_id=agent_id)
+           .order_by('-recorded_at')
+           .values_list('recorded_at', 'latitude', 'longitude')
+           .first())
+    if row is None:
+        return None
+    recorded_at, lat, lng = row
+    return recorded_at.timestamp(), lat, lng
@@ -8,6 +8,11 @@ urlpatterns = [
     path('login/', views.agent_portal, name='agentLogin'),
     path('register/', views.agent_portal, name='agentRegister'),
     
+    # Live tracking
+    path('tracking/token/', views.tracking_token, name='tracking_token'),
+    path('tracking/ping/', views.post_location, name='tracking_ping'),
+    path('orders/<int:order_id>/location/', views.order_location, name='order_location'),
+
     # Logout still uses the built-in Django view
     path('logout/', LogoutView.as_view(next_page='agentPortal'), name='logout'),
 ]
\ No newline at end of file
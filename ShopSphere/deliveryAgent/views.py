@@ -1,3 +1,81 @@
+import json
+
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+
+from user.models import Order
+from .models import Agent
+from . import tracking
 
 # Create your views here.
+
+
+# 🔹 TRACKING TOKEN (agent app logs in once, then sends the token with every ping)
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def tracking_token(request):
+    agent = Agent.objects.filter(username=request.data.get('username'), is_active=True).first()
+    if agent is None or not agent.check_password(request.data.get('password') or ''):
+        return Response({"error": "Invalid credentials"}, status=401)
+    return Response({
+        "token": tracking.make_token(agent),
+        "expires_in": tracking.get_config()['TOKEN_MAX_AGE'],
+    })
+
+
+# 🔹 LOCATION PING (hot path: plain Django view, no DRF request/response machinery)
+@csrf_exempt
+@require_POST
+def post_location(request):
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    agent_id = tracking.token_agent_id(token) if scheme == 'Agent' else None
+    if agent_id is None:
+        return JsonResponse({"error": "Invalid tracking token"}, status=401)
+
+    try:
+        payload = json.loads(request.body)
+        points = payload['points'] if 'points' in payload else [payload]
+        samples = [(float(p['lat']), float(p['lng']), float(p['ts']) if p.get('ts') is not None else None)
+                   for p in points]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Expected {lat, lng[, ts]} or {points: [...]}"}, status=400)
+
+    store = tracking.get_store()
+    accepted = sum(store.record(agent_id, lat, lng, ts) for lat, lng, ts in samples)
+    store.flush_if_due()
+    return JsonResponse({"accepted": accepted, "rejected": len(samples) - accepted})
+
+
+# 🔹 WHERE IS MY ORDER
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def order_location(request, order_id):
+    row = (Order.objects
+           .filter(id=order_id, user=request.user)
+           .values_list('delivery_assignment__agent_id', 'delivery_assignment__status')
+           .first())
+    if row is None:
+        return Response({"error": "Order not found"}, status=404)
+    agent_id, status = row
+    if agent_id is None:
+        return Response({"order": order_id, "status": "awaiting_agent", "location": None})
+
+    position = tracking.agent_position(agent_id) if status != 'delivered' else None
+    location = None
+    if position is not None:
+        ts, lat, lng = position
+        location = {"lat": lat, "lng": lng, "ts": ts}
+    data = {"order": order_id, "status": status, "location": location}
+    track = request.query_params.get('track', '')
+    if track.isdigit() and location is not None:
+        data["track"] = [
+            {"lat": lat, "lng": lng, "ts": ts}
+            for ts, lat, lng in tracking.get_store().track(agent_id, limit=int(track))
+        ]
+    return Response(data)
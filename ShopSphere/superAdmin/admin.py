@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import VendorApprovalLog, ProductApprovalLog
+from django.utils import timezone
+from .models import VendorApprovalLog, ProductApprovalLog, ApprovalLogRollup, OutboxEvent, Job
+from . import jobs
 
 
 @admin.register(VendorApprovalLog)
@@ -7,7 +9,7 @@ class VendorApprovalLogAdmin(admin.ModelAdmin):
     list_display = ('vendor', 'action', 'admin_user', 'timestamp')
     list_filter = ('action', 'timestamp')
     search_fields = ('vendor__shop_name', 'reason')
-    readonly_fields = ('timestamp',)
+    readonly_fields = ('timestamp', 'partition')
 
 
 @admin.register(ProductApprovalLog)
@@ -15,4 +17,42 @@ class ProductApprovalLogAdmin(admin.ModelAdmin):
     list_display = ('product', 'action', 'admin_user', 'timestamp')
     list_filter = ('action', 'timestamp')
     search_fields = ('product__name', 'reason')
-    readonly_fields = ('timestamp',)
+    readonly_fields = ('timestamp', 'partition')
+
+
+@admin.register(ApprovalLogRollup)
+class ApprovalLogRollupAdmin(admin.ModelAdmin):
+    list_display = ('subject_type', 'subject_id', 'partition', 'action', 'count')
+    list_filter = ('subject_type', 'action', 'partition')
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'status', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status', 'event_type')
+    readonly_fields = ('event_type', 'payload', 'attempts', 'claim', 'last_error', 'created_at', 'processed_at')
+    actions = ['retry_events']
+
+    @admin.action(description="Retry selected events")
+    def retry_events(self, request, queryset):
+        queryset.exclude(status='done').update(status='pending', attempts=0, available_at=timezone.now(), claim='')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'priority', 'status', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'task')
+    readonly_fields = ('task', 'kwargs', 'attempts', 'claim', 'last_error', 'created_at', 'finished_at')
+    actions = ['retry_jobs']
+    # Mail jobs carry addresses and message bodies, which moderators do not need to see
+    hidden_kwargs_tasks = (jobs.SEND_MAIL, jobs.SEND_REGISTRATION_OTP)
+
+    def get_fields(self, request, obj=None):
+        fields = super().get_fields(request, obj)
+        if obj is not None and obj.task in self.hidden_kwargs_tasks:
+            fields = [field for field in fields if field != 'kwargs']
+        return fields
+
+    @admin.action(description="Retry selected jobs")
+    def retry_jobs(self, request, queryset):
+        queryset.exclude(status='done').update(status='pending', attempts=0, run_at=timezone.now(), claim='')
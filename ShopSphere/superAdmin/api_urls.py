@@ -1,7 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .api_views import (
-    VendorRequestViewSet, VendorManagementViewSet, ProductManagementViewSet, DashboardView
+    VendorRequestViewSet, VendorManagementViewSet, ProductManagementViewSet, DashboardView,
+    ProfileListView, ProfileDownloadView, ProfileTokenView
 )
 
 router = DefaultRouter()
@@ -12,6 +13,11 @@ router.register(r'products', ProductManagementViewSet, basename='product_managem
 urlpatterns = [
     # Dashboard
     path('dashboard/', DashboardView.as_view(), name='admin_dashboard_api'),
+
+    # Request profiles
+    path('profiles/', ProfileListView.as_view(), name='admin_profile_list'),
+    path('profiles/token/', ProfileTokenView.as_view(), name='admin_profile_token'),
+    path('profiles/<str:name>/', ProfileDownloadView.as_view(), name='admin_profile_download'),
     
     # Router endpoints
     path('', include(router.urls)),
@@ -3,9 +3,13 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q
+from django.http import FileResponse, Http404
+from ShopSphere.projections import ValuesProjection
 from ecommapp.models import VendorProfile, Product
-from .models import VendorApprovalLog, ProductApprovalLog
+from . import auditlog, jobs, outbox, profiling
+from .pagination import ApprovalLogCursorPagination
 from .serializers import (
     VendorApprovalLogSerializer, ProductApprovalLogSerializer,
     AdminVendorDetailSerializer, AdminProductDetailSerializer,
@@ -27,8 +31,12 @@ class VendorRequestViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
     serializer_class = AdminVendorDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
     
+    def get_queryset(self):
+        # Joins follow ?fields= / ?expand=
+        return AdminVendorDetailSerializer.optimize_for(super().get_queryset(), self.get_serializer_context())
+    
     def list(self, request, *args, **kwargs):
-        queryset = VendorProfile.objects.filter(approval_status='pending')
+        queryset = self.get_queryset()
         
         # Search by shop name or owner email
         search = request.query_params.get('search', None)
@@ -38,7 +46,7 @@ class VendorRequestViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
                 Q(user__email__icontains=search)
             )
         
-        serializer = AdminVendorDetailSerializer(queryset, many=True)
+        serializer = AdminVendorDetailSerializer(queryset, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
@@ -56,19 +64,20 @@ class VendorRequestViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
         
         # Update vendor status
         vendor.approval_status = 'approved'
-        vendor.save()
-        
-        # Log the action
-        VendorApprovalLog.objects.create(
-            vendor=vendor,
-            admin_user=request.user,
-            action='approved',
-            reason=serializer.validated_data.get('reason', '')
-        )
+        with transaction.atomic():
+            vendor.save()
+            outbox.emit(outbox.VENDOR_APPROVED, vendor_id=vendor.id, admin_id=request.user.id, reason=serializer.validated_data.get('reason', ''))
+            # Log the action
+            auditlog.log_vendor_action(
+                vendor=vendor,
+                admin_user=request.user,
+                action='approved',
+                reason=serializer.validated_data.get('reason', '')
+            )
         
         return Response({
             'message': 'Vendor approved successfully',
-            'vendor': AdminVendorDetailSerializer(vendor).data
+            'vendor': AdminVendorDetailSerializer(vendor, context=self.get_serializer_context()).data
         })
     
     @action(detail=True, methods=['post'])
@@ -87,19 +96,20 @@ class VendorRequestViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
         # Update vendor status
         vendor.approval_status = 'rejected'
         vendor.rejection_reason = serializer.validated_data['reason']
-        vendor.save()
-        
-        # Log the action
-        VendorApprovalLog.objects.create(
-            vendor=vendor,
-            admin_user=request.user,
-            action='rejected',
-            reason=serializer.validated_data['reason']
-        )
+        with transaction.atomic():
+            vendor.save()
+            outbox.emit(outbox.VENDOR_REJECTED, vendor_id=vendor.id, admin_id=request.user.id, reason=serializer.validated_data['reason'])
+            # Log the action
+            auditlog.log_vendor_action(
+                vendor=vendor,
+                admin_user=request.user,
+                action='rejected',
+                reason=serializer.validated_data['reason']
+            )
         
         return Response({
             'message': 'Vendor rejected successfully',
-            'vendor': AdminVendorDetailSerializer(vendor).data
+            'vendor': AdminVendorDetailSerializer(vendor, context=self.get_serializer_context()).data
         })
 
 
@@ -109,6 +119,10 @@ class VendorManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
     serializer_class = AdminVendorListSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
     
+    def get_queryset(self):
+        # Detail actions render AdminVendorDetailSerializer; joins follow ?fields= / ?expand=
+        return AdminVendorDetailSerializer.optimize_for(super().get_queryset(), self.get_serializer_context())
+    
     def list(self, request, *args, **kwargs):
         queryset = VendorProfile.objects.all()
         
@@ -133,16 +147,27 @@ class VendorManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
         elif blocked_filter == 'false':
             queryset = queryset.filter(is_blocked=False)
         
-        serializer = AdminVendorListSerializer(queryset, many=True)
-        return Response(serializer.data)
+        # values() fast path: same shape as AdminVendorListSerializer, no model instances
+        projection = ValuesProjection(AdminVendorListSerializer, context=self.get_serializer_context())
+        return Response(projection.serialize(queryset))
     
-    @action(detail=True, methods=['get'])
-    def detail(self, request, pk=None):
+    # Not named ``detail``: the router's detail=True init kwarg would shadow the method
+    @action(detail=True, methods=['get'], url_path='detail')
+    def details(self, request, pk=None):
         """Get detailed vendor information"""
         vendor = self.get_object()
-        serializer = AdminVendorDetailSerializer(vendor)
+        serializer = AdminVendorDetailSerializer(vendor, context=self.get_serializer_context())
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'], url_path='approval-logs')
+    def approval_logs(self, request, pk=None):
+        """Keyset-paginated approval log history of a vendor"""
+        vendor = self.get_object()
+        paginator = ApprovalLogCursorPagination()
+        page = paginator.paginate_queryset(auditlog.vendor_logs(vendor), request, view=self)
+        serializer = VendorApprovalLogSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['post'])
     def block(self, request, pk=None):
         """Block a vendor"""
@@ -153,22 +178,22 @@ class VendorManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
         
         vendor.is_blocked = True
         vendor.blocked_reason = serializer.validated_data['reason']
-        vendor.save()
-        
-        # Block all vendor's products
-        Product.objects.filter(vendor=vendor).update(is_blocked=True)
-        
-        # Log the action
-        VendorApprovalLog.objects.create(
-            vendor=vendor,
-            admin_user=request.user,
-            action='blocked',
-            reason=serializer.validated_data['reason']
-        )
+        with transaction.atomic():
+            vendor.save()
+            # Also block all vendor's products, in the background for large catalogs
+            jobs.enqueue(jobs.BLOCK_VENDOR_PRODUCTS, vendor_id=vendor.id, reason=serializer.validated_data['reason'])
+            outbox.emit(outbox.VENDOR_BLOCKED, vendor_id=vendor.id, admin_id=request.user.id, reason=serializer.validated_data['reason'])
+            # Log the action
+            auditlog.log_vendor_action(
+                vendor=vendor,
+                admin_user=request.user,
+                action='blocked',
+                reason=serializer.validated_data['reason']
+            )
         
         return Response({
             'message': 'Vendor blocked successfully',
-            'vendor': AdminVendorDetailSerializer(vendor).data
+            'vendor': AdminVendorDetailSerializer(vendor, context=self.get_serializer_context()).data
         })
     
     @action(detail=True, methods=['post'])
@@ -181,19 +206,20 @@ class VendorManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
         
         vendor.is_blocked = False
         vendor.blocked_reason = ''
-        vendor.save()
-        
-        # Log the action
-        VendorApprovalLog.objects.create(
-            vendor=vendor,
-            admin_user=request.user,
-            action='unblocked',
-            reason=serializer.validated_data.get('reason', '')
-        )
+        with transaction.atomic():
+            vendor.save()
+            outbox.emit(outbox.VENDOR_UNBLOCKED, vendor_id=vendor.id, admin_id=request.user.id, reason=serializer.validated_data.get('reason', ''))
+            # Log the action
+            auditlog.log_vendor_action(
+                vendor=vendor,
+                admin_user=request.user,
+                action='unblocked',
+                reason=serializer.validated_data.get('reason', '')
+            )
         
         return Response({
             'message': 'Vendor unblocked successfully',
-            'vendor': AdminVendorDetailSerializer(vendor).data
+            'vendor': AdminVendorDetailSerializer(vendor, context=self.get_serializer_context()).data
         })
 
 
@@ -203,6 +229,10 @@ class ProductManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
     serializer_class = AdminProductListSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
     
+    def get_queryset(self):
+        # Detail actions render AdminProductDetailSerializer; joins follow ?fields= / ?expand=
+        return AdminProductDetailSerializer.optimize_for(super().get_queryset(), self.get_serializer_context())
+    
     def list(self, request, *args, **kwargs):
         queryset = Product.objects.all()
         
@@ -231,16 +261,27 @@ class ProductManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
         if vendor_id:
             queryset = queryset.filter(vendor_id=vendor_id)
         
-        serializer = AdminProductListSerializer(queryset, many=True)
-        return Response(serializer.data)
+        # values() fast path: same shape as AdminProductListSerializer, no model instances
+        projection = ValuesProjection(AdminProductListSerializer, context=self.get_serializer_context())
+        return Response(projection.serialize(queryset))
     
-    @action(detail=True, methods=['get'])
-    def detail(self, request, pk=None):
+    # Not named ``detail``: the router's detail=True init kwarg would shadow the method
+    @action(detail=True, methods=['get'], url_path='detail')
+    def details(self, request, pk=None):
         """Get detailed product information"""
         product = self.get_object()
-        serializer = AdminProductDetailSerializer(product)
+        serializer = AdminProductDetailSerializer(product, context=self.get_serializer_context())
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'], url_path='approval-logs')
+    def approval_logs(self, request, pk=None):
+        """Keyset-paginated approval log history of a product"""
+        product = self.get_object()
+        paginator = ApprovalLogCursorPagination()
+        page = paginator.paginate_queryset(auditlog.product_logs(product), request, view=self)
+        serializer = ProductApprovalLogSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['post'])
     def block(self, request, pk=None):
         """Block a product"""
@@ -251,19 +292,20 @@ class ProductManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
         
         product.is_blocked = True
         product.blocked_reason = serializer.validated_data['reason']
-        product.save()
-        
-        # Log the action
-        ProductApprovalLog.objects.create(
-            product=product,
-            admin_user=request.user,
-            action='blocked',
-            reason=serializer.validated_data['reason']
-        )
+        with transaction.atomic():
+            product.save()
+            outbox.emit(outbox.PRODUCT_BLOCKED, product_id=product.id, admin_id=request.user.id, reason=serializer.validated_data['reason'])
+            # Log the action
+            auditlog.log_product_action(
+                product=product,
+                admin_user=request.user,
+                action='blocked',
+                reason=serializer.validated_data['reason']
+            )
         
         return Response({
             'message': 'Product blocked successfully',
-            'product': AdminProductDetailSerializer(product).data
+            'product': AdminProductDetailSerializer(product, context=self.get_serializer_context()).data
         })
     
     @action(detail=True, methods=['post'])
@@ -276,19 +318,20 @@ class ProductManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
         
         product.is_blocked = False
         product.blocked_reason = ''
-        product.save()
-        
-        # Log the action
-        ProductApprovalLog.objects.create(
-            product=product,
-            admin_user=request.user,
-            action='unblocked',
-            reason=serializer.validated_data.get('reason', '')
-        )
+        with transaction.atomic():
+            product.save()
+            outbox.emit(outbox.PRODUCT_UNBLOCKED, product_id=product.id, admin_id=request.user.id, reason=serializer.validated_data.get('reason', ''))
+            # Log the action
+            auditlog.log_product_action(
+                product=product,
+                admin_user=request.user,
+                action='unblocked',
+                reason=serializer.validated_data.get('reason', '')
+            )
         
         return Response({
             'message': 'Product unblocked successfully',
-            'product': AdminProductDetailSerializer(product).data
+            'product': AdminProductDetailSerializer(product, context=self.get_serializer_context()).data
         })
 
 
@@ -321,3 +364,38 @@ class DashboardView(AdminLoginRequiredMixin, generics.GenericAPIView):
                 'blocked': blocked_products
             }
         })
+
+
+class ProfileListView(AdminLoginRequiredMixin, generics.GenericAPIView):
+    """List request profiles captured by the profiling middleware"""
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'profiles': profiling.list_profiles()
+        })
+
+
+class ProfileDownloadView(AdminLoginRequiredMixin, generics.GenericAPIView):
+    """Download a single request profile"""
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request, name):
+        path = profiling.profile_path(name)
+        if path is None:
+            raise Http404('Profile not found')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+
+
+class ProfileTokenView(AdminLoginRequiredMixin, generics.GenericAPIView):
+    """Issue a signed token that enables profiling for the current staff user"""
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        config = profiling.get_config()
+        return Response({
+            'token': profiling.make_token(request.user),
+            'header': config['HEADER'],
+            'query_param': config['QUERY_PARAM'],
+            'expires_in': config['TOKEN_MAX_AGE']
+        })
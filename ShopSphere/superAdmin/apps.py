@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SuperadminConfig(AppConfig):
     name = 'superAdmin'
+
+    def ready(self):
+        from . import handlers, tasks  # noqa: F401
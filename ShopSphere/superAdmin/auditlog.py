@@ -0,0 +1,146 @@
+"""
+Writers and bounded readers for vendor/product approval logs.
+
+Moderation views call ``log_vendor_action`` / ``log_product_action`` in the
+same ``transaction.atomic()`` block as the state change and its outbox
+event, so a log row is committed exactly when the change it records is:
+nothing is held in process memory where an idle or killed worker could lose
+it. An approval is a single-row insert next to writes the request makes
+anyway, so batching them bought little.
+
+Rows carry a monthly ``partition`` key; ``prune_approval_logs`` rolls expired
+partitions up into ApprovalLogRollup and deletes them.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import ApprovalLogRollup, ProductApprovalLog, VendorApprovalLog, partition_for
+
+
+DEFAULTS = {
+    'DETAIL_LIMIT': 20,
+    'PAGE_SIZE': 50,
+    'RETENTION_MONTHS': 24,
+}
+
+
+def get_config():
+    """Return AUDIT_LOG settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AUDIT_LOG', {}))
+    return config
+
+
+# ============================================================================
+# WRITERS
+# ============================================================================
+
+def log_vendor_action(vendor, admin_user, action, reason=''):
+    """Write a VendorApprovalLog row; call it inside the transaction of the change"""
+    now = timezone.now()
+    return VendorApprovalLog.objects.create(
+        vendor=vendor,
+        admin_user=admin_user,
+        action=action,
+        reason=reason,
+        timestamp=now,
+        partition=partition_for(now),
+    )
+
+
+def log_product_action(product, admin_user, action, reason=''):
+    """Write a ProductApprovalLog row; call it inside the transaction of the change"""
+    now = timezone.now()
+    return ProductApprovalLog.objects.create(
+        product=product,
+        admin_user=admin_user,
+        action=action,
+        reason=reason,
+        timestamp=now,
+        partition=partition_for(now),
+    )
+
+
+# ============================================================================
+# READERS
+# ============================================================================
+
+def vendor_logs(vendor):
+    """All logs of a vendor, newest first, served by the (vendor, timestamp) index"""
+    return (VendorApprovalLog.objects
+            .filter(vendor=vendor)
+            .select_related('admin_user')
+            .order_by('-timestamp', '-id'))
+
+
+def product_logs(product):
+    """All logs of a product, newest first, served by the (product, timestamp) index"""
+    return (ProductApprovalLog.objects
+            .filter(product=product)
+            .select_related('admin_user')
+            .order_by('-timestamp', '-id'))
+
+
+def latest_vendor_logs(vendor, limit=None):
+    """Bounded slice of the newest vendor logs for detail pages"""
+    return vendor_logs(vendor)[:limit or get_config()['DETAIL_LIMIT']]
+
+
+def latest_product_logs(product, limit=None):
+    """Bounded slice of the newest product logs for detail pages"""
+    return product_logs(product)[:limit or get_config()['DETAIL_LIMIT']]
+
+
+# ============================================================================
+# RETENTION
+# ============================================================================
+
+def _shift_months(partition, months):
+    year, month = divmod(partition, 100)
+    index = year * 12 + (month - 1) - months
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def expired_partition_cutoff(retention_months=None, now=None):
+    """Partitions strictly below the returned key are past retention"""
+    retention_months = retention_months or get_config()['RETENTION_MONTHS']
+    return _shift_months(partition_for(now or timezone.now()), retention_months)
+
+
+def rollup_and_expire(model, subject_type, subject_field, cutoff, dry_run=False):
+    """Roll partitions older than ``cutoff`` into ApprovalLogRollup and delete them"""
+    expired = model.objects.filter(partition__lt=cutoff)
+    counts = (expired
+              .values(subject_field, 'partition', 'action')
+              .annotate(total=Count('id'))
+              .order_by())
+    if dry_run:
+        return sum(row['total'] for row in counts), 0
+
+    with transaction.atomic():
+        existing = {
+            (rollup.subject_id, rollup.partition, rollup.action): rollup
+            for rollup in ApprovalLogRollup.objects.filter(
+                subject_type=subject_type, partition__lt=cutoff
+            )
+        }
+        new_rollups = []
+        for row in counts:
+            key = (row[subject_field], row['partition'], row['action'])
+            if key in existing:
+                existing[key].count += row['total']
+            else:
+                new_rollups.append(ApprovalLogRollup(
+                    subject_type=subject_type,
+                    subject_id=key[0],
+                    partition=key[1],
+                    action=key[2],
+                    count=row['total'],
+                ))
+        ApprovalLogRollup.objects.bulk_update(existing.values(), ['count'], batch_size=500)
+        ApprovalLogRollup.objects.bulk_create(new_rollups, batch_size=500)
+        deleted, _ = expired.delete()
+    return deleted, len(new_rollups)
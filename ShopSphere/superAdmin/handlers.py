@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.mail import send_mass_mail
+
+from ecommapp.models import VendorProfile, Product
+from . import outbox
+
+
+# ============================================================================
+# OUTBOX HANDLERS - moderation notifications (run by `manage.py dispatch_outbox`)
+# ============================================================================
+
+VENDOR_MESSAGES = {
+    outbox.VENDOR_APPROVED: ("Your shop has been approved", "Your shop {shop} is approved and its products are now listed."),
+    outbox.VENDOR_REJECTED: ("Your shop application was rejected", "Your shop {shop} was not approved. Reason: {reason}"),
+    outbox.VENDOR_BLOCKED: ("Your shop has been blocked", "Your shop {shop} has been blocked. Reason: {reason}"),
+    outbox.VENDOR_UNBLOCKED: ("Your shop has been unblocked", "Your shop {shop} is active again."),
+}
+
+PRODUCT_MESSAGES = {
+    outbox.PRODUCT_BLOCKED: ("A product was blocked", "Your product {product} has been blocked. Reason: {reason}"),
+    outbox.PRODUCT_UNBLOCKED: ("A product was unblocked", "Your product {product} is listed again."),
+}
+
+
+@outbox.handler(*VENDOR_MESSAGES)
+def notify_vendor_moderation(batch):
+    vendors = VendorProfile.objects.select_related('user').in_bulk({event.payload['vendor_id'] for event in batch})
+    messages = []
+    for event in batch:
+        vendor = vendors.get(event.payload['vendor_id'])
+        if vendor is None or not vendor.user.email:
+            continue
+        subject, body = VENDOR_MESSAGES[event.event_type]
+        messages.append((subject, body.format(shop=vendor.shop_name, reason=event.payload.get('reason') or '-'),
+                         settings.EMAIL_HOST_USER, [vendor.user.email]))
+    if messages:
+        send_mass_mail(messages)
+
+
+@outbox.handler(*PRODUCT_MESSAGES)
+def notify_product_moderation(batch):
+    products = Product.objects.select_related('vendor__user').in_bulk({event.payload['product_id'] for event in batch})
+    messages = []
+    for event in batch:
+        product = products.get(event.payload['product_id'])
+        if product is None or not product.vendor.user.email:
+            continue
+        subject, body = PRODUCT_MESSAGES[event.event_type]
+        messages.append((subject, body.format(product=product.name, reason=event.payload.get('reason') or '-'),
+                         settings.EMAIL_HOST_USER, [product.vendor.user.email]))
+    if messages:
+        send_mass_mail(messages)
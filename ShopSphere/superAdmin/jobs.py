@@ -0,0 +1,302 @@
+"""
+Database-backed background jobs.
+
+Slow work that a request should not wait for (emails, bulk cascades, file
+handling) is queued with ``enqueue(task_name, **kwargs)``, normally inside
+the transaction that makes it necessary, so a job exists exactly when the
+change was committed. Apps register ``@task(name)`` functions from their
+ready() hooks; keyword arguments must be JSON serialisable.
+
+`manage.py run_jobs` runs PROCESSES worker processes with THREADS threads
+each. A worker claims up to BATCH_SIZE due jobs - highest priority first,
+then oldest ``run_at`` - with a single ``UPDATE ... RETURNING`` statement
+that also pushes their ``run_at`` LEASE_SECONDS ahead, so the lease and
+the claim are one atomic write and a crashed worker's jobs become due again
+on their own. Backends without RETURNING (or SQLite before 3.35) fall back
+to the outbox's conditional UPDATE followed by a read of the claim token.
+
+Finished jobs are marked done in one UPDATE per batch. A failing job is
+retried after RETRY_BASE_SECONDS * 2 ** (attempts - 1) seconds, capped at
+RETRY_MAX_SECONDS, and marked failed after its task's max_attempts.
+Delivery is at-least-once, so tasks must be idempotent and finish within
+LEASE_SECONDS.
+"""
+
+import logging
+import multiprocessing
+import signal
+import threading
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger('shopsphere.jobs')
+
+DEFAULTS = {
+    'THREADS': 4,
+    'PROCESSES': 1,
+    'BATCH_SIZE': 20,
+    'POLL_SECONDS': 1,
+    'LEASE_SECONDS': 300,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BASE_SECONDS': 10,
+    'RETRY_MAX_SECONDS': 3600,
+    'RETENTION_DAYS': 7,
+}
+
+HIGH = 10
+NORMAL = 0
+LOW = -10
+
+SEND_MAIL = 'send_mail'
+BLOCK_VENDOR_PRODUCTS = 'block_vendor_products'
+ATTACH_ID_PROOF = 'attach_id_proof'
+SEND_REGISTRATION_OTP = 'send_registration_otp'
+
+
+def get_config():
+    """Return JOBS settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'JOBS', {}))
+    return config
+
+
+# ============================================================================
+# TASKS AND ENQUEUEING
+# ============================================================================
+
+@dataclass(frozen=True)
+class Task:
+    func: object
+    priority: int
+    max_attempts: int
+
+
+_tasks = {}
+
+
+def task(name, priority=NORMAL, max_attempts=None):
+    """Register ``func(**kwargs)`` as the task ``name``"""
+    def register(func):
+        _tasks[name] = Task(func, priority, max_attempts or get_config()['MAX_ATTEMPTS'])
+        return func
+    return register
+
+
+def enqueue(name, *, priority=None, run_at=None, delay=None, **kwargs):
+    """
+    Queue one job. ``run_at`` (a datetime) or ``delay`` (seconds) schedules
+    it for later; ``priority`` overrides the task's own.
+    """
+    registered = _tasks.get(name)
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+    return Job.objects.create(
+        task=name,
+        kwargs=kwargs,
+        priority=priority if priority is not None else (registered.priority if registered else NORMAL),
+        max_attempts=registered.max_attempts if registered else get_config()['MAX_ATTEMPTS'],
+        run_at=run_at,
+    )
+
+
+# ============================================================================
+# CLAIMING AND SETTLING
+# ============================================================================
+
+def _can_return_from_update():
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
+def _claim_returning(limit, token, now, lease_until):
+    quote = connection.ops.quote_name
+    table = quote(Job._meta.db_table)
+    columns = ', '.join(quote(field.column) for field in Job._meta.concrete_fields)
+    skip_locked = ' FOR UPDATE SKIP LOCKED' if connection.vendor == 'postgresql' else ''
+    sql = (
+        f"UPDATE {table} SET {quote('claim')} = %s, {quote('run_at')} = %s, "
+        f"{quote('attempts')} = {quote('attempts')} + 1 "
+        f"WHERE {quote('id')} IN ("
+        f"SELECT {quote('id')} FROM {table} WHERE {quote('status')} = %s AND {quote('run_at')} <= %s "
+        f"ORDER BY {quote('priority')} DESC, {quote('run_at')}, {quote('id')} LIMIT %s{skip_locked}"
+        f") RETURNING {columns}"
+    )
+    adapt = connection.ops.adapt_datetimefield_value
+    with transaction.atomic():
+        return list(Job.objects.raw(sql, [token, adapt(lease_until), 'pending', adapt(now), limit]))
+
+
+def _claim_by_token(limit, token, now, lease_until):
+    due = list(
+        Job.objects
+        .filter(status='pending', run_at__lte=now)
+        .order_by('-priority', 'run_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not due:
+        return []
+    # The conditional UPDATE is atomic per row, so concurrent workers never share a job
+    Job.objects.filter(id__in=due, status='pending', run_at__lte=now).update(
+        claim=token, run_at=lease_until, attempts=F('attempts') + 1)
+    return list(Job.objects.filter(claim=token))
+
+
+def claim(limit, config=None):
+    """Lease up to ``limit`` due jobs to this worker; highest priority first"""
+    config = config or get_config()
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=config['LEASE_SECONDS'])
+    claim_due = _claim_returning if _can_return_from_update() else _claim_by_token
+    jobs = claim_due(limit, uuid.uuid4().hex, now, lease_until)
+    return sorted(jobs, key=lambda job: (-job.priority, job.id))
+
+
+def release(jobs):
+    """Hand claimed jobs that never started back to the queue"""
+    if jobs:
+        Job.objects.filter(id__in=[job.id for job in jobs]).update(
+            claim='', run_at=timezone.now(), attempts=F('attempts') - 1)
+
+
+def execute(job):
+    """Run one claimed job; returns None or the traceback of its failure"""
+    close_old_connections()
+    try:
+        registered = _tasks.get(job.task)
+        if registered is None:
+            raise LookupError(f"No task is registered as {job.task!r}")
+        registered.func(**job.kwargs)
+        return None
+    except Exception:
+        return traceback.format_exc()
+    finally:
+        close_old_connections()
+
+
+def settle(results, config=None):
+    """Record (job, error) outcomes: one UPDATE for the successes, one per failure"""
+    if not results:
+        return
+    config = config or get_config()
+    now = timezone.now()
+    done = [job.id for job, error in results if error is None]
+    if done:
+        Job.objects.filter(id__in=done).update(status='done', finished_at=now, claim='')
+    for job, error in results:
+        if error is None:
+            continue
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s #%d failed permanently after %d attempts", job.task, job.id, job.attempts)
+            changes = {'status': 'failed', 'finished_at': now}
+        else:
+            backoff = min(config['RETRY_BASE_SECONDS'] * 2 ** (job.attempts - 1), config['RETRY_MAX_SECONDS'])
+            logger.warning("Job %s #%d failed (attempt %d), retrying in %ss", job.task, job.id, job.attempts, backoff)
+            changes = {'run_at': now + timedelta(seconds=backoff)}
+        Job.objects.filter(id=job.id).update(claim='', last_error=error[-4000:], **changes)
+
+
+def prune(config=None):
+    """Delete finished jobs older than RETENTION_DAYS"""
+    config = config or get_config()
+    cutoff = timezone.now() - timedelta(days=config['RETENTION_DAYS'])
+    deleted, _ = Job.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+# ============================================================================
+# WORKERS
+# ============================================================================
+
+class Worker:
+    """
+    One process' worker: the main thread claims and settles, a pool of
+    ``threads`` runs the jobs. Up to BATCH_SIZE claimed jobs wait locally so
+    the pool never idles between claims.
+    """
+
+    def __init__(self, threads=None, config=None):
+        self.config = config or get_config()
+        self.threads = threads or self.config['THREADS']
+        self.stop = threading.Event()
+
+    def run(self, burst=False):
+        """Work until ``stop`` is set, or with ``burst`` until no job is due"""
+        config = self.config
+        running, finished = {}, []
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='jobs') as pool:
+            try:
+                while not self.stop.is_set():
+                    if len(running) <= self.threads:
+                        settle(finished, config)
+                        finished = []
+                        for job in claim(config['BATCH_SIZE'], config):
+                            running[pool.submit(execute, job)] = job
+                    elif len(finished) >= config['BATCH_SIZE']:
+                        settle(finished, config)
+                        finished = []
+                    if not running:
+                        if burst:
+                            break
+                        self.stop.wait(config['POLL_SECONDS'])
+                        continue
+                    completed, _ = wait(list(running), timeout=config['POLL_SECONDS'], return_when=FIRST_COMPLETED)
+                    finished.extend((running.pop(future), future.result()) for future in completed)
+            finally:
+                release([job for future, job in running.items() if future.cancel()])
+                finished.extend((job, future.result()) for future, job in running.items() if not future.cancelled())
+                settle(finished, config)
+
+
+def _work_in_child(threads, burst):
+    worker = Worker(threads)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop.set())
+    worker.run(burst)
+
+
+def run_pool(processes=None, threads=None, burst=False):
+    """Run ``processes`` forked workers of ``threads`` threads each until they exit"""
+    config = get_config()
+    processes = processes or config['PROCESSES']
+    if processes == 1:
+        worker = Worker(threads, config)
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop.set())
+        try:
+            worker.run(burst)
+        except KeyboardInterrupt:
+            worker.stop.set()
+        return
+
+    # Forked children must not share the parent's database connections
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    children = [context.Process(target=_work_in_child, args=(threads, burst), daemon=True)
+                for _ in range(processes)]
+    for child in children:
+        child.start()
+
+    def forward(*_):
+        for child in children:
+            if child.is_alive():
+                child.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        # Ctrl-C already reached the children through the process group
+        for child in children:
+            child.join()
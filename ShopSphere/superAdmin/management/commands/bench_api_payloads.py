@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from ShopSphere import compression, renderers
+from ShopSphere.projections import ValuesProjection
+from superAdmin.serializers import AdminProductListSerializer, AdminVendorListSerializer
+from vendor.models import Product, VendorProfile
+from vendor.serializers import ProductListSerializer
+from .bench_list_serializers import Command as SerializerBench
+
+
+class Command(BaseCommand):
+    help = (
+        "Encode time and bytes on the wire of the main list payloads: DRF's JSONRenderer vs FastJSONRenderer, "
+        "uncompressed vs gzip/brotli. Seeds synthetic rows inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="Products to seed")
+        parser.add_argument('--vendors', type=int, default=200, help="Vendors to seed")
+        parser.add_argument('--repeat', type=int, default=5, help="Timing runs per case (best is kept)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            SerializerBench()._seed(options['rows'], options['vendors'])
+            cases = [
+                ('AdminProductListSerializer', AdminProductListSerializer, Product.objects.all()),
+                ('ProductListSerializer', ProductListSerializer, Product.objects.all()),
+                ('AdminVendorListSerializer', AdminVendorListSerializer, VendorProfile.objects.all()),
+            ]
+            for label, serializer_class, queryset in cases:
+                self._compare(label, ValuesProjection(serializer_class).serialize(queryset), options['repeat'])
+            transaction.set_rollback(True)
+
+    def _time(self, fn, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def _compare(self, label, rows, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{label} ({len(rows)} rows)"))
+        base_time, body = self._time(lambda: JSONRenderer().render(rows), repeat)
+        encoders = [('DRF JSONRenderer', base_time, body)]
+        encoders.append(('stdlib fallback', *self._time(lambda: renderers.dumps_stdlib(rows), repeat)))
+        if renderers.orjson is not None:
+            encoders.append(('orjson', *self._time(lambda: renderers.dumps(rows), repeat)))
+        for name, elapsed, encoded in encoders:
+            self.stdout.write(
+                f"  encode {name:17s}: {elapsed * 1000:8.1f} ms  x{base_time / elapsed:4.1f}  "
+                f"identical: {'yes' if encoded == body else 'NO'}"
+            )
+
+        config = compression.get_config()
+        codings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+        self.stdout.write(f"  wire   {'identity':17s}: {len(body) / 1024:8.1f} KiB")
+        for coding in codings:
+            elapsed, compressed = self._time(lambda: compression.compress(body, coding, config), repeat)
+            self.stdout.write(
+                f"  wire   {coding:17s}: {len(compressed) / 1024:8.1f} KiB  "
+                f"-{100 * (1 - len(compressed) / len(body)):.0f}%  in {elapsed * 1000:.1f} ms"
+            )
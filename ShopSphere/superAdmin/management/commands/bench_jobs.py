@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from superAdmin import jobs
+from superAdmin.models import Job
+
+
+BENCH_TASK = 'bench_jobs.sleep'
+
+
+@jobs.task(BENCH_TASK)
+def sleep(ms):
+    if ms:
+        time.sleep(ms / 1000)
+
+
+class Command(BaseCommand):
+    help = "Queue synthetic jobs, drain them with run_jobs' worker pool and report jobs per second"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=5000)
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--work-ms', type=float, default=0, help="Time each job sleeps")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        start = time.perf_counter()
+        Job.objects.bulk_create(
+            [Job(task=BENCH_TASK, kwargs={'ms': options['work_ms']}, priority=index % 3 - 1, run_at=now)
+             for index in range(options['jobs'])],
+            batch_size=1000,
+        )
+        self.stdout.write(f"queued {options['jobs']} jobs in {time.perf_counter() - start:.2f}s")
+
+        try:
+            start = time.perf_counter()
+            jobs.run_pool(options['processes'], options['threads'], burst=True)
+            elapsed = time.perf_counter() - start
+            done = Job.objects.filter(task=BENCH_TASK, status='done').count()
+            self.stdout.write(
+                f"{options['processes']} process(es) x {options['threads']} thread(s): {done} jobs in {elapsed:.2f}s, "
+                f"{done / elapsed:.0f} jobs/s"
+            )
+        finally:
+            Job.objects.filter(task=BENCH_TASK).delete()
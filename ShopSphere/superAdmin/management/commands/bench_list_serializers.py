@@ -0,0 +1,108 @@
+import gc
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ShopSphere.projections import ValuesProjection
+from superAdmin.serializers import AdminProductListSerializer, AdminVendorListSerializer
+from vendor.models import Product, VendorProfile
+from vendor.serializers import ProductListSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ModelSerializer and ValuesProjection on the admin/vendor list endpoints. "
+        "Seeds synthetic rows inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="Products to seed")
+        parser.add_argument('--vendors', type=int, default=200, help="Vendors to seed")
+        parser.add_argument('--repeat', type=int, default=3, help="Timing runs per case (best is kept)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._seed(options['rows'], options['vendors'])
+            cases = [
+                ('AdminProductListSerializer', AdminProductListSerializer, Product.objects.all()),
+                ('ProductListSerializer', ProductListSerializer, Product.objects.all()),
+                ('AdminVendorListSerializer', AdminVendorListSerializer, VendorProfile.objects.all()),
+            ]
+            for label, serializer_class, queryset in cases:
+                self._compare(label, serializer_class, queryset, options['repeat'])
+            transaction.set_rollback(True)
+
+    def _seed(self, rows, vendors):
+        user_model = VendorProfile._meta.get_field('user').related_model
+        users = user_model.objects.bulk_create([
+            user_model(username=f"bench-vendor-{i}", email=f"bench-vendor-{i}@example.com")
+            for i in range(vendors)
+        ])
+        if users[0].pk is None:
+            users = list(user_model.objects.filter(username__startswith='bench-vendor-'))
+        profiles = VendorProfile.objects.bulk_create([
+            VendorProfile(
+                user=user,
+                shop_name=f"Bench Shop {i}",
+                shop_description="Benchmark vendor",
+                address="Bench street",
+                business_type='retail',
+                approval_status=('approved', 'pending', 'rejected')[i % 3],
+            )
+            for i, user in enumerate(users)
+        ])
+        if profiles[0].pk is None:
+            profiles = list(VendorProfile.objects.filter(user__in=users))
+        Product.objects.bulk_create([
+            Product(
+                vendor=profiles[i % len(profiles)],
+                name=f"Bench product {i}",
+                description="Benchmark product",
+                price=Decimal(i % 5000) + Decimal('0.99'),
+                quantity=i % 50,
+            )
+            for i in range(rows)
+        ], batch_size=1000)
+
+    def _time(self, fn, repeat):
+        best = None
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def _peak_allocation(self, fn):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak
+
+    def _compare(self, label, serializer_class, queryset, repeat):
+        def baseline():
+            return [dict(row) for row in serializer_class(queryset.all(), many=True).data]
+
+        def projected():
+            return ValuesProjection(serializer_class).serialize(queryset.all())
+
+        base_time, base_rows = self._time(baseline, repeat)
+        fast_time, fast_rows = self._time(projected, repeat)
+        base_peak = self._peak_allocation(baseline)
+        fast_peak = self._peak_allocation(projected)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{label} ({len(base_rows)} rows)"))
+        self.stdout.write(f"  ModelSerializer : {base_time * 1000:9.1f} ms  peak {base_peak / 1024 / 1024:7.1f} MiB")
+        self.stdout.write(f"  ValuesProjection: {fast_time * 1000:9.1f} ms  peak {fast_peak / 1024 / 1024:7.1f} MiB")
+        self.stdout.write(
+            f"  speedup x{base_time / fast_time:.1f}, allocation -{100 * (1 - fast_peak / base_peak):.0f}%, "
+            f"identical output: {'yes' if base_rows == fast_rows else 'NO'}"
+        )
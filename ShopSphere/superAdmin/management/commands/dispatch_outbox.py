@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from superAdmin import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox domain events to their handlers in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain due events once and exit")
+        parser.add_argument('--interval', type=float, default=None, help="Seconds to sleep when idle")
+        parser.add_argument('--prune-every', type=int, default=3600,
+                            help="Seconds between deletions of old delivered events")
+
+    def handle(self, *args, **options):
+        config = outbox.get_config()
+        interval = options['interval'] or config['TICK_SECONDS']
+        last_prune = 0
+        while True:
+            start = time.perf_counter()
+            delivered, failed = outbox.dispatch_batch(config)
+            if delivered or failed:
+                self.stdout.write(
+                    f"Delivered {delivered} events, {failed} failed permanently "
+                    f"({(time.perf_counter() - start) * 1000:.1f} ms)"
+                )
+            if time.monotonic() - last_prune >= options['prune_every']:
+                pruned = outbox.prune(config)
+                if pruned:
+                    self.stdout.write(f"Pruned {pruned} delivered events")
+                last_prune = time.monotonic()
+            if delivered + failed >= config['BATCH_SIZE']:
+                continue
+            if options['once']:
+                return
+            time.sleep(interval)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from superAdmin import auditlog
+from superAdmin.models import ProductApprovalLog, VendorApprovalLog
+
+
+class Command(BaseCommand):
+    help = "Roll up and delete approval log partitions older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=None,
+            help="Retention in months (defaults to AUDIT_LOG['RETENTION_MONTHS'])",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be expired")
+
+    def handle(self, *args, **options):
+        cutoff = auditlog.expired_partition_cutoff(options['months'])
+        self.stdout.write(f"Expiring partitions before {cutoff}")
+
+        for model, subject_type, subject_field in (
+            (VendorApprovalLog, 'vendor', 'vendor_id'),
+            (ProductApprovalLog, 'product', 'product_id'),
+        ):
+            rows, rollups = auditlog.rollup_and_expire(
+                model, subject_type, subject_field, cutoff, dry_run=options['dry_run']
+            )
+            if options['dry_run']:
+                self.stdout.write(f"{model.__name__}: {rows} rows would be rolled up")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{model.__name__}: deleted {rows} rows, created {rollups} rollups"
+                ))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from superAdmin import querylog
+
+
+class Command(BaseCommand):
+    help = "Show the top-N SQL fingerprints recorded by the slow-query log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--limit', type=int, default=20, help="Number of fingerprints to show")
+        parser.add_argument(
+            '--sort', choices=['total', 'count', 'max', 'avg'], default='total',
+            help="Metric to rank by",
+        )
+        parser.add_argument('--by-view', action='store_true', help="Aggregate per calling view")
+        parser.add_argument('--slow', action='store_true', help="Also list the most recent slow queries")
+        parser.add_argument('--dir', default=None, help="Snapshot directory (defaults to QUERYLOG['SNAPSHOT_DIR'])")
+        parser.add_argument('--keep-stale', action='store_true',
+                            help="Also read (and keep) snapshots of exited or long-idle processes")
+
+    def handle(self, *args, **options):
+        snapshots = querylog.load_snapshots(options['dir'], prune=not options['keep_stale'])
+        if not snapshots:
+            self.stdout.write(self.style.WARNING("No query log snapshots found"))
+            return
+
+        merged = querylog.merge_snapshots(snapshots, by_view=options['by_view'])
+        sort_keys = {
+            'total': lambda item: item[1][1],
+            'count': lambda item: item[1][0],
+            'max': lambda item: item[1][2],
+            'avg': lambda item: item[1][1] / item[1][0],
+        }
+        rows = sorted(merged.items(), key=sort_keys[options['sort']], reverse=True)[:options['limit']]
+
+        self.stdout.write(
+            f"{len(snapshots)} process snapshot(s), {len(merged)} distinct entries, sorted by {options['sort']}"
+        )
+        self.stdout.write(f"{'count':>8} {'total ms':>12} {'avg ms':>9} {'max ms':>9}  query")
+        for key, (count, total_ms, max_ms) in rows:
+            label = f"[{key[0]}] {key[1]}" if options['by_view'] else key
+            self.stdout.write(
+                f"{count:>8} {total_ms:>12.1f} {total_ms / count:>9.2f} {max_ms:>9.1f}  {label}"
+            )
+
+        if options['slow']:
+            slow = sorted(
+                (entry for snap in snapshots for entry in snap['slow_queries']),
+                key=lambda entry: entry['at'], reverse=True,
+            )[:options['limit']]
+            self.stdout.write("")
+            self.stdout.write(self.style.MIGRATE_HEADING("Recent slow queries"))
+            for entry in slow:
+                self.stdout.write(
+                    f"{entry['duration_ms']:>9.1f} ms  {entry['view']}  {entry['frame'] or '?'}\n"
+                    f"             {entry['fingerprint']}"
+                )
@@ -0,0 +1,40 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from superAdmin import jobs
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue with a pool of worker processes and threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None, help="Worker processes (default JOBS['PROCESSES'])")
+        parser.add_argument('--threads', type=int, default=None, help="Threads per process (default JOBS['THREADS'])")
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is due")
+        parser.add_argument('--prune-every', type=int, default=3600,
+                            help="Seconds between deletions of old finished jobs")
+
+    def handle(self, *args, **options):
+        config = jobs.get_config()
+        processes = options['processes'] or config['PROCESSES']
+        threads = options['threads'] or config['THREADS']
+        pruned = jobs.prune(config)
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} finished jobs")
+
+        stop = threading.Event()
+
+        def prune_periodically():
+            while not stop.wait(options['prune_every']):
+                jobs.prune(config)
+
+        threading.Thread(target=prune_periodically, name='jobs-prune', daemon=True).start()
+        self.stdout.write(f"Running jobs with {processes} process(es) x {threads} thread(s)")
+        start = time.perf_counter()
+        try:
+            jobs.run_pool(processes, threads, burst=options['burst'])
+        finally:
+            stop.set()
+        self.stdout.write(f"Workers stopped after {time.perf_counter() - start:.1f}s")
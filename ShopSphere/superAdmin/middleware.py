@@ -0,0 +1,38 @@
+from . import profiling, querylog
+
+
+class QueryLogMiddleware:
+    """Attribute every query of a request to its view and feed the slow-query log"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not querylog.get_config()['ENABLED']:
+            return self.get_response(request)
+
+        with querylog.capture(view_name=request.path):
+            response = self.get_response(request)
+
+        querylog.maybe_dump_snapshot()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        view_name = (match.view_name if match else None) or view_func.__qualname__
+        querylog.current_view.set(view_name)
+        return None
+
+
+class ProfilingMiddleware:
+    """Profile individual requests on demand (signed staff token) or by URL sampling rate"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason = profiling.should_profile(request)
+        if reason is None:
+            return self.get_response(request)
+        return profiling.run_profiled(request, self.get_response, reason)
+
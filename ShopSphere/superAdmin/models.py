@@ -4,6 +4,11 @@ from django.utils import timezone
 from ecommapp.models import VendorProfile, Product
 
 
+def partition_for(timestamp):
+    """Monthly partition key (YYYYMM) used to group, roll up and expire audit rows"""
+    return timestamp.year * 100 + timestamp.month
+
+
 class VendorApprovalLog(models.Model):
     """
     Log for tracking vendor approval/rejection actions and admin notes.
@@ -23,9 +28,18 @@ class VendorApprovalLog(models.Model):
     action = models.CharField(max_length=20, choices=ACTION_CHOICES)
     reason = models.TextField(blank=True, null=True)
     timestamp = models.DateTimeField(default=timezone.now)
+    partition = models.PositiveIntegerField(editable=False, help_text="YYYYMM of timestamp")
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['vendor', '-timestamp', '-id'], name='vendorlog_vendor_ts_idx'),
+            models.Index(fields=['partition'], name='vendorlog_partition_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.partition = partition_for(self.timestamp)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.vendor.shop_name} - {self.action} by {self.admin_user.username if self.admin_user else 'System'}"
@@ -47,9 +61,117 @@ class ProductApprovalLog(models.Model):
     action = models.CharField(max_length=20, choices=ACTION_CHOICES)
     reason = models.TextField(blank=True, null=True)
     timestamp = models.DateTimeField(default=timezone.now)
+    partition = models.PositiveIntegerField(editable=False, help_text="YYYYMM of timestamp")
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['product', '-timestamp', '-id'], name='productlog_product_ts_idx'),
+            models.Index(fields=['partition'], name='productlog_partition_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.partition = partition_for(self.timestamp)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.product.name} - {self.action} by {self.admin_user.username if self.admin_user else 'System'}"
+
+
+class ApprovalLogRollup(models.Model):
+    """
+    Monthly per-subject action counts kept after old approval log
+    partitions are expired by the retention policy.
+    """
+
+    SUBJECT_CHOICES = [
+        ('vendor', 'Vendor'),
+        ('product', 'Product'),
+    ]
+
+    subject_type = models.CharField(max_length=10, choices=SUBJECT_CHOICES)
+    subject_id = models.PositiveIntegerField()
+    partition = models.PositiveIntegerField(help_text="YYYYMM")
+    action = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-partition']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subject_type', 'subject_id', 'partition', 'action'],
+                name='approval_log_rollup_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject_type} {self.subject_id} {self.partition} {self.action}: {self.count}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Domain event written in the same transaction as the state change it
+    describes and delivered to handlers by superAdmin/outbox.py.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # Earliest time the event may be (re)claimed; doubles as the claim lease
+    available_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at', 'id'], name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id} ({self.status})"
+
+
+class Job(models.Model):
+    """
+    Background job stored in the database and run by `manage.py run_jobs`
+    (superAdmin/jobs.py).
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict)
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Earliest time the job may be (re)claimed; doubles as the claim lease
+    run_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at', 'id'], name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.id} ({self.status})"
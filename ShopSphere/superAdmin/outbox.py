@@ -0,0 +1,155 @@
+"""
+Transactional outbox for domain events.
+
+Views record a state change and call ``emit`` inside the same
+transaction, so the event exists exactly when the change was committed and
+the request pays for one extra INSERT. Everything slow (emails, storefront
+resyncs, SSE fan-out, delivery dispatch) runs in handlers that apps
+register with ``@handler('event_type')`` from their ready() hooks.
+
+``dispatch_batch`` (run in a loop by `manage.py dispatch_outbox`) claims up
+to OUTBOX['BATCH_SIZE'] due events with a lease, groups them by type and
+calls each handler once per group with the list of events. A failing batch
+is retried event by event so one bad event cannot hold back the rest.
+Delivery is at-least-once: a crashed dispatcher's lease expires and the
+events are claimed again, so handlers must be idempotent.
+"""
+
+import logging
+import traceback
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+
+logger = logging.getLogger('shopsphere.outbox')
+
+DEFAULTS = {
+    'BATCH_SIZE': 200,
+    'TICK_SECONDS': 1,
+    'LEASE_SECONDS': 60,
+    'MAX_ATTEMPTS': 8,
+    'RETRY_BASE_SECONDS': 5,
+    'RETENTION_DAYS': 7,
+}
+
+ORDER_PLACED = 'order_placed'
+VENDOR_APPROVED = 'vendor_approved'
+VENDOR_REJECTED = 'vendor_rejected'
+VENDOR_BLOCKED = 'vendor_blocked'
+VENDOR_UNBLOCKED = 'vendor_unblocked'
+VENDOR_UPDATED = 'vendor_updated'
+PRODUCT_BLOCKED = 'product_blocked'
+PRODUCT_UNBLOCKED = 'product_unblocked'
+
+_handlers = defaultdict(list)
+
+
+def get_config():
+    """Return OUTBOX settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'OUTBOX', {}))
+    return config
+
+
+def handler(*event_types):
+    """Register ``func(events)`` for the given event types; ``events`` is a list of OutboxEvent"""
+    def register(func):
+        for event_type in event_types:
+            if func not in _handlers[event_type]:
+                _handlers[event_type].append(func)
+        return func
+    return register
+
+
+def emit(event_type, **payload):
+    """Queue a domain event; call inside the transaction that makes the change"""
+    return OutboxEvent.objects.create(event_type=event_type, payload=payload)
+
+
+def _claim(config):
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = list(
+        OutboxEvent.objects
+        .filter(status='pending', available_at__lte=now)
+        .order_by('id')
+        .values_list('id', flat=True)[:config['BATCH_SIZE']]
+    )
+    if not due:
+        return []
+    # The conditional UPDATE is atomic per row, so concurrent dispatchers never share an event
+    OutboxEvent.objects.filter(id__in=due, status='pending', available_at__lte=now).update(
+        claim=token,
+        available_at=now + timedelta(seconds=config['LEASE_SECONDS']),
+    )
+    return list(OutboxEvent.objects.filter(claim=token).order_by('id'))
+
+
+def _run(func, events):
+    with transaction.atomic():
+        func(events)
+
+
+def dispatch_batch(config=None):
+    """Deliver one batch of due events; returns (delivered, failed)"""
+    config = config or get_config()
+    events = _claim(config)
+    if not events:
+        return 0, 0
+
+    by_type = defaultdict(list)
+    for event in events:
+        by_type[event.event_type].append(event)
+
+    errors = {}
+    for event_type, group in by_type.items():
+        for func in _handlers.get(event_type, []):
+            pending = [event for event in group if event.id not in errors]
+            if not pending:
+                break
+            try:
+                _run(func, pending)
+            except Exception:
+                logger.warning("Outbox handler %s failed for a batch of %d %s events; retrying one by one",
+                               func.__qualname__, len(pending), event_type)
+                for event in pending:
+                    try:
+                        _run(func, [event])
+                    except Exception:
+                        errors[event.id] = traceback.format_exc()
+
+    now = timezone.now()
+    done = [event.id for event in events if event.id not in errors]
+    OutboxEvent.objects.filter(id__in=done).update(status='done', processed_at=now, claim='')
+
+    failed = 0
+    for event in events:
+        if event.id not in errors:
+            continue
+        event.attempts += 1
+        event.last_error = errors[event.id][-4000:]
+        event.claim = ''
+        if event.attempts >= config['MAX_ATTEMPTS']:
+            event.status = 'failed'
+            failed += 1
+            logger.error("Outbox event %s #%d failed permanently", event.event_type, event.id)
+        else:
+            backoff = config['RETRY_BASE_SECONDS'] * 2 ** (event.attempts - 1)
+            event.available_at = now + timedelta(seconds=backoff)
+        event.save(update_fields=['attempts', 'last_error', 'claim', 'status', 'available_at'])
+    return len(done), failed
+
+
+def prune(config=None):
+    """Delete delivered events older than RETENTION_DAYS"""
+    config = config or get_config()
+    cutoff = timezone.now() - timedelta(days=config['RETENTION_DAYS'])
+    deleted, _ = OutboxEvent.objects.filter(status='done', processed_at__lt=cutoff).delete()
+    return deleted
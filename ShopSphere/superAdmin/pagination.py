@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+from .auditlog import get_config
+
+
+class ApprovalLogCursorPagination(CursorPagination):
+    """Keyset pagination over (subject, timestamp, id) for approval log history"""
+    ordering = ('-timestamp', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        self.page_size = get_config()['PAGE_SIZE']
+        return super().get_page_size(request)
@@ -0,0 +1,248 @@
+"""
+Opt-in request profiler.
+
+A request is profiled when it carries a signed profiling token (header or
+query parameter) issued to a staff user, or when its URL name is drawn by
+the per-URL sampling rate in PROFILING['SAMPLE_RATES'].
+
+The default ``sampler`` mode polls the request thread's stack every
+SAMPLE_INTERVAL seconds and writes a collapsed-stack (``.folded``) file that
+flamegraph.pl / speedscope can render directly. ``cprofile`` mode writes a
+pstats dump instead. Output goes to a bounded directory; the oldest files
+are rotated out once MAX_FILES or MAX_BYTES is exceeded.
+"""
+
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.urls import Resolver404, resolve
+
+
+logger = logging.getLogger('shopsphere.profiling')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MODE': 'sampler',
+    'SAMPLE_INTERVAL': 0.005,
+    'SAMPLE_RATES': {},
+    'HEADER': 'X-Profile',
+    'QUERY_PARAM': '_profile',
+    'TOKEN_MAX_AGE': 60 * 60,
+    'DIRECTORY': None,
+    'MAX_FILES': 200,
+    'MAX_BYTES': 200 * 1024 * 1024,
+}
+
+TOKEN_SALT = 'superAdmin.profiling'
+PROFILE_NAME_RE = re.compile(r'^[\w.-]+\.(folded|prof)$')
+
+
+def get_config():
+    """Return PROFILING settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PROFILING', {}))
+    if not config['DIRECTORY']:
+        config['DIRECTORY'] = os.path.join(settings.BASE_DIR, 'var', 'profiles')
+    return config
+
+
+# ============================================================================
+# TOKENS
+# ============================================================================
+
+def make_token(user):
+    """Signed, expiring token that lets a staff user profile their own requests"""
+    return signing.dumps({'u': user.pk}, salt=TOKEN_SALT)
+
+
+def token_user_id(token, max_age):
+    """Return the user id inside a valid token, or None"""
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+    except signing.BadSignature:
+        return None
+    return payload.get('u')
+
+
+def _token_allows(request, config):
+    token = request.headers.get(config['HEADER']) or request.GET.get(config['QUERY_PARAM'])
+    if not token:
+        return False
+    user_id = token_user_id(token, config['TOKEN_MAX_AGE'])
+    if user_id is None:
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.pk == user_id and user.is_staff
+    return get_user_model().objects.filter(pk=user_id, is_staff=True, is_active=True).exists()
+
+
+def _sampled(request, config):
+    rates = config['SAMPLE_RATES']
+    if not rates:
+        return False
+    try:
+        url_name = resolve(request.path_info).url_name
+    except Resolver404:
+        return False
+    rate = rates.get(url_name)
+    return bool(rate) and random.random() < rate
+
+
+def should_profile(request):
+    """Decide whether this request is profiled and why"""
+    config = get_config()
+    if not config['ENABLED']:
+        return None
+    if _token_allows(request, config):
+        return 'token'
+    if _sampled(request, config):
+        return 'sampled'
+    return None
+
+
+# ============================================================================
+# PROFILERS
+# ============================================================================
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Statistical sampler that polls one thread's stack from a helper thread"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[';'.join(stack)] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def write(self, path):
+        with open(path, 'w') as fh:
+            for stack, count in self.samples.most_common():
+                fh.write(f"{stack} {count}\n")
+
+
+class CProfileRunner:
+    """Deterministic profiler writing a pstats dump"""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        return False
+
+    def write(self, path):
+        self.profiler.dump_stats(path)
+
+
+# ============================================================================
+# STORAGE
+# ============================================================================
+
+def list_profiles(directory=None):
+    """Profiles in the directory, newest first"""
+    directory = directory or get_config()['DIRECTORY']
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if not PROFILE_NAME_RE.match(name):
+            continue
+        stat = os.stat(os.path.join(directory, name))
+        profiles.append({'name': name, 'size': stat.st_size, 'created_at': stat.st_mtime})
+    profiles.sort(key=lambda profile: profile['created_at'], reverse=True)
+    return profiles
+
+
+def profile_path(name, directory=None):
+    """Absolute path of a stored profile, or None for names that are not ours"""
+    if not PROFILE_NAME_RE.match(name):
+        return None
+    path = os.path.join(directory or get_config()['DIRECTORY'], name)
+    return path if os.path.isfile(path) else None
+
+
+def rotate(directory, max_files, max_bytes):
+    """Delete the oldest profiles until the directory is within its bounds"""
+    profiles = list_profiles(directory)
+    total = sum(profile['size'] for profile in profiles)
+    while profiles and (len(profiles) > max_files or total > max_bytes):
+        oldest = profiles.pop()
+        total -= oldest['size']
+        try:
+            os.remove(os.path.join(directory, oldest['name']))
+        except FileNotFoundError:
+            pass
+
+
+def run_profiled(request, get_response, reason):
+    """Run ``get_response`` under the configured profiler and store the output"""
+    config = get_config()
+    if config['MODE'] == 'cprofile':
+        profiler, extension = CProfileRunner(), 'prof'
+    else:
+        profiler, extension = StackSampler(config['SAMPLE_INTERVAL']), 'folded'
+
+    start = time.perf_counter()
+    with profiler:
+        response = get_response(request)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    match = request.resolver_match
+    url_name = re.sub(r'[^\w-]', '_', (match.url_name if match else None) or 'unresolved')
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{url_name}-{reason}-{uuid.uuid4().hex[:8]}.{extension}"
+    directory = config['DIRECTORY']
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        profiler.write(tmp_path)
+        os.replace(tmp_path, os.path.join(directory, name))
+        rotate(directory, config['MAX_FILES'], config['MAX_BYTES'])
+    except OSError:
+        logger.exception("Could not write request profile")
+        return response
+
+    logger.info("Profiled %s (%s) in %.1f ms -> %s", request.path, reason, elapsed_ms, name)
+    response['X-Profile-Id'] = name
+    return response
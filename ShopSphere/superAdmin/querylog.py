@@ -0,0 +1,313 @@
+"""
+Slow-query log with SQL fingerprinting.
+
+Every query that goes through a wrapped connection is normalised into a
+fingerprint (literals and placeholder lists stripped) and aggregated into
+count / total time / max time, both globally and per calling view.
+Queries slower than QUERYLOG['SLOW_MS'] are logged together with the first
+stack frame that belongs to this project.
+
+Storage is bounded: at most MAX_FINGERPRINTS aggregates are kept (least
+recently seen are evicted) and the recent slow queries live in a ring buffer.
+Each process periodically dumps its aggregates to SNAPSHOT_DIR so the
+``querylog_top`` management command can read them. Snapshots of processes
+that have exited, or that were not refreshed for SNAPSHOT_RETENTION seconds,
+are deleted when the directory is read.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('shopsphere.querylog')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SLOW_MS': 100,
+    'MAX_FINGERPRINTS': 500,
+    'MAX_VIEW_FINGERPRINTS': 2000,
+    'RECENT_SLOW': 200,
+    'SNAPSHOT_DIR': None,
+    'SNAPSHOT_INTERVAL': 30,
+    'SNAPSHOT_RETENTION': 60 * 60,
+}
+
+current_view = contextvars.ContextVar('querylog_current_view', default='-')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_VALUES_RE = re.compile(r'\bVALUES\s*\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def get_config():
+    """Return QUERYLOG settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'QUERYLOG', {}))
+    if not config['SNAPSHOT_DIR']:
+        config['SNAPSHOT_DIR'] = os.path.join(settings.BASE_DIR, 'var', 'querylog')
+    return config
+
+
+def fingerprint(sql):
+    """Normalise SQL so that queries differing only in literals collapse together"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    sql = _VALUES_RE.sub('VALUES (...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def _caller_frame():
+    """First stack frame that lives in this project (not Django, not this module)"""
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base_dir)
+                and filename != __file__
+                and 'site-packages' not in filename):
+            return f"{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class QueryStats:
+    """Bounded, thread-safe aggregation of query timings"""
+
+    def __init__(self, max_fingerprints, max_view_fingerprints, recent_slow):
+        self._lock = threading.Lock()
+        self.max_fingerprints = max_fingerprints
+        self.max_view_fingerprints = max_view_fingerprints
+        # fingerprint -> [count, total_ms, max_ms]
+        self.by_fingerprint = OrderedDict()
+        # (view, fingerprint) -> [count, total_ms, max_ms]
+        self.by_view = OrderedDict()
+        self.slow_queries = deque(maxlen=recent_slow)
+
+    @staticmethod
+    def _bump(table, key, duration_ms, limit):
+        entry = table.get(key)
+        if entry is None:
+            if len(table) >= limit:
+                table.popitem(last=False)
+            table[key] = [1, duration_ms, duration_ms]
+            return
+        entry[0] += 1
+        entry[1] += duration_ms
+        if duration_ms > entry[2]:
+            entry[2] = duration_ms
+        table.move_to_end(key)
+
+    def record(self, fp, view, duration_ms):
+        with self._lock:
+            self._bump(self.by_fingerprint, fp, duration_ms, self.max_fingerprints)
+            self._bump(self.by_view, (view, fp), duration_ms, self.max_view_fingerprints)
+
+    def record_slow(self, entry):
+        with self._lock:
+            self.slow_queries.append(entry)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'generated_at': time.time(),
+                'fingerprints': [
+                    {'fingerprint': fp, 'count': c, 'total_ms': t, 'max_ms': m}
+                    for fp, (c, t, m) in self.by_fingerprint.items()
+                ],
+                'views': [
+                    {'view': view, 'fingerprint': fp, 'count': c, 'total_ms': t, 'max_ms': m}
+                    for (view, fp), (c, t, m) in self.by_view.items()
+                ],
+                'slow_queries': list(self.slow_queries),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.by_fingerprint.clear()
+            self.by_view.clear()
+            self.slow_queries.clear()
+
+
+class QueryRecorder:
+    """Execute wrapper installed with ``connection.execute_wrapper``"""
+
+    def __init__(self, stats, slow_ms):
+        self.stats = stats
+        self.slow_ms = slow_ms
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            fp = fingerprint(sql)
+            view = current_view.get()
+            self.stats.record(fp, view, duration_ms)
+            if duration_ms >= self.slow_ms:
+                frame = _caller_frame()
+                self.stats.record_slow({
+                    'fingerprint': fp,
+                    'view': view,
+                    'duration_ms': round(duration_ms, 3),
+                    'frame': frame,
+                    'database': context['connection'].alias,
+                    'at': time.time(),
+                })
+                logger.warning(
+                    "Slow query (%.1f ms) in %s at %s: %s",
+                    duration_ms, view, frame or '?', fp,
+                )
+
+
+_state_lock = threading.Lock()
+_dump_lock = threading.Lock()
+_stats = None
+_last_dump = 0.0
+
+
+def get_stats():
+    """Process-wide QueryStats instance"""
+    global _stats
+    if _stats is None:
+        with _state_lock:
+            if _stats is None:
+                config = get_config()
+                _stats = QueryStats(
+                    config['MAX_FINGERPRINTS'],
+                    config['MAX_VIEW_FINGERPRINTS'],
+                    config['RECENT_SLOW'],
+                )
+    return _stats
+
+
+@contextmanager
+def capture(view_name=None):
+    """Record every query run on any configured database inside the block"""
+    config = get_config()
+    recorder = QueryRecorder(get_stats(), config['SLOW_MS'])
+    token = current_view.set(view_name) if view_name else None
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            yield recorder.stats
+    finally:
+        if token is not None:
+            current_view.reset(token)
+
+
+def snapshot_path(directory=None):
+    directory = directory or get_config()['SNAPSHOT_DIR']
+    return os.path.join(directory, f"querylog-{os.getpid()}.json")
+
+
+def dump_snapshot(directory=None):
+    """Atomically write this process' aggregates to the snapshot directory"""
+    path = snapshot_path(directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with _dump_lock:
+        with open(tmp_path, 'w') as fh:
+            json.dump(get_stats().snapshot(), fh)
+        os.replace(tmp_path, path)
+    return path
+
+
+def maybe_dump_snapshot():
+    """Dump at most once per SNAPSHOT_INTERVAL seconds"""
+    global _last_dump
+    config = get_config()
+    now = time.monotonic()
+    with _state_lock:
+        if now - _last_dump < config['SNAPSHOT_INTERVAL']:
+            return
+        _last_dump = now
+    try:
+        dump_snapshot(config['SNAPSHOT_DIR'])
+    except OSError:
+        logger.exception("Could not write query log snapshot")
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _snapshot_pid(name):
+    try:
+        return int(name[len('querylog-'):-len('.json')])
+    except ValueError:
+        return None
+
+
+def is_stale(path, retention, now=None):
+    """Whether a snapshot belongs to an exited process or was not refreshed within ``retention``"""
+    pid = _snapshot_pid(os.path.basename(path))
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return True
+    if now is None:
+        now = time.time()
+    return now - mtime > retention or pid is None or not _process_exists(pid)
+
+
+def load_snapshots(directory=None, prune=True):
+    """Read every live per-process snapshot in the directory, deleting stale ones"""
+    config = get_config()
+    directory = directory or config['SNAPSHOT_DIR']
+    snapshots = []
+    if not os.path.isdir(directory):
+        return snapshots
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith('querylog-') and name.endswith('.json')):
+            continue
+        path = os.path.join(directory, name)
+        if prune and is_stale(path, config['SNAPSHOT_RETENTION']):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as fh:
+                snapshots.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def merge_snapshots(snapshots, by_view=False):
+    """Combine aggregates from several processes"""
+    merged = {}
+    for snap in snapshots:
+        for row in snap['views' if by_view else 'fingerprints']:
+            key = (row['view'], row['fingerprint']) if by_view else row['fingerprint']
+            entry = merged.setdefault(key, [0, 0.0, 0.0])
+            entry[0] += row['count']
+            entry[1] += row['total_ms']
+            entry[2] = max(entry[2], row['max_ms'])
+    return merged
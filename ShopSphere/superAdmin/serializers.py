@@ -1,10 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from ecommapp.models import VendorProfile, Product
+from ShopSphere.fieldsets import SparseFieldsetMixin
 from .models import VendorApprovalLog, ProductApprovalLog
+from . import auditlog
 
 
-class VendorApprovalLogSerializer(serializers.ModelSerializer):
+class VendorApprovalLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for VendorApprovalLog model"""
     admin_user_name = serializers.CharField(source='admin_user.username', read_only=True)
     action_display = serializers.CharField(source='get_action_display', read_only=True)
@@ -18,7 +20,7 @@ class VendorApprovalLogSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'admin_user', 'timestamp']
 
 
-class ProductApprovalLogSerializer(serializers.ModelSerializer):
+class ProductApprovalLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for ProductApprovalLog model"""
     admin_user_name = serializers.CharField(source='admin_user.username', read_only=True)
     action_display = serializers.CharField(source='get_action_display', read_only=True)
@@ -32,12 +34,11 @@ class ProductApprovalLogSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'admin_user', 'timestamp']
 
 
-class AdminVendorDetailSerializer(serializers.ModelSerializer):
-    """Serializer for admin vendor details view"""
+class AdminVendorDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Serializer for admin vendor details view (?expand=approval_logs to embed history)"""
     user_email = serializers.CharField(source='user.email', read_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
     approval_status_display = serializers.CharField(source='get_approval_status_display', read_only=True)
-    approval_logs = VendorApprovalLogSerializer(source='approval_logs.all', many=True, read_only=True)
     
     class Meta:
         model = VendorProfile
@@ -45,26 +46,39 @@ class AdminVendorDetailSerializer(serializers.ModelSerializer):
             'id', 'user_username', 'user_email', 'shop_name', 'shop_description',
             'address', 'business_type', 'id_type', 'id_number',
             'approval_status', 'approval_status_display', 'rejection_reason',
-            'is_blocked', 'blocked_reason', 'created_at', 'approval_logs'
+            'is_blocked', 'blocked_reason', 'created_at'
         ]
+        expandable_fields = {
+            'approval_logs': (serializers.SerializerMethodField, {}),
+        }
 
+    def get_approval_logs(self, obj):
+        """Latest AUDIT_LOG['DETAIL_LIMIT'] entries; full history is on approval-logs/"""
+        return VendorApprovalLogSerializer(auditlog.latest_vendor_logs(obj), many=True).data
 
-class AdminProductDetailSerializer(serializers.ModelSerializer):
-    """Serializer for admin product details view"""
+
+class AdminProductDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Serializer for admin product details view (?expand=approval_logs to embed history)"""
     vendor_shop_name = serializers.CharField(source='vendor.shop_name', read_only=True)
     vendor_owner = serializers.CharField(source='vendor.user.username', read_only=True)
-    approval_logs = ProductApprovalLogSerializer(source='approval_logs.all', many=True, read_only=True)
     
     class Meta:
         model = Product
         fields = [
             'id', 'vendor', 'vendor_shop_name', 'vendor_owner', 'name',
             'description', 'price', 'quantity', 'image', 'status',
-            'is_blocked', 'blocked_reason', 'created_at', 'approval_logs'
+            'is_blocked', 'blocked_reason', 'created_at'
         ]
+        expandable_fields = {
+            'approval_logs': (serializers.SerializerMethodField, {}),
+        }
+
+    def get_approval_logs(self, obj):
+        """Latest AUDIT_LOG['DETAIL_LIMIT'] entries; full history is on approval-logs/"""
+        return ProductApprovalLogSerializer(auditlog.latest_product_logs(obj), many=True).data
 
 
-class AdminVendorListSerializer(serializers.ModelSerializer):
+class AdminVendorListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for admin vendor list view"""
     user_email = serializers.CharField(source='user.email', read_only=True)
     approval_status_display = serializers.CharField(source='get_approval_status_display', read_only=True)
@@ -77,7 +91,7 @@ class AdminVendorListSerializer(serializers.ModelSerializer):
         ]
 
 
-class AdminProductListSerializer(serializers.ModelSerializer):
+class AdminProductListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for admin product list view"""
     vendor_name = serializers.CharField(source='vendor.shop_name', read_only=True)
     
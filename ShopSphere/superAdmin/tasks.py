@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.mail import send_mail as django_send_mail
+from django.db import transaction
+from django.utils import timezone
+
+from ecommapp.models import VendorProfile, Product
+from . import jobs
+
+
+# ============================================================================
+# BACKGROUND JOBS (run by `manage.py run_jobs`; must be idempotent)
+# ============================================================================
+
+CASCADE_CHUNK = 500
+
+
+@jobs.task(jobs.SEND_MAIL)
+def send_mail(subject, message, recipient_list, from_email=None):
+    django_send_mail(subject=subject, message=message, recipient_list=recipient_list,
+                     from_email=from_email or settings.EMAIL_HOST_USER)
+
+
+@jobs.task(jobs.BLOCK_VENDOR_PRODUCTS, priority=jobs.LOW)
+def block_vendor_products(vendor_id, reason):
+    """
+    Block a blocked vendor's products CASCADE_CHUNK rows per transaction, so
+    a large catalog never holds the write lock for long. Stops if the
+    vendor was unblocked in the meantime.
+    """
+    while True:
+        with transaction.atomic():
+            if not VendorProfile.objects.filter(id=vendor_id, is_blocked=True).exists():
+                return
+            chunk = list(Product.objects.filter(vendor_id=vendor_id, is_blocked=False)
+                         .values_list('id', flat=True)[:CASCADE_CHUNK])
+            if not chunk:
+                return
+            Product.objects.filter(id__in=chunk).update(
+                is_blocked=True, blocked_reason=f"Vendor blocked: {reason}", updated_at=timezone.now())
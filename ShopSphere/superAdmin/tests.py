@@ -1,3 +1,208 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import OperationalError, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from vendor.models import Product, VendorProfile
+from . import auditlog, jobs, querylog
+from .models import Job, ProductApprovalLog, VendorApprovalLog
+
+
+class QueryLogSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def _write(self, pid, age=0):
+        path = os.path.join(self.directory, f"querylog-{pid}.json")
+        with open(path, 'w') as fh:
+            json.dump({'pid': pid, 'fingerprints': [], 'views': [], 'slow_queries': []}, fh)
+        if age:
+            stamp = time.time() - age
+            os.utime(path, (stamp, stamp))
+        return path
+
+    def test_snapshot_of_exited_process_is_pruned(self):
+        live = self._write(os.getpid())
+        dead = self._write(2 ** 22 + 12345)
+        snapshots = querylog.load_snapshots(self.directory)
+        self.assertEqual([snap['pid'] for snap in snapshots], [os.getpid()])
+        self.assertTrue(os.path.exists(live))
+        self.assertFalse(os.path.exists(dead))
+
+    @override_settings(QUERYLOG={'SNAPSHOT_RETENTION': 60})
+    def test_snapshot_past_retention_is_pruned(self):
+        path = self._write(os.getpid(), age=120)
+        self.assertEqual(querylog.load_snapshots(self.directory), [])
+        self.assertFalse(os.path.exists(path))
+
+    def test_keep_stale_reads_everything(self):
+        dead = self._write(2 ** 22 + 12345)
+        self.assertEqual(len(querylog.load_snapshots(self.directory, prune=False)), 1)
+        self.assertTrue(os.path.exists(dead))
+
+
+class AuditLogTransactionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('moderator', password='x', is_staff=True)
+        vendor_user = User.objects.create_user('vendor', password='x')
+        self.vendor = VendorProfile.objects.create(
+            user=vendor_user, shop_name='Shop', shop_description='-', address='-', business_type='retail')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_log_row_is_written_with_the_change(self):
+        response = self.client.post(f"/superadmin-api/vendor-requests/{self.vendor.id}/approve/", {'reason': 'ok'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(auditlog.vendor_logs(self.vendor).values_list('action', 'reason')), [('approved', 'ok')])
+
+    def test_rolled_back_change_leaves_no_log_row(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                auditlog.log_vendor_action(self.vendor, self.admin, 'blocked')
+                raise ValueError
+        self.assertFalse(VendorApprovalLog.objects.exists())
+
+    def test_failed_log_write_rolls_back_the_change(self):
+        with mock.patch.object(VendorApprovalLog.objects, 'create', side_effect=OperationalError), \
+                self.assertRaises(OperationalError):
+            self.client.post(f"/superadmin-api/vendor-requests/{self.vendor.id}/approve/")
+        self.vendor.refresh_from_db()
+        self.assertEqual(self.vendor.approval_status, 'pending')
+
+
+class AdminDetailTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('moderator', password='x', is_staff=True)
+        vendor_user = User.objects.create_user('vendor', password='x')
+        self.vendor = VendorProfile.objects.create(
+            user=vendor_user, shop_name='Shop', shop_description='-', address='-', business_type='retail',
+            approval_status='approved')
+        self.product = Product.objects.create(
+            vendor=self.vendor, name='Lamp', description='-', price='10.00', quantity=1)
+        VendorApprovalLog.objects.create(vendor=self.vendor, admin_user=self.admin, action='approved')
+        ProductApprovalLog.objects.create(product=self.product, admin_user=self.admin, action='blocked')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_vendor_detail_expands_approval_logs(self):
+        url = f"/superadmin-api/vendors/{self.vendor.id}/detail/"
+        logs = self.client.get(url, {'expand': 'approval_logs'}).json()['approval_logs']
+        self.assertEqual([(log['action'], log['admin_user_name']) for log in logs], [('approved', 'moderator')])
+        self.assertEqual(set(self.client.get(url, {'fields': 'id,shop_name'}).json()), {'id', 'shop_name'})
+
+    def test_product_detail_expands_approval_logs(self):
+        url = f"/superadmin-api/products/{self.product.id}/detail/"
+        logs = self.client.get(url, {'expand': 'approval_logs'}).json()['approval_logs']
+        self.assertEqual([log['action'] for log in logs], ['blocked'])
+        self.assertNotIn('approval_logs', self.client.get(url).json())
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.config = dict(jobs.get_config(), LEASE_SECONDS=300, RETRY_BASE_SECONDS=10, RETRY_MAX_SECONDS=60)
+        self.claim_paths = [jobs._claim_by_token]
+        if jobs._can_return_from_update():
+            self.claim_paths.append(jobs._claim_returning)
+
+    def _claim(self, claim_due, limit=10):
+        now = timezone.now()
+        return claim_due(limit, jobs.uuid.uuid4().hex, now, now + timedelta(seconds=self.config['LEASE_SECONDS']))
+
+    def test_claim_takes_due_jobs_by_priority_once(self):
+        for claim_due in self.claim_paths:
+            with self.subTest(claim_due.__name__):
+                Job.objects.all().delete()
+                low = jobs.enqueue('test', priority=jobs.LOW)
+                high = jobs.enqueue('test', priority=jobs.HIGH)
+                jobs.enqueue('test', priority=jobs.HIGH, delay=60)
+
+                self.assertEqual([job.id for job in self._claim(claim_due, limit=1)], [high.id])
+                claimed = self._claim(claim_due)
+                self.assertEqual([job.id for job in claimed], [low.id])
+                self.assertEqual(claimed[0].attempts, 1)
+                self.assertGreater(claimed[0].run_at, timezone.now() + timedelta(seconds=290))
+                self.assertEqual(self._claim(claim_due), [])
+
+    def test_expired_lease_makes_the_job_due_again(self):
+        for claim_due in self.claim_paths:
+            with self.subTest(claim_due.__name__):
+                Job.objects.all().delete()
+                job = jobs.enqueue('test')
+                first = self._claim(claim_due)[0]
+                # The worker died: its lease runs out
+                Job.objects.filter(id=job.id).update(run_at=timezone.now() - timedelta(seconds=1))
+                second = self._claim(claim_due)[0]
+                self.assertEqual(second.id, job.id)
+                self.assertEqual(second.attempts, 2)
+                self.assertNotEqual(second.claim, first.claim)
+
+    def test_settle_marks_done_and_backs_off_failures(self):
+        done, retried, capped = jobs.enqueue('test'), jobs.enqueue('test'), jobs.enqueue('test')
+        Job.objects.filter(id=retried.id).update(attempts=2)
+        Job.objects.filter(id=capped.id).update(attempts=4)
+        before = timezone.now()
+        with self.assertLogs('shopsphere.jobs', 'WARNING'):
+            jobs.settle([(done, None), (Job.objects.get(id=retried.id), 'boom'),
+                         (Job.objects.get(id=capped.id), 'boom')], self.config)
+
+        done.refresh_from_db()
+        self.assertEqual((done.status, done.claim), ('done', ''))
+        self.assertIsNotNone(done.finished_at)
+        retried.refresh_from_db()
+        self.assertEqual((retried.status, retried.last_error), ('pending', 'boom'))
+        self.assertAlmostEqual((retried.run_at - before).total_seconds(), 20, delta=5)
+        capped.refresh_from_db()
+        self.assertAlmostEqual((capped.run_at - before).total_seconds(), 60, delta=5)
+
+    def test_failure_on_the_last_attempt_is_permanent(self):
+        job = jobs.enqueue('test')
+        Job.objects.filter(id=job.id).update(attempts=job.max_attempts)
+        with self.assertLogs('shopsphere.jobs', 'ERROR'):
+            jobs.settle([(Job.objects.get(id=job.id), 'boom')], self.config)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_release_hands_unstarted_jobs_back(self):
+        job = jobs.enqueue('test')
+        claimed = jobs.claim(10, self.config)
+        jobs.release(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.claim, job.attempts), ('pending', '', 0))
+        self.assertEqual([again.id for again in jobs.claim(10, self.config)], [job.id])
+
+    def test_unregistered_task_fails_the_job(self):
+        self.assertIn('LookupError', jobs.execute(jobs.enqueue('missing')))
+
+
+class VendorBlockTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('moderator', password='x', is_staff=True)
+        vendor_user = User.objects.create_user('vendor', password='x')
+        self.vendor = VendorProfile.objects.create(
+            user=vendor_user, shop_name='Shop', shop_description='-', address='-', business_type='retail',
+            approval_status='approved')
+        self.product = Product.objects.create(
+            vendor=self.vendor, name='Lamp', description='-', price='10.00', quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_product_cascade_runs_as_a_job(self):
+        response = self.client.post(f"/superadmin-api/vendors/{self.vendor.id}/block/", {'reason': 'fraud'})
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.is_blocked)
+
+        job = Job.objects.get(task=jobs.BLOCK_VENDOR_PRODUCTS)
+        self.assertEqual(job.kwargs, {'vendor_id': self.vendor.id, 'reason': 'fraud'})
+        self.assertIsNone(jobs.execute(job))
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.is_blocked, self.product.blocked_reason), (True, 'Vendor blocked: fraud'))
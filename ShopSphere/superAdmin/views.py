@@ -2,10 +2,11 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q
 from django.urls import reverse
 from ecommapp.models import VendorProfile, Product
-from .models import VendorApprovalLog, ProductApprovalLog
+from . import auditlog, jobs, outbox
 
 
 # ============================================================================
@@ -119,7 +120,7 @@ def vendor_request_detail(request, vendor_id):
     """View detailed vendor registration request with approval logs"""
     
     vendor = get_object_or_404(VendorProfile, id=vendor_id)
-    approval_logs = vendor.approval_logs.all()
+    approval_logs = auditlog.latest_vendor_logs(vendor)
 
     context = {
         'vendor': vendor,
@@ -140,15 +141,16 @@ def approve_vendor(request, vendor_id):
         vendor.is_blocked = False
         vendor.blocked_reason = None
         vendor.rejection_reason = None
-        vendor.save()
-
-        # Create approval log
-        VendorApprovalLog.objects.create(
-            vendor=vendor,
-            admin_user=request.user,
-            action='approved',
-            reason=request.POST.get('reason', '')
-        )
+        with transaction.atomic():
+            vendor.save()
+            outbox.emit(outbox.VENDOR_APPROVED, vendor_id=vendor.id, admin_id=request.user.id, reason=request.POST.get('reason', ''))
+            # Create approval log
+            auditlog.log_vendor_action(
+                vendor=vendor,
+                admin_user=request.user,
+                action='approved',
+                reason=request.POST.get('reason', '')
+            )
 
         return redirect('vendor_request_detail', vendor_id=vendor.id)
 
@@ -167,15 +169,16 @@ def reject_vendor(request, vendor_id):
         reason = request.POST.get('reason', 'No reason provided')
         vendor.approval_status = 'rejected'
         vendor.rejection_reason = reason
-        vendor.save()
-
-        # Create rejection log
-        VendorApprovalLog.objects.create(
-            vendor=vendor,
-            admin_user=request.user,
-            action='rejected',
-            reason=reason
-        )
+        with transaction.atomic():
+            vendor.save()
+            outbox.emit(outbox.VENDOR_REJECTED, vendor_id=vendor.id, admin_id=request.user.id, reason=reason)
+            # Create rejection log
+            auditlog.log_vendor_action(
+                vendor=vendor,
+                admin_user=request.user,
+                action='rejected',
+                reason=reason
+            )
 
         return redirect('vendor_request_detail', vendor_id=vendor.id)
 
@@ -235,18 +238,18 @@ def block_vendor(request, vendor_id):
         reason = request.POST.get('reason', 'No reason provided')
         vendor.is_blocked = True
         vendor.blocked_reason = reason
-        vendor.save()
-
-        # Create blocking log
-        VendorApprovalLog.objects.create(
-            vendor=vendor,
-            admin_user=request.user,
-            action='blocked',
-            reason=reason
-        )
-
-        # Also block all vendor's products
-        vendor.products.update(is_blocked=True, blocked_reason=f"Vendor blocked: {reason}")
+        with transaction.atomic():
+            vendor.save()
+            # Also block all vendor's products, in the background for large catalogs
+            jobs.enqueue(jobs.BLOCK_VENDOR_PRODUCTS, vendor_id=vendor.id, reason=reason)
+            outbox.emit(outbox.VENDOR_BLOCKED, vendor_id=vendor.id, admin_id=request.user.id, reason=reason)
+            # Create blocking log
+            auditlog.log_vendor_action(
+                vendor=vendor,
+                admin_user=request.user,
+                action='blocked',
+                reason=reason
+            )
 
         return redirect('vendor_detail', vendor_id=vendor.id)
 
@@ -265,15 +268,16 @@ def unblock_vendor(request, vendor_id):
         reason = request.POST.get('reason', '')
         vendor.is_blocked = False
         vendor.blocked_reason = None
-        vendor.save()
-
-        # Create unblocking log
-        VendorApprovalLog.objects.create(
-            vendor=vendor,
-            admin_user=request.user,
-            action='unblocked',
-            reason=reason
-        )
+        with transaction.atomic():
+            vendor.save()
+            outbox.emit(outbox.VENDOR_UNBLOCKED, vendor_id=vendor.id, admin_id=request.user.id, reason=reason)
+            # Create unblocking log
+            auditlog.log_vendor_action(
+                vendor=vendor,
+                admin_user=request.user,
+                action='unblocked',
+                reason=reason
+            )
 
         return redirect('vendor_detail', vendor_id=vendor.id)
 
@@ -288,7 +292,7 @@ def vendor_detail(request, vendor_id):
     
     vendor = get_object_or_404(VendorProfile, id=vendor_id)
     products = vendor.products.all()
-    approval_logs = vendor.approval_logs.all()
+    approval_logs = auditlog.latest_vendor_logs(vendor)
 
     context = {
         'vendor': vendor,
@@ -348,7 +352,7 @@ def product_detail(request, product_id):
     """View detailed information about a product"""
     
     product = get_object_or_404(Product, id=product_id)
-    approval_logs = product.approval_logs.all()
+    approval_logs = auditlog.latest_product_logs(product)
 
     context = {
         'product': product,
@@ -369,15 +373,16 @@ def block_product(request, product_id):
         reason = request.POST.get('reason', 'No reason provided')
         product.is_blocked = True
         product.blocked_reason = reason
-        product.save()
-
-        # Create blocking log
-        ProductApprovalLog.objects.create(
-            product=product,
-            admin_user=request.user,
-            action='blocked',
-            reason=reason
-        )
+        with transaction.atomic():
+            product.save()
+            outbox.emit(outbox.PRODUCT_BLOCKED, product_id=product.id, admin_id=request.user.id, reason=reason)
+            # Create blocking log
+            auditlog.log_product_action(
+                product=product,
+                admin_user=request.user,
+                action='blocked',
+                reason=reason
+            )
 
         return redirect('product_detail', product_id=product.id)
 
@@ -396,15 +401,16 @@ def unblock_product(request, product_id):
         reason = request.POST.get('reason', '')
         product.is_blocked = False
         product.blocked_reason = None
-        product.save()
-
-        # Create unblocking log
-        ProductApprovalLog.objects.create(
-            product=product,
-            admin_user=request.user,
-            action='unblocked',
-            reason=reason
-        )
+        with transaction.atomic():
+            product.save()
+            outbox.emit(outbox.PRODUCT_UNBLOCKED, product_id=product.id, admin_id=request.user.id, reason=reason)
+            # Create unblocking log
+            auditlog.log_product_action(
+                product=product,
+                admin_user=request.user,
+                action='unblocked',
+                reason=reason
+            )
 
         return redirect('product_detail', product_id=product.id)
 
@@ -1,10 +1,73 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import AuthUser, Product, Cart, CartItem, Order, OrderItem
+from .models import AuthUser, Product, Cart, CartItem, Order, OrderEvent, OrderItem, IdempotencyKey, Promotion, \
+    Coupon, CouponCounterShard, CouponReservation, FlashSale, ProductView
 
 admin.site.register(AuthUser, UserAdmin)
-admin.site.register(Product)
 admin.site.register(Cart)
 admin.site.register(CartItem)
 admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+admin.site.register(OrderEvent)
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ('name', 'vendor_name', 'price', 'stock', 'is_listed', 'updated_at')
+    list_filter = ('is_listed',)
+    search_fields = ('name', 'vendor_name')
+
+    def get_queryset(self, request):
+        # Delisted rows are hidden from Product.objects but stay visible here
+        return Product.all_objects.all()
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('user', 'key', 'state', 'status_code', 'created_at')
+    list_filter = ('state',)
+    search_fields = ('key', 'user__email')
+
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'kind', 'value', 'product', 'vendor', 'coupon_code', 'min_quantity', 'is_active')
+    list_filter = ('kind', 'is_active')
+    search_fields = ('name', 'coupon_code')
+    raw_id_fields = ('product', 'vendor')
+
+
+class CouponCounterShardInline(admin.TabularInline):
+    model = CouponCounterShard
+    extra = 0
+    readonly_fields = ('shard', 'capacity', 'count')
+    can_delete = False
+
+
+@admin.register(Coupon)
+class CouponAdmin(admin.ModelAdmin):
+    list_display = ('code', 'max_redemptions', 'shard_count', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('code',)
+    inlines = [CouponCounterShardInline]
+
+
+@admin.register(CouponReservation)
+class CouponReservationAdmin(admin.ModelAdmin):
+    list_display = ('coupon', 'user', 'shard', 'status', 'created_at', 'expires_at')
+    list_filter = ('status',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(FlashSale)
+class FlashSaleAdmin(admin.ModelAdmin):
+    list_display = ('product', 'admit_per_minute', 'admission_minutes', 'starts_at', 'ends_at', 'is_active')
+    list_filter = ('is_active',)
+    raw_id_fields = ('product',)
+
+
+@admin.register(ProductView)
+class ProductViewAdmin(admin.ModelAdmin):
+    list_display = ('user', 'product', 'viewed_at')
+    raw_id_fields = ('user', 'product')
+    date_hierarchy = 'viewed_at'
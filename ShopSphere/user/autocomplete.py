@@ -0,0 +1,439 @@
+"""
+In-process prefix autocomplete over storefront product and shop names.
+
+Names are normalised (accents stripped, casefolded, punctuation collapsed)
+and cut to MAX_NAME_LENGTH, so an entry costs a bounded amount of memory.
+Each name is indexed under its first WORD_KEYS word starts ("apple iphone
+15", "iphone 15", "15"), which lets "iph" find it.
+
+The index is a sorted list of keys searched with bisect, plus parallel
+NumPy arrays (entry per key, weight/kind/id per entry). The matches of a
+prefix are one contiguous slice, and ``argpartition`` over the slice's
+weights picks the most popular without sorting it. Prefixes of one or two
+characters, whose slices are the longest, are ranked once at build time.
+
+Changes do not touch the base arrays. They go into an overlay (a dict of
+changed entries plus its own sorted key list) that queries merge in, and
+the base is recompacted in the background once the overlay reaches
+COMPACT_AT entries. Other processes learn about changes through a sequence
+number and a short change log in the cache and reload just those rows; if
+they fall too far behind they rebuild. As that cache is per process unless a
+shared backend is configured, every process also watches the storefront
+table's row count and latest updated_at (ShopSphere/versions.py) and reloads
+the rows saved since its last look, rebuilding when rows were deleted or
+too many changed. Popularity is units sold; sales do not touch updated_at,
+so without a shared cache other processes pick new weights up when they
+next rebuild or compact.
+"""
+
+import bisect
+import logging
+import re
+import threading
+import unicodedata
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from ShopSphere.versions import TableVersion
+from .models import Product
+
+
+logger = logging.getLogger('shopsphere.autocomplete')
+
+DEFAULTS = {
+    'MAX_NAME_LENGTH': 64,
+    'WORD_KEYS': 3,
+    'COMPACT_AT': 20000,
+    'CHANGE_LOG_TTL': 600,
+    'MAX_REPLAY': 200,
+    'MAX_CATCH_UP_ROWS': 5000,
+    'HOT_PREFIX_LENGTH': 2,
+    'WARM_ON_STARTUP': True,
+}
+
+SEQ_KEY = 'autocomplete:seq'
+CHANGE_KEY = 'autocomplete:change:{}'
+FULL_REBUILD = 'full'
+PRODUCT, SHOP = 0, 1
+KIND_NAMES = ('product', 'shop')
+SHORT_DEPTH = 40
+_HIGH = '\U0010ffff'
+# Rows saved this long before the last seen updated_at are reloaded too, in case their transaction committed late
+CATCH_UP_OVERLAP = timedelta(seconds=60)
+_SEPARATORS = re.compile(r'[^0-9a-z]+')
+
+
+def get_config():
+    """Return AUTOCOMPLETE settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AUTOCOMPLETE', {}))
+    return config
+
+
+def normalize(text, max_length=DEFAULTS['MAX_NAME_LENGTH']):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().casefold()
+    return _SEPARATORS.sub(' ', text).strip()[:max_length]
+
+
+def name_keys(normalized, word_keys):
+    """The name itself and the suffixes starting at its next word boundaries"""
+    keys = [normalized]
+    start = normalized.find(' ')
+    while start != -1 and len(keys) < word_keys:
+        keys.append(normalized[start + 1:])
+        start = normalized.find(' ', start + 1)
+    return keys
+
+
+class AutocompleteIndex:
+    """
+    Base arrays built once plus an overlay of later changes. ``entries`` are
+    (kind, id, vendor_id, label, weight) tuples.
+    """
+
+    def __init__(self, entries, config):
+        self.max_length = config['MAX_NAME_LENGTH']
+        self.word_keys = config['WORD_KEYS']
+        self.hot_length = config['HOT_PREFIX_LENGTH']
+        self._lock = threading.Lock()
+        self._build(entries)
+        self.overlay = {}          # (kind, id) -> entry tuple, or None when removed
+        self.overlay_keys = []     # sorted (key, kind, id)
+
+    def _build(self, entries):
+        entries = list(entries)
+        self.kind = np.fromiter((entry[0] for entry in entries), dtype=np.int8, count=len(entries))
+        self.ref = np.fromiter((entry[1] for entry in entries), dtype=np.int64, count=len(entries))
+        self.vendor = np.fromiter((entry[2] or 0 for entry in entries), dtype=np.int64, count=len(entries))
+        self.weight = np.fromiter((entry[4] for entry in entries), dtype=np.float64, count=len(entries))
+        self.label = [entry[3][:self.max_length] for entry in entries]
+        self.slot = {(int(kind), int(ref)): position
+                     for position, (kind, ref) in enumerate(zip(self.kind.tolist(), self.ref.tolist()))}
+        pairs = sorted(
+            (key, position)
+            for position, label in enumerate(self.label)
+            for key in name_keys(normalize(label, self.max_length), self.word_keys) if key
+        )
+        self.keys = [key for key, _ in pairs]
+        self.key_entry = np.fromiter((position for _, position in pairs), dtype=np.int32, count=len(pairs))
+        self.key_weight = self.weight[self.key_entry]
+        # Short prefixes cover the longest slices: rank them once here
+        self.short = {}
+        for length in range(1, self.hot_length + 1):
+            for prefix in {key[:length] for key in self.keys}:
+                self.short[prefix] = self._scan(prefix, SHORT_DEPTH, {})
+
+    # -- changes -------------------------------------------------------------
+
+    def _entry(self, kind, ref):
+        if (kind, ref) in self.overlay:
+            return self.overlay[(kind, ref)]
+        position = self.slot.get((kind, ref))
+        if position is None:
+            return None
+        return (kind, ref, int(self.vendor[position]) or None, self.label[position], float(self.weight[position]))
+
+    def _drop_overlay_keys(self, kind, ref):
+        entry = self.overlay.get((kind, ref))
+        if entry is None:
+            return
+        for key in name_keys(normalize(entry[3], self.max_length), self.word_keys):
+            position = bisect.bisect_left(self.overlay_keys, (key, kind, ref))
+            if position < len(self.overlay_keys) and self.overlay_keys[position] == (key, kind, ref):
+                del self.overlay_keys[position]
+
+    def upsert(self, entries):
+        with self._lock:
+            for entry in entries:
+                kind, ref = entry[0], entry[1]
+                self._drop_overlay_keys(kind, ref)
+                entry = (kind, ref, entry[2], entry[3][:self.max_length], float(entry[4]))
+                self.overlay[(kind, ref)] = entry
+                for key in name_keys(normalize(entry[3], self.max_length), self.word_keys):
+                    if key:
+                        bisect.insort(self.overlay_keys, (key, kind, ref))
+
+    def remove(self, kind, refs):
+        with self._lock:
+            for ref in refs:
+                if self._entry(kind, ref) is None:
+                    continue
+                self._drop_overlay_keys(kind, ref)
+                self.overlay[(kind, ref)] = None
+
+    def vendors_of(self, product_ids):
+        vendors = set()
+        for product_id in product_ids:
+            entry = self._entry(PRODUCT, product_id)
+            if entry is not None and entry[2]:
+                vendors.add(entry[2])
+        return vendors
+
+    def compacted(self):
+        """A new index with the overlay folded into the base"""
+        with self._lock:
+            overlay = dict(self.overlay)
+        entries = [
+            (int(kind), int(ref), int(vendor) or None, label, float(weight))
+            for kind, ref, vendor, label, weight in zip(self.kind, self.ref, self.vendor, self.label, self.weight)
+            if (int(kind), int(ref)) not in overlay
+        ]
+        entries.extend(entry for entry in overlay.values() if entry is not None)
+        index = AutocompleteIndex.__new__(AutocompleteIndex)
+        index.max_length, index.word_keys, index.hot_length = self.max_length, self.word_keys, self.hot_length
+        index._lock = threading.Lock()
+        index._build(entries)
+        index.overlay, index.overlay_keys = {}, []
+        return index, overlay
+
+    # -- queries -------------------------------------------------------------
+
+    def _scan(self, prefix, limit, skip):
+        """Best ``limit`` base entries under ``prefix``, leaving out keys in ``skip``"""
+        low = bisect.bisect_left(self.keys, prefix)
+        high = bisect.bisect_left(self.keys, prefix + _HIGH, low)
+        if low == high:
+            return []
+        candidates = self.key_entry[low:high]
+        weights = self.key_weight[low:high]
+        # Names can match under several keys, so look a little deeper than ``limit``
+        take = min(len(candidates), limit * self.word_keys + 8)
+        while True:
+            if take < len(candidates):
+                chosen = np.argpartition(-weights, take - 1)[:take]
+            else:
+                chosen = np.arange(len(candidates))
+            chosen = chosen[np.lexsort((candidates[chosen], -weights[chosen]))]
+            found, seen = [], set()
+            for position in candidates[chosen].tolist():
+                key = (int(self.kind[position]), int(self.ref[position]))
+                if position in seen or key in skip:
+                    continue
+                seen.add(position)
+                found.append((float(self.weight[position]), key[0], key[1], self.label[position]))
+                if len(found) == limit:
+                    return found
+            if take >= len(candidates):
+                return found
+            take *= 4
+
+    def _overlay_matches(self, prefix):
+        found = {}
+        position = bisect.bisect_left(self.overlay_keys, (prefix,))
+        keys = self.overlay_keys
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            _, kind, ref = keys[position]
+            entry = self.overlay.get((kind, ref))
+            if entry is not None:
+                found[(kind, ref)] = (entry[4], kind, ref, entry[3])
+            position += 1
+        return list(found.values())
+
+    def search(self, text, limit=8):
+        """Up to ``limit`` {type, id, label} dicts, most popular first"""
+        prefix = normalize(text, self.max_length)
+        if not prefix:
+            return []
+        overlay = self.overlay
+        stored = self.short.get(prefix) if len(prefix) <= self.hot_length else None
+        if stored is not None and limit <= SHORT_DEPTH:
+            base = [match for match in stored if (match[1], match[2]) not in overlay]
+            if len(base) < limit and len(stored) == SHORT_DEPTH:
+                base = self._scan(prefix, limit, overlay)
+        else:
+            base = self._scan(prefix, limit, overlay)
+        matches = base[:limit] + self._overlay_matches(prefix)
+        matches.sort(key=lambda match: (-match[0], match[3]))
+        return [{'type': KIND_NAMES[kind], 'id': ref, 'label': label} for _, kind, ref, label in matches[:limit]]
+
+
+# ============================================================================
+# LOADING FROM THE STOREFRONT
+# ============================================================================
+
+def _product_entries(queryset):
+    rows = queryset.annotate(sold=Sum('order_items__quantity')).values_list('id', 'vendor_id', 'name', 'sold')
+    return [(PRODUCT, product_id, vendor_id, name, float(sold or 0) + 1)
+            for product_id, vendor_id, name, sold in rows.iterator(chunk_size=5000)]
+
+
+def _shop_entries(vendor_ids=None):
+    """One entry per vendor with listed products; weight is the units sold across them"""
+    rows = Product.objects.filter(vendor__isnull=False)
+    if vendor_ids is not None:
+        rows = rows.filter(vendor_id__in=vendor_ids)
+    rows = (rows.values('vendor_id', 'vendor_name')
+            .annotate(sold=Sum('order_items__quantity'), products=Count('id', distinct=True)))
+    return [(SHOP, row['vendor_id'], None, row['vendor_name'], float(row['sold'] or 0) + row['products'])
+            for row in rows if row['vendor_name']]
+
+
+def build(config=None):
+    config = config or get_config()
+    return AutocompleteIndex(_product_entries(Product.objects.all()) + _shop_entries(), config)
+
+
+def _apply_product_changes(index, product_ids):
+    """Reload the given storefront rows (missing ones were removed) and the shops they belong to"""
+    product_ids = set(product_ids)
+    entries = _product_entries(Product.objects.filter(id__in=product_ids))
+    # Vendors of removed products are looked up before the removal drops their entries
+    vendors = index.vendors_of(product_ids) | {entry[2] for entry in entries if entry[2]}
+    index.remove(PRODUCT, product_ids - {entry[1] for entry in entries})
+    index.upsert(entries)
+    if vendors:
+        shops = _shop_entries(vendors)
+        index.remove(SHOP, vendors - {entry[1] for entry in shops})
+        index.upsert(shops)
+
+
+# ============================================================================
+# PROCESS-WIDE INDEX
+# ============================================================================
+
+_index = None
+_index_seq = None
+_index_table = None
+_index_lock = threading.Lock()
+_compacting = False
+_table_version = TableVersion(lambda: Product.all_objects.all())
+
+
+def _current_seq():
+    seq = cache.get(SEQ_KEY)
+    if seq is None:
+        cache.add(SEQ_KEY, 1, None)
+        seq = cache.get(SEQ_KEY, 1)
+    return seq
+
+
+def _catch_up(index, since, seq, config):
+    """Replay the change log; False when it is incomplete and a rebuild is needed"""
+    if seq - since > config['MAX_REPLAY']:
+        return False
+    changes = cache.get_many([CHANGE_KEY.format(number) for number in range(since + 1, seq + 1)])
+    if len(changes) != seq - since or any(change == FULL_REBUILD for change in changes.values()):
+        return False
+    _apply_product_changes(index, {product_id for change in changes.values() for product_id in change})
+    return True
+
+
+def _catch_up_table(index, seen, table, config):
+    """Reload the rows saved since ``seen``; False when rows were deleted or too many changed"""
+    (seen_count, seen_latest), (count, latest) = seen, table
+    if count < seen_count:
+        return False
+    changed = Product.all_objects.all()
+    if seen_latest is not None:
+        changed = changed.filter(updated_at__gte=seen_latest - CATCH_UP_OVERLAP)
+    limit = config['MAX_CATCH_UP_ROWS']
+    product_ids = list(changed.values_list('id', flat=True)[:limit + 1])
+    if len(product_ids) > limit:
+        return False
+    _apply_product_changes(index, product_ids)
+    return True
+
+
+def get_index():
+    """This process' index, caught up with changes made by other processes"""
+    global _index, _index_seq, _index_table
+    seq = _current_seq()
+    table = _table_version.get()
+    if _index is None or _index_seq != seq or _index_table != table:
+        with _index_lock:
+            if _index is None or _index_seq != seq or _index_table != table:
+                config = get_config()
+                if (_index is None or _index_seq > seq or not _catch_up(_index, _index_seq, seq, config)
+                        or (_index_table != table and not _catch_up_table(_index, _index_table, table, config))):
+                    _index = build(config)
+                _index_seq, _index_table = seq, table
+    _maybe_compact()
+    return _index
+
+
+def search(text, limit=8):
+    return get_index().search(text, limit)
+
+
+def _compact():
+    global _index, _compacting
+    try:
+        index = _index
+        compacted, folded = index.compacted()
+        with _index_lock:
+            if _index is index:
+                # Keep changes that arrived while the new base was built
+                late = {key: entry for key, entry in index.overlay.items() if folded.get(key, False) != entry}
+                for (kind, ref), entry in late.items():
+                    if entry is None:
+                        compacted.remove(kind, [ref])
+                    else:
+                        compacted.upsert([entry])
+                _index = compacted
+    except Exception:
+        logger.exception("Autocomplete compaction failed")
+    finally:
+        _compacting = False
+
+
+def _maybe_compact():
+    global _compacting
+    if _index is None or _compacting or len(_index.overlay) < get_config()['COMPACT_AT']:
+        return
+    with _index_lock:
+        if _compacting:
+            return
+        _compacting = True
+    threading.Thread(target=_compact, daemon=True).start()
+
+
+def products_changed(product_ids):
+    """Storefront rows inserted, updated or deleted (called after commit)"""
+    global _index_seq
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+    try:
+        seq = cache.incr(SEQ_KEY)
+    except ValueError:
+        cache.add(SEQ_KEY, 1, None)
+        seq = cache.incr(SEQ_KEY)
+    cache.set(CHANGE_KEY.format(seq), product_ids, get_config()['CHANGE_LOG_TTL'])
+    with _index_lock:
+        # Apply locally only if no other process changed the catalog in between
+        if _index is not None and _index_seq == seq - 1:
+            _apply_product_changes(_index, product_ids)
+            _index_seq = seq
+
+
+def invalidate():
+    """Make every process rebuild on its next query"""
+    global _index
+    try:
+        seq = cache.incr(SEQ_KEY)
+    except ValueError:
+        cache.add(SEQ_KEY, 1, None)
+        seq = cache.incr(SEQ_KEY)
+    cache.set(CHANGE_KEY.format(seq), FULL_REBUILD, get_config()['CHANGE_LOG_TTL'])
+    _index = None
+
+
+def warm_in_background():
+    """Build the index off the request path when a server process starts"""
+    if not get_config()['WARM_ON_STARTUP']:
+        return
+
+    def warm():
+        from django.db import close_old_connections
+        try:
+            get_index()
+        except Exception:
+            logger.exception("Autocomplete warm-up failed")
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=warm, daemon=True).start()
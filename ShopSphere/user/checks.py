@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, Warning, register
+from django.db import DatabaseError
+
+from .models import FlashSale
+
+
+@register(Tags.caches)
+def check_flash_sale_cache(app_configs, **kwargs):
+    """
+    The waiting-room tickets and gate (user/waiting_room.py) are counters in
+    the default cache. With LocMem every worker hands out its own tickets,
+    so the queue is neither FIFO nor rate limited across the site.
+    """
+    if not isinstance(caches['default'], LocMemCache):
+        return []
+    try:
+        if not FlashSale.objects.filter(is_active=True).exists():
+            return []
+    except DatabaseError:
+        # Not migrated yet
+        return []
+    # A single runserver process shares its LocMem cache with itself
+    level = Warning if settings.DEBUG else Error
+    return [level(
+        "A flash sale is active but the default cache is per-process (LocMem).",
+        hint="Configure a shared CACHES['default'] backend (Redis, Memcached) for the waiting room queue.",
+        obj='user.FlashSale',
+        id='user.E001' if level is Error else 'user.W001',
+    )]
@@ -0,0 +1,183 @@
+"""
+Sharded redemption counters for limited-use coupons.
+
+A coupon's limit is split into ``shard_count`` CouponCounterShard rows,
+each with its own capacity; the capacities always add up to the limit. A
+redemption takes a slot with a conditional UPDATE
+(``count = count + 1 WHERE count < capacity``) on a randomly chosen shard,
+falling through the remaining shards in random order when one is full.
+Concurrent checkouts therefore spread over N rows instead of queueing on
+one, and because no shard can pass its capacity the global limit can never
+be exceeded. Reads sum the shards.
+
+Checkout reserves a slot for RESERVATION_TTL seconds; payment redeems the
+reservation in the order transaction. Abandoned reservations are released
+lazily when a coupon looks sold out and by ``release_expired``.
+"""
+
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Coupon, CouponCounterShard, CouponReservation
+
+
+DEFAULTS = {
+    'RESERVATION_TTL': 900,
+}
+# How often redeem() reserves again when its reservation is released concurrently
+REDEEM_ATTEMPTS = 3
+
+
+def get_config():
+    """Return COUPONS settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'COUPONS', {}))
+    return config
+
+
+def normalize(code):
+    return (code or '').strip().upper()
+
+
+def split_capacity(total, shards):
+    """Spread ``total`` over ``shards`` as evenly as possible"""
+    base, extra = divmod(total, shards)
+    return [base + (1 if shard < extra else 0) for shard in range(shards)]
+
+
+def configure(coupon):
+    """
+    Create or rebalance the shard rows of ``coupon`` so their capacities add
+    up to max_redemptions. Slots already taken are kept; only the unused
+    remainder is redistributed.
+    """
+    if coupon.max_redemptions is None:
+        CouponCounterShard.objects.filter(coupon=coupon, count=0).delete()
+        return
+    shards = max(coupon.shard_count, 1)
+    with transaction.atomic():
+        existing = {row.shard: row for row in CouponCounterShard.objects.select_for_update().filter(coupon=coupon)}
+        created = [CouponCounterShard(coupon=coupon, shard=shard) for shard in range(shards) if shard not in existing]
+        used = sum(row.count for row in existing.values())
+        free = split_capacity(max(coupon.max_redemptions - used, 0), shards)
+        for row in list(existing.values()) + created:
+            # Shards dropped by a smaller shard_count keep their slots but take no new ones
+            row.capacity = row.count + (free[row.shard] if row.shard < shards else 0)
+        CouponCounterShard.objects.bulk_update(list(existing.values()), ['capacity'])
+        CouponCounterShard.objects.bulk_create(created)
+
+
+def redeemed_count(coupon):
+    """Slots taken (reserved or redeemed)"""
+    return CouponCounterShard.objects.filter(coupon=coupon).aggregate(total=Sum('count'))['total'] or 0
+
+
+def remaining(coupon):
+    """Free slots, or None for an unlimited coupon"""
+    if coupon.max_redemptions is None:
+        return None
+    totals = CouponCounterShard.objects.filter(coupon=coupon).aggregate(
+        capacity=Sum('capacity'), count=Sum('count'))
+    return (totals['capacity'] or 0) - (totals['count'] or 0)
+
+
+def take_slot(coupon_id, shard_count):
+    """Increment a random non-full shard; returns its index or None when every shard is full"""
+    order = list(range(shard_count))
+    random.shuffle(order)
+    for shard in order:
+        taken = CouponCounterShard.objects.filter(
+            coupon_id=coupon_id, shard=shard, count__lt=F('capacity'),
+        ).update(count=F('count') + 1)
+        if taken:
+            return shard
+    return None
+
+
+def give_back(coupon_id, shard):
+    CouponCounterShard.objects.filter(coupon_id=coupon_id, shard=shard, count__gt=0).update(count=F('count') - 1)
+
+
+def get_coupon(code):
+    code = normalize(code)
+    if not code:
+        return None
+    return Coupon.objects.filter(code=code, is_active=True).first()
+
+
+def reserve(coupon, user):
+    """
+    Hold one redemption of ``coupon`` for ``user``. Returns the user's
+    active reservation (reusing an existing one) or None when sold out.
+    """
+    now = timezone.now()
+    ttl = timedelta(seconds=get_config()['RESERVATION_TTL'])
+    existing = CouponReservation.objects.filter(
+        coupon=coupon, user=user, status='reserved', expires_at__gt=now).first()
+    # Extend only while it is still reserved: release_expired may have freed it since the read
+    if existing is not None and CouponReservation.objects.filter(
+            id=existing.id, status='reserved').update(expires_at=now + ttl):
+        existing.expires_at = now + ttl
+        return existing
+
+    shard = None
+    if coupon.max_redemptions is not None:
+        shard = take_slot(coupon.id, coupon.shard_count)
+        if shard is None and release_expired(coupon):
+            shard = take_slot(coupon.id, coupon.shard_count)
+        if shard is None:
+            return None
+    return CouponReservation.objects.create(coupon=coupon, user=user, shard=shard, expires_at=now + ttl)
+
+
+def redeem(coupon, user):
+    """
+    Turn the user's reservation into a redemption, reserving on the spot if
+    it is missing or expired. Call inside the order transaction. Returns
+    False when the coupon is sold out.
+
+    The status change is conditional, so a reservation released (and its
+    slot handed back) between the read and the update is never redeemed;
+    a fresh slot is reserved instead.
+    """
+    for _ in range(REDEEM_ATTEMPTS):
+        reservation = reserve(coupon, user)
+        if reservation is None:
+            return False
+        if CouponReservation.objects.filter(id=reservation.id, status='reserved').update(status='redeemed'):
+            reservation.status = 'redeemed'
+            return True
+    return False
+
+
+def release(reservation, expired_by=None):
+    """
+    Give an unused reservation's slot back. With ``expired_by`` only a
+    reservation that has expired by then is released, so one extended
+    after it was read stays held.
+    """
+    pending = CouponReservation.objects.filter(id=reservation.id, status='reserved')
+    if expired_by is not None:
+        pending = pending.filter(expires_at__lte=expired_by)
+    with transaction.atomic():
+        released = pending.update(status='released')
+        if released and reservation.shard is not None:
+            give_back(reservation.coupon_id, reservation.shard)
+    return bool(released)
+
+
+def release_expired(coupon=None):
+    """Release reservations whose TTL has passed; returns how many slots were freed"""
+    now = timezone.now()
+    expired = CouponReservation.objects.filter(status='reserved', expires_at__lte=now)
+    if coupon is not None:
+        expired = expired.filter(coupon=coupon)
+    freed = 0
+    for reservation in expired.only('id', 'coupon_id', 'shard'):
+        freed += release(reservation, expired_by=now)
+    return freed
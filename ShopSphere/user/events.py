@@ -0,0 +1,202 @@
+"""
+Order status events and their server-sent-events fan-out.
+
+``publish`` records status changes as OrderEvent rows inside the caller's
+transaction. Those rows are the pub/sub channel: every ASGI process runs one
+``EventHub`` poller that reads new rows (one query per POLL_INTERVAL for the
+whole process, woken immediately when the change happened in this process)
+and pushes them into small per-connection queues keyed by user. Because the
+rows are durable, a reconnecting EventSource resumes from its Last-Event-ID
+without losing anything.
+
+An idle connection costs one bounded asyncio.Queue and one suspended async
+generator, so a single process can hold thousands of them. A connection
+whose queue overflows is closed and the client catches up on reconnect.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import weakref
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Order, OrderEvent
+
+
+logger = logging.getLogger('shopsphere.events')
+
+DEFAULTS = {
+    'POLL_INTERVAL': 1.0,
+    'KEEPALIVE': 15,
+    'QUEUE_SIZE': 32,
+    'BACKLOG_LIMIT': 100,
+    'RETRY_MS': 3000,
+}
+
+STATUS_FOR_KIND = {'created': 'placed'}
+POLL_BATCH = 1000
+
+
+def get_config():
+    """Return ORDER_EVENTS settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ORDER_EVENTS', {}))
+    return config
+
+
+def publish(kind, order_ids):
+    """
+    Move orders to the status matching ``kind`` and record one event per
+    order that actually changed. Returns the number of events written.
+    """
+    status = STATUS_FOR_KIND.get(kind, kind)
+    with transaction.atomic():
+        orders = Order.objects.filter(id__in=list(order_ids))
+        if kind == 'created':
+            orders = orders.exclude(events__kind='created')
+        else:
+            orders = orders.exclude(status=status)
+        rows = list(orders.values_list('id', 'user_id'))
+        if not rows:
+            return 0
+        changed = [order_id for order_id, _ in rows]
+        Order.objects.filter(id__in=changed).update(status=status)
+        OrderEvent.objects.bulk_create(
+            [OrderEvent(order_id=order_id, user_id=user_id, kind=kind) for order_id, user_id in rows],
+            batch_size=500,
+        )
+        transaction.on_commit(wake_hubs)
+    return len(rows)
+
+
+def format_event(event_id, order_id, kind, created_at):
+    data = json.dumps({'order': order_id, 'status': kind, 'at': created_at.isoformat()})
+    return f"id: {event_id}\nevent: order.{kind}\ndata: {data}\n\n"
+
+
+class EventHub:
+    """Per-event-loop registry of open streams and the poller feeding them"""
+
+    def __init__(self, loop, config):
+        self.loop = loop
+        self.poll_interval = config['POLL_INTERVAL']
+        self.queue_size = config['QUEUE_SIZE']
+        self.subscribers = {}          # user id -> set of queues
+        self.last_id = None
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def wake(self):
+        """Thread-safe nudge to poll now"""
+        self.loop.call_soon_threadsafe(self._wake.set)
+
+    async def subscribe(self, user_id):
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        if self.last_id is None:
+            latest = await OrderEvent.objects.order_by('-id').values_list('id', flat=True).afirst()
+            if self.last_id is None:
+                self.last_id = latest or 0
+        if self._task is None or self._task.done():
+            self._task = self.loop.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await self.poll() == POLL_BATCH:
+                    pass
+            except Exception:
+                logger.exception("Order event poll failed")
+
+    async def poll(self):
+        """Fan out events newer than ``last_id``; returns how many rows were read"""
+        rows = OrderEvent.objects.filter(id__gt=self.last_id).order_by('id').values_list(
+            'id', 'user_id', 'order_id', 'kind', 'created_at')[:POLL_BATCH]
+        count = 0
+        async for event_id, user_id, order_id, kind, created_at in rows:
+            self.last_id = event_id
+            count += 1
+            queues = self.subscribers.get(user_id)
+            if not queues:
+                continue
+            message = (event_id, format_event(event_id, order_id, kind, created_at))
+            for queue in list(queues):
+                try:
+                    queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    # Slow consumer: close the stream, it resumes from Last-Event-ID
+                    self.unsubscribe(user_id, queue)
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(None)
+        return count
+
+
+_hubs = weakref.WeakKeyDictionary()
+_hubs_lock = threading.Lock()
+
+
+def get_hub():
+    """Hub of the running event loop"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        with _hubs_lock:
+            hub = _hubs.get(loop)
+            if hub is None:
+                hub = _hubs[loop] = EventHub(loop, get_config())
+    return hub
+
+
+def wake_hubs():
+    for hub in list(_hubs.values()):
+        if hub.subscribers and not hub.loop.is_closed():
+            hub.wake()
+
+
+async def stream(user_id, last_event_id=None):
+    """Async iterator of SSE frames for one customer"""
+    config = get_config()
+    hub = get_hub()
+    queue = await hub.subscribe(user_id)
+    sent = 0
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n"
+        if last_event_id and last_event_id.isdigit():
+            backlog = (OrderEvent.objects
+                       .filter(user_id=user_id, id__gt=int(last_event_id))
+                       .order_by('id')
+                       .values_list('id', 'order_id', 'kind', 'created_at')[:config['BACKLOG_LIMIT']])
+            async for event_id, order_id, kind, created_at in backlog:
+                sent = event_id
+                yield format_event(event_id, order_id, kind, created_at)
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), config['KEEPALIVE'])
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                return
+            event_id, frame = message
+            if event_id > sent:
+                sent = event_id
+                yield frame
+    finally:
+        hub.unsubscribe(user_id, queue)
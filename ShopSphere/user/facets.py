@@ -0,0 +1,316 @@
+"""
+Faceted browsing over the storefront with precomputed bitmaps.
+
+Every storefront product gets a bit position; for each facet value
+(vendor, business_type, price band, in_stock) the index keeps a Python int
+used as a bitmap of the products that have it. A filtered page is an
+AND of ORs over those bitmaps and every facet count is a popcount, so a
+request costs one cache read for the index version plus one query for the
+page rows, whatever the catalog size (and, every few seconds, one aggregate
+over the indexed updated_at column, see below).
+
+The index is built once per process from a single values_list() query and
+then maintained incrementally by user/storefront.py. Changes bump a
+version in the cache so other worker processes rebuild on their next read.
+Because that cache is per process unless a shared backend is configured,
+each process also watches the storefront table's row count and latest
+updated_at (ShopSphere/versions.py) and, when they move, reloads just the
+rows saved since its last look; a lower row count means rows were deleted
+and triggers a rebuild.
+Removed products leave their bit position unused; once more than half of
+the positions are unused the process rebuilds a compact index on its next
+read. Queries work on a snapshot taken under the index lock, so concurrent
+upserts never change the dicts they iterate.
+"""
+
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from ShopSphere.versions import TableVersion
+from .models import Product
+
+
+FACETS = ('vendor', 'business_type', 'price', 'in_stock')
+VERSION_KEY = 'catalog_facets:version'
+# Unused bit positions tolerated before the index is rebuilt compactly
+MIN_COMPACTION = 1024
+# Rows saved this long before the last seen updated_at are reloaded too, in case their transaction committed late
+CATCH_UP_OVERLAP = timedelta(seconds=60)
+
+DEFAULT_PRICE_BANDS = [(0, 500), (500, 1000), (1000, 5000), (5000, None)]
+
+
+def price_bands():
+    return getattr(settings, 'CATALOG_PRICE_BANDS', DEFAULT_PRICE_BANDS)
+
+
+def band_label(low, high):
+    return f"{low}+" if high is None else f"{low}-{high}"
+
+
+def price_band(price):
+    """Label of the configured band a price falls in"""
+    for low, high in price_bands():
+        if price >= Decimal(low) and (high is None or price < Decimal(high)):
+            return band_label(low, high)
+    return None
+
+
+def selection_filter(selected):
+    """
+    The Q object matching the same products as ``FacetIndex.query(selected)``,
+    for queries that need another order than the bitmaps' (e.g. by popularity)
+    """
+    bands = {band_label(low, high): (low, high) for low, high in price_bands()}
+    condition = Q()
+    for facet, values in selected.items():
+        if not values:
+            continue
+        if facet == 'vendor':
+            condition &= Q(vendor_id__in=values)
+        elif facet == 'business_type':
+            condition &= Q(business_type__in=values)
+        elif facet == 'price':
+            options = Q(pk__in=[])
+            for low, high in (bands[value] for value in values if value in bands):
+                band = Q(price__gte=Decimal(low))
+                if high is not None:
+                    band &= Q(price__lt=Decimal(high))
+                options |= band
+            condition &= options
+        elif facet == 'in_stock':
+            options = Q(pk__in=[])
+            if 'yes' in values:
+                options |= Q(stock__isnull=True) | Q(stock__gt=0)
+            if 'no' in values:
+                options |= Q(stock__lte=0)
+            condition &= options
+    return condition
+
+
+def _popcount(bitmap):
+    return bitmap.bit_count()
+
+
+class FacetIndex:
+    """Bitmap index of storefront products by facet value"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.positions = {}        # product id -> bit position
+        self.ids = []              # bit position -> product id (None once removed)
+        self.all_bits = 0
+        self.bitmaps = {facet: {} for facet in FACETS}
+        self.row_values = {}       # product id -> {facet: value}
+        self.vendor_names = {}
+
+    @staticmethod
+    def _facet_values(vendor_id, business_type, price, stock):
+        return {
+            'vendor': vendor_id,
+            'business_type': business_type or None,
+            'price': price_band(price),
+            'in_stock': 'yes' if stock is None or stock > 0 else 'no',
+        }
+
+    def _clear(self, product_id):
+        position = self.positions.get(product_id)
+        if position is None:
+            return None
+        mask = ~(1 << position)
+        for facet, value in self.row_values.pop(product_id).items():
+            bitmaps = self.bitmaps[facet]
+            if value in bitmaps:
+                bitmaps[value] &= mask
+                if not bitmaps[value]:
+                    del bitmaps[value]
+        self.all_bits &= mask
+        return position
+
+    def upsert(self, rows):
+        """rows: iterable of (id, vendor_id, vendor_name, business_type, price, stock)"""
+        with self._lock:
+            for product_id, vendor_id, vendor_name, business_type, price, stock in rows:
+                position = self._clear(product_id)
+                if position is None:
+                    position = len(self.ids)
+                    self.ids.append(product_id)
+                    self.positions[product_id] = position
+                bit = 1 << position
+                values = self._facet_values(vendor_id, business_type, price, stock)
+                for facet, value in values.items():
+                    if value is not None:
+                        bitmaps = self.bitmaps[facet]
+                        bitmaps[value] = bitmaps.get(value, 0) | bit
+                self.row_values[product_id] = values
+                self.all_bits |= bit
+                if vendor_id is not None:
+                    self.vendor_names[vendor_id] = vendor_name
+
+    def remove(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                position = self._clear(product_id)
+                if position is not None:
+                    del self.positions[product_id]
+                    self.ids[position] = None
+
+    def needs_compaction(self):
+        unused = len(self.ids) - len(self.positions)
+        return unused >= MIN_COMPACTION and unused * 2 > len(self.ids)
+
+    @staticmethod
+    def _selection_bits(bitmaps, values):
+        bits = 0
+        for value in values:
+            bits |= bitmaps.get(value, 0)
+        return bits
+
+    def query(self, selected):
+        """
+        Return (matching bitmap, facet counts) for ``selected``, a mapping of
+        facet -> set of values. Counts for a facet ignore that facet's own
+        selection so the sidebar shows how many results each option would add.
+        """
+        with self._lock:
+            all_bits = self.all_bits
+            bitmaps = {facet: dict(values) for facet, values in self.bitmaps.items()}
+        per_facet = {
+            facet: self._selection_bits(bitmaps[facet], values)
+            for facet, values in selected.items() if values
+        }
+
+        matching = all_bits
+        for bits in per_facet.values():
+            matching &= bits
+
+        counts = {}
+        for facet in FACETS:
+            base = all_bits
+            for other, bits in per_facet.items():
+                if other != facet:
+                    base &= bits
+            counts[facet] = {
+                value: _popcount(bitmap & base)
+                for value, bitmap in bitmaps[facet].items()
+            }
+        return matching, counts
+
+    def page_ids(self, bitmap, offset, limit):
+        """Product ids of the set bits, highest position (newest) first"""
+        bits = bin(bitmap)[2:]
+        top = len(bits) - 1
+        result = []
+        index = bits.find('1')
+        skipped = 0
+        while index != -1 and len(result) < limit:
+            # A bitmap taken before a concurrent remove() can still name a freed position
+            product_id = self.ids[top - index]
+            if product_id is None:
+                pass
+            elif skipped < offset:
+                skipped += 1
+            else:
+                result.append(product_id)
+            index = bits.find('1', index + 1)
+        return result
+
+
+_index = None
+_index_version = None
+_index_table = None
+_index_lock = threading.Lock()
+_table_version = TableVersion(lambda: Product.all_objects.all())
+
+
+def _rows(queryset):
+    return queryset.values_list('id', 'vendor_id', 'vendor_name', 'business_type', 'price', 'stock')
+
+
+def _catch_up(index, seen, table):
+    """Apply the rows saved since ``seen``; False when rows were deleted and a rebuild is needed"""
+    (seen_count, seen_latest), (count, latest) = seen, table
+    if count < seen_count:
+        return False
+    changed = Product.all_objects.order_by('id')
+    if seen_latest is not None:
+        changed = changed.filter(updated_at__gte=seen_latest - CATCH_UP_OVERLAP)
+    listed, delisted = [], []
+    for row in changed.values_list('id', 'vendor_id', 'vendor_name', 'business_type', 'price', 'stock',
+                                   'is_listed'):
+        if row[-1]:
+            listed.append(row[:-1])
+        else:
+            delisted.append(row[0])
+    index.upsert(listed)
+    index.remove(delisted)
+    return True
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def get_index():
+    """This process' index, rebuilt or caught up when another process has changed the catalog"""
+    global _index, _index_version, _index_table
+    version = _current_version()
+    table = _table_version.get()
+    if _index is None or _index_version != version or _index_table != table:
+        with _index_lock:
+            if _index is not None and _index_version == version and _index_table != table:
+                if _catch_up(_index, _index_table, table) and not _index.needs_compaction():
+                    _index_table = table
+                else:
+                    _index = None
+            if _index is None or _index_version != version:
+                index = FacetIndex()
+                index.upsert(_rows(Product.objects.order_by('id')))
+                _index, _index_version, _index_table = index, version, table
+    return _index
+
+
+def _bump_version():
+    global _index_version
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    # Keep the incrementally updated index only if no other process changed the catalog meanwhile
+    if _index is not None and _index_version is not None and version == _index_version + 1:
+        _index_version = version
+
+
+def products_changed(product_ids):
+    """Refresh storefront rows that were inserted or updated"""
+    if _index is not None and product_ids:
+        _index.upsert(_rows(Product.objects.filter(id__in=product_ids).order_by('id')))
+    _bump_version()
+
+
+def products_removed(product_ids):
+    """Drop storefront rows that were delisted or deleted"""
+    global _index
+    index = _index
+    if index is not None and product_ids:
+        index.remove(product_ids)
+        if index.needs_compaction():
+            _index = None
+    _bump_version()
+
+
+def invalidate():
+    """Force every process to rebuild on its next read"""
+    global _index
+    _index = None
+    _bump_version()
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.mail import send_mass_mail
+
+from superAdmin import outbox
+from vendor.models import VendorProfile
+from .models import AuthUser, OrderItem
+from . import autocomplete, events, popularity, recommendations, storefront
+
+
+# ============================================================================
+# OUTBOX HANDLERS (run by `manage.py dispatch_outbox`; must be idempotent)
+# ============================================================================
+
+@outbox.handler(outbox.VENDOR_APPROVED, outbox.VENDOR_REJECTED, outbox.VENDOR_BLOCKED,
+                outbox.VENDOR_UNBLOCKED, outbox.VENDOR_UPDATED)
+def resync_vendor_storefront(batch):
+    """Vendor-level changes re-evaluate every product of the vendor, once per vendor per batch"""
+    vendor_ids = {event.payload['vendor_id'] for event in batch}
+    for vendor in VendorProfile.objects.filter(id__in=vendor_ids):
+        storefront.sync_vendor(vendor)
+
+
+@outbox.handler(outbox.ORDER_PLACED)
+def publish_orders_created(batch):
+    """Push 'created' to the customers' order streams"""
+    events.publish('created', [order_id for event in batch for order_id in event.payload['order_ids']])
+
+
+@outbox.handler(outbox.ORDER_PLACED)
+def send_order_confirmations(batch):
+    emails = dict(AuthUser.objects.filter(id__in={event.payload['user_id'] for event in batch})
+                  .values_list('id', 'email'))
+    messages = [
+        (
+            "Your ShopSphere order is confirmed",
+            f"Thank you for shopping with us. Order number(s): {', '.join(map(str, event.payload['order_ids']))}.",
+            settings.EMAIL_HOST_USER,
+            [emails[event.payload['user_id']]],
+        )
+        for event in batch if emails.get(event.payload['user_id'])
+    ]
+    if messages:
+        send_mass_mail(messages)
+
+
+@outbox.handler(outbox.ORDER_PLACED)
+def update_recommendations(batch):
+    """Fold the new baskets into the co-purchase matrix"""
+    recommendations.apply_events(batch)
+
+
+@outbox.handler(outbox.ORDER_PLACED)
+def refresh_autocomplete_popularity(batch):
+    """Sales move products (and their shops) up the suggestions"""
+    order_ids = [order_id for event in batch for order_id in event.payload['order_ids']]
+    product_ids = OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False).values_list(
+        'product_id', flat=True)
+    autocomplete.products_changed(product_ids)
+
+
+@outbox.handler(outbox.ORDER_PLACED)
+def score_sales(batch):
+    """One popularity batch for every product sold in these checkouts (a rare redelivery only nudges a score)"""
+    order_ids = [order_id for event in batch for order_id in event.payload['order_ids']]
+    popularity.record_sales(OrderItem.objects.filter(order_id__in=order_ids).values_list('product_id', 'quantity'))
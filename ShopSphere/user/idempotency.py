@@ -0,0 +1,234 @@
+"""
+Idempotency-Key support for POST endpoints that must not run twice.
+
+A client sends ``Idempotency-Key: <uuid>`` with a POST. The first request
+claims the key by inserting an IdempotencyKey row in state ``running`` (the
+unique (user, key) constraint is the cross-process lock), runs the view and
+stores the status code and compact JSON body (or redirect target). Retries:
+
+* find a ``done`` row and get the stored response back - one indexed lookup,
+  no checkout work;
+* find a ``running`` row and wait for it (on an in-process lock first, then
+  by polling the row) instead of executing again;
+* reuse the key with a different body and get 422.
+
+The stored response is written in the same transaction as the view's
+changes. 5xx responses, non-JSON pages and exceptions release the key so
+the client can retry for real. Claims older than LOCK_TIMEOUT are treated
+as abandoned. Rows expire after TTL seconds and are purged from a
+background thread at most once per PURGE_INTERVAL per process.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+import weakref
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.http import HttpResponseRedirect
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+
+logger = logging.getLogger('shopsphere.idempotency')
+
+DEFAULTS = {
+    'HEADER': 'Idempotency-Key',
+    'TTL': 60 * 60 * 24,
+    'LOCK_TIMEOUT': 30,
+    'WAIT_TIMEOUT': 10,
+    'PURGE_INTERVAL': 600,
+}
+
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+
+def get_config():
+    """Return IDEMPOTENCY settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'IDEMPOTENCY', {}))
+    return config
+
+
+class _KeyLock:
+    """Lock object held weakly by the registry; dropped once no request uses it"""
+
+    __slots__ = ('lock', '__weakref__')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+
+_locks = weakref.WeakValueDictionary()
+_locks_guard = threading.Lock()
+
+
+def _local_lock(user_id, key):
+    with _locks_guard:
+        entry = _locks.get((user_id, key))
+        if entry is None:
+            entry = _locks[(user_id, key)] = _KeyLock()
+        return entry
+
+
+def request_hash(request):
+    """Fingerprint of the parsed request, so a key cannot be replayed for a different payload"""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    digest = hashlib.sha1(f"{request.method} {request.path}\n".encode())
+    digest.update(json.dumps(data, sort_keys=True, cls=JSONEncoder, default=str).encode())
+    return digest.hexdigest()
+
+
+def _cacheable(response):
+    return isinstance(response, HttpResponseRedirect) or hasattr(response, 'data')
+
+
+def _replay(row):
+    if row.location:
+        response = HttpResponseRedirect(row.location)
+    else:
+        response = Response(json.loads(row.body) if row.body else None, status=row.status_code)
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def _store(row, response):
+    row.state = 'done'
+    row.status_code = response.status_code
+    if isinstance(response, HttpResponseRedirect):
+        row.location = response['Location'][:300]
+    else:
+        row.body = json.dumps(getattr(response, 'data', None), cls=JSONEncoder, separators=(',', ':'))
+    row.save(update_fields=['state', 'status_code', 'body', 'location'])
+
+
+def _claim(user, key, fingerprint, config):
+    """Return (row, claimed): claimed=False means another request owns or finished the key"""
+    row = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if row is None:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, key=key, request_hash=fingerprint), True
+        except IntegrityError:
+            return IdempotencyKey.objects.filter(user=user, key=key).first(), False
+    stale = timezone.now() - timedelta(seconds=config['LOCK_TIMEOUT'])
+    if row.state == 'running' and row.created_at < stale and row.request_hash == fingerprint:
+        # Owner died mid-request: take the claim over
+        taken = IdempotencyKey.objects.filter(id=row.id, state='running', created_at=row.created_at).update(
+            created_at=timezone.now())
+        if taken:
+            return row, True
+    return row, False
+
+
+def _wait(row_id, config):
+    """
+    Poll a running row until WAIT_TIMEOUT. Returns (finished, row): the done
+    row, None if its owner released the key, or (False, None) on timeout.
+    """
+    deadline = time.monotonic() + config['WAIT_TIMEOUT']
+    delay = 0.05
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        row = IdempotencyKey.objects.filter(id=row_id).first()
+        if row is None or row.state == 'done':
+            return True, row
+    return False, None
+
+
+def idempotent(view):
+    """
+    Make a function-based DRF view honour the Idempotency-Key header on POST.
+    Place it below @api_view/@permission_classes so request.user is set.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        config = get_config()
+        key = request.headers.get(config['HEADER'])
+        if request.method != 'POST' or not key or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        if len(key) > 64:
+            return Response({"error": f"{config['HEADER']} must be at most 64 characters"}, status=400)
+
+        maybe_purge(config)
+        fingerprint = request_hash(request)
+        entry = _local_lock(request.user.pk, key)
+        with entry.lock:
+            row, claimed = _claim(request.user, key, fingerprint, config)
+            if not claimed:
+                if row is not None and row.request_hash != fingerprint:
+                    return Response({"error": f"{config['HEADER']} was already used for a different request"},
+                                    status=422)
+                if row is not None and row.state == 'running':
+                    finished, row = _wait(row.id, config)
+                    if not finished:
+                        return Response({"error": "A request with this key is still in progress"}, status=409)
+                if row is not None and row.state == 'done':
+                    return _replay(row)
+                # The owner failed and released the key: run it ourselves
+                row, claimed = _claim(request.user, key, fingerprint, config)
+                if not claimed:
+                    return Response({"error": "A request with this key is still in progress"}, status=409)
+
+            # The stored response commits together with the view's own writes
+            try:
+                with transaction.atomic():
+                    response = view(request, *args, **kwargs)
+                    keep = response.status_code < 500 and _cacheable(response)
+                    if keep:
+                        _store(row, response)
+            except Exception:
+                IdempotencyKey.objects.filter(id=row.id).delete()
+                raise
+            if not keep:
+                IdempotencyKey.objects.filter(id=row.id).delete()
+            return response
+    return wrapper
+
+
+# ============================================================================
+# EXPIRY
+# ============================================================================
+
+_last_purge = 0.0
+_purge_guard = threading.Lock()
+
+
+def purge_expired(ttl=None):
+    """Delete keys older than TTL; returns the number removed"""
+    ttl = ttl or get_config()['TTL']
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=ttl)).delete()
+    return deleted
+
+
+def _purge_in_background(ttl):
+    try:
+        purge_expired(ttl)
+    except Exception:
+        logger.exception("Idempotency key purge failed")
+    finally:
+        close_old_connections()
+
+
+def maybe_purge(config):
+    """Start a background purge if this process has not run one for PURGE_INTERVAL seconds"""
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < config['PURGE_INTERVAL']:
+        return
+    with _purge_guard:
+        if now - _last_purge < config['PURGE_INTERVAL']:
+            return
+        _last_purge = now
+    threading.Thread(target=_purge_in_background, args=(config['TTL'],), daemon=True).start()
@@ -0,0 +1,54 @@
+import random
+import string
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from user import autocomplete
+
+
+class Command(BaseCommand):
+    help = "Build the autocomplete index over synthetic names and report memory and query latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--names', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=20_000)
+        parser.add_argument('--updates', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(20_000)]
+        entries = [
+            (autocomplete.PRODUCT, product_id, rng.randint(1, 5_000),
+             ' '.join(rng.choices(words, k=rng.randint(1, 4))).title(), rng.paretovariate(1.2))
+            for product_id in range(1, options['names'] + 1)
+        ]
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = autocomplete.AutocompleteIndex(entries, autocomplete.get_config())
+        build = time.perf_counter() - start
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f"built {options['names']} names ({len(index.keys)} keys) in {build:.1f}s, "
+                          f"{used / options['names']:.0f} bytes per name")
+
+        start = time.perf_counter()
+        for product_id in rng.sample(range(1, options['names'] + 1), options['updates']):
+            index.upsert([(autocomplete.PRODUCT, product_id, None, rng.choice(words).title(), rng.random() * 100)])
+        self.stdout.write(f"{options['updates']} incremental updates: "
+                          f"{(time.perf_counter() - start) / options['updates'] * 1e6:.0f} us each")
+
+        prefixes = [word[:rng.randint(1, 6)] for word in rng.choices(words, k=options['queries'])]
+        timings = []
+        for prefix in prefixes:
+            begin = time.perf_counter()
+            index.search(prefix, 8)
+            timings.append(time.perf_counter() - begin)
+        timings.sort()
+        self.stdout.write(
+            f"{len(prefixes)} queries: p50 {timings[len(timings) // 2] * 1e6:.0f} us, "
+            f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us, max {timings[-1] * 1e6:.0f} us"
+        )
@@ -0,0 +1,80 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from user import coupons
+from user.models import AuthUser, Coupon
+
+
+class Command(BaseCommand):
+    help = "Simulate a flash-sale coupon: concurrent reserve+redeem on one counter row vs N shards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=2000, help="Checkouts across all threads")
+        parser.add_argument('--limit', type=int, default=1500)
+        parser.add_argument('--shards', type=int, default=16)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        users = AuthUser.objects.bulk_create([
+            AuthUser(username=f"bench-{tag}-{i}", email=f"bench-{tag}-{i}@example.invalid")
+            for i in range(options['attempts'])
+        ])
+        users = list(AuthUser.objects.filter(email__startswith=f"bench-{tag}-"))
+        try:
+            for shard_count in (1, options['shards']):
+                self.run(users, f"BENCH{tag}{shard_count}".upper(), shard_count, options)
+        finally:
+            Coupon.objects.filter(code__startswith=f"BENCH{tag}".upper()).delete()
+            AuthUser.objects.filter(email__startswith=f"bench-{tag}-").delete()
+
+    def run(self, users, code, shard_count, options):
+        coupon = Coupon.objects.create(code=code, max_redemptions=options['limit'], shard_count=shard_count)
+        threads = options['threads']
+        stats = {'redeemed': 0, 'sold_out': 0, 'retries': 0}
+        stats_lock = threading.Lock()
+
+        def worker(chunk):
+            redeemed = sold_out = retries = 0
+            try:
+                for user in chunk:
+                    while True:
+                        try:
+                            with transaction.atomic():
+                                ok = coupons.redeem(coupon, user)
+                            break
+                        except OperationalError:
+                            # SQLite: database is locked
+                            retries += 1
+                            time.sleep(0.001)
+                    if ok:
+                        redeemed += 1
+                    else:
+                        sold_out += 1
+            finally:
+                connection.close()
+            with stats_lock:
+                stats['redeemed'] += redeemed
+                stats['sold_out'] += sold_out
+                stats['retries'] += retries
+
+        workers = [threading.Thread(target=worker, args=(users[i::threads],)) for i in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        counted = coupons.redeemed_count(coupon)
+        self.stdout.write(
+            f"{shard_count:>3} shard(s): {len(users) / elapsed:8.0f} checkouts/s, "
+            f"{stats['redeemed']} redeemed, {stats['sold_out']} sold out, {stats['retries']} lock retries, "
+            f"counter {counted}/{options['limit']}"
+        )
+        if counted != stats['redeemed'] or counted > options['limit']:
+            self.stderr.write(self.style.ERROR("Counter does not match redemptions"))
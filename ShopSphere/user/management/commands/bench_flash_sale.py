@@ -0,0 +1,114 @@
+import statistics
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from user import views, waiting_room
+from user.models import AuthUser, FlashSale, Product
+
+
+class Command(BaseCommand):
+    help = ("Load test a flash sale: buyers hammer one product while shoppers browse the catalog, "
+            "first without and then with the waiting room; reports browse latency and buyer outcomes")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=32)
+        parser.add_argument('--browsers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--admit-per-minute', type=int, default=600)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        count = options['buyers'] + options['browsers']
+        AuthUser.objects.bulk_create([
+            AuthUser(username=f"bench-{tag}-{i}", email=f"bench-{tag}-{i}@example.invalid") for i in range(count)
+        ])
+        users = list(AuthUser.objects.filter(email__startswith=f"bench-{tag}-").order_by('id'))
+        product = Product.objects.create(name=f"Flash bench {tag}", price=Decimal('499.00'))
+        try:
+            for enabled in (False, True):
+                if enabled:
+                    FlashSale.objects.create(product=product, admit_per_minute=options['admit_per_minute'])
+                waiting_room.invalidate()
+                self.run(product, users[:options['buyers']], users[options['buyers']:], enabled, options)
+        finally:
+            FlashSale.objects.filter(product=product).delete()
+            waiting_room.invalidate()
+            product.delete()
+            AuthUser.objects.filter(email__startswith=f"bench-{tag}-").delete()
+
+    def run(self, product, buyers, browsers, enabled, options):
+        factory = APIRequestFactory()
+        deadline = time.monotonic() + options['seconds']
+        latencies, outcomes = [], {'bought': 0, 'queued_polls': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def call(view, user, method='get', path='/', data=None, headers=None, **kwargs):
+            request = getattr(factory, method)(path, data, format='json', HTTP_ACCEPT='application/json',
+                                               **(headers or {}))
+            force_authenticate(request, user=user)
+            return view(request, **kwargs)
+
+        def buyer(user):
+            headers, polls, bought, errors = {}, 0, 0, 0
+            try:
+                while time.monotonic() < deadline and not bought:
+                    try:
+                        response = call(views.add_to_cart, user, 'post', headers=headers, product_id=product.id)
+                        if response.status_code == 429:
+                            state = call(views.flash_queue, user, product_id=product.id).data
+                            polls += 1
+                            if state['admitted']:
+                                headers = {'HTTP_ADMISSION_TOKEN': state['token']}
+                            else:
+                                time.sleep(0.05)
+                            continue
+                        response = call(views.process_payment, user, 'post', data={'payment_mode': 'UPI'},
+                                        headers=headers)
+                        bought = int(response.status_code == 200)
+                    except Exception:
+                        errors += 1
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+            with lock:
+                outcomes['bought'] += bought
+                outcomes['queued_polls'] += polls
+                outcomes['errors'] += errors
+
+        def browser(user):
+            timings = []
+            try:
+                while time.monotonic() < deadline:
+                    begin = time.perf_counter()
+                    call(views.catalog_api, user, path='/catalog?page_size=20')
+                    timings.append(time.perf_counter() - begin)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(timings)
+
+        threads = ([threading.Thread(target=buyer, args=(user,)) for user in buyers]
+                   + [threading.Thread(target=browser, args=(user,)) for user in browsers])
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        label = "waiting room" if enabled else "no queue    "
+        if latencies:
+            latencies.sort()
+            p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+            browse = (f"catalog p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                      f"p99 {p99 * 1000:.1f} ms over {len(latencies)} requests")
+        else:
+            browse = "no catalog requests completed"
+        self.stdout.write(
+            f"{label}: {browse}; {outcomes['bought']}/{len(buyers)} buyers checked out, "
+            f"{outcomes['queued_polls']} queue polls, {outcomes['errors']} failed requests"
+        )
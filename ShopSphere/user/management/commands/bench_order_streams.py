@@ -0,0 +1,42 @@
+import asyncio
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from user import events
+
+
+class Command(BaseCommand):
+    help = "Hold N idle order-status streams on one event loop and report memory per connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options['connections']))
+
+    async def run(self, connections):
+        tracemalloc.start()
+        baseline = tracemalloc.take_snapshot()
+
+        streams, waiters = [], []
+        for user_id in range(1, connections + 1):
+            stream = events.stream(user_id)
+            await stream.__anext__()          # retry: frame
+            streams.append(stream)
+            waiters.append(asyncio.ensure_future(stream.__anext__()))
+        await asyncio.sleep(0.1)
+
+        used = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(baseline, 'filename'))
+        tracemalloc.stop()
+        hub = events.get_hub()
+        self.stdout.write(
+            f"{connections} idle streams, {len(hub.subscribers)} subscribed users: "
+            f"{used / 1024:.0f} KiB total, {used / connections:.0f} bytes per connection"
+        )
+
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        for stream in streams:
+            await stream.aclose()
@@ -0,0 +1,88 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from user import popularity
+from user.models import AuthUser, Order, OrderItem, Product
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Compare 'sort by popular' on the precomputed popularity index with aggregating OrderItem "
+            "per request, on synthetic data that is rolled back afterwards")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20_000)
+        parser.add_argument('--orders', type=int, default=100_000)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        user = AuthUser.objects.create(username='bench', email=f"bench-{rng.random()}@example.invalid")
+        Product.objects.bulk_create(
+            [Product(name=f"Bench product {i}", price=Decimal('10.00')) for i in range(options['products'])],
+            batch_size=1000,
+        )
+        product_ids = list(Product.objects.filter(name__startswith='Bench product ').values_list('id', flat=True))
+        orders = Order.objects.bulk_create(
+            [Order(user=user, payment_mode='UPI') for _ in range(options['orders'])], batch_size=1000)
+        order_ids = list(Order.objects.filter(user=user).values_list('id', flat=True))
+        # Spread order dates over 60 days; bulk_create cannot override auto_now_add
+        for days in range(60):
+            Order.objects.filter(id__in=order_ids[days::60]).update(order_date=now - timedelta(days=days))
+        weights = [1 / (rank + 1) for rank in range(len(product_ids))]
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order_id=order_id, product_id=product_id, product_name='bench', quantity=rng.randint(1, 3),
+                          price=Decimal('10.00'))
+                for order_id, product_id in zip(order_ids, rng.choices(product_ids, weights, k=len(order_ids)))
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f"{len(product_ids)} products, {len(orders)} orders")
+
+        start = time.perf_counter()
+        popularity.rescore()
+        self.stdout.write(f"scoring job (full backfill): {time.perf_counter() - start:.2f}s")
+
+        size = options['page_size']
+        since = now - timedelta(days=30)
+
+        def indexed():
+            return list(Product.objects.order_by('-popularity', '-id').values_list('id', flat=True)[:size])
+
+        def aggregated():
+            return list(
+                Product.objects
+                .annotate(sold=Sum('order_items__quantity', filter=Q(order_items__order__order_date__gte=since)))
+                .order_by('-sold', '-id')
+                .values_list('id', flat=True)[:size]
+            )
+
+        for label, func in (("popularity index", indexed), ("OrderItem aggregate", aggregated)):
+            timings = []
+            for _ in range(options['repeat']):
+                begin = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - begin)
+            self.stdout.write(f"{label:>20}: best {min(timings) * 1000:.2f} ms per page of {size}")
@@ -0,0 +1,95 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from user import pricing
+
+
+def naive_price(rules, lines, coupon):
+    """Rule-by-rule reference evaluation in Decimal, used to check the engine"""
+    total = Decimal('0.00')
+    for product_id, vendor_id, price, quantity in lines:
+        best = Decimal('0.00')
+        for rule in rules:
+            if rule['product_id'] not in (None, product_id):
+                continue
+            if rule['product_id'] is None and rule['vendor_id'] not in (None, vendor_id):
+                continue
+            if quantity < rule['min_quantity'] or (rule['coupon_code'] and rule['coupon_code'] != coupon):
+                continue
+            if rule['kind'] == 'percent':
+                discount = (price * rule['value'] / 100).quantize(Decimal('0.01'), rounding='ROUND_FLOOR')
+            else:
+                discount = min(rule['value'], price)
+            best = max(best, discount)
+        total += (price - best) * quantity
+    return total
+
+
+class Command(BaseCommand):
+    help = "Benchmark cart pricing: compiled engine vs rule-by-rule evaluation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', type=int, default=1000)
+        parser.add_argument('--lines', type=int, default=200)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--vendors', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        products, vendors = options['products'], options['vendors']
+        vendor_of = {product_id: rng.randint(1, vendors) for product_id in range(1, products + 1)}
+        coupons = ['SAVE10', 'FESTIVE', 'WELCOME']
+
+        rules = []
+        for rule_id in range(1, options['rules'] + 1):
+            scope = rng.random()
+            kind = rng.choice(['percent', 'amount'])
+            rules.append({
+                'id': rule_id,
+                'kind': kind,
+                'value': Decimal(rng.randint(1, 40)) if kind == 'percent' else Decimal(rng.randint(5, 200)),
+                'product_id': rng.randint(1, products) if scope < 0.7 else None,
+                'vendor_id': rng.randint(1, vendors) if 0.7 <= scope < 0.97 else None,
+                'coupon_code': rng.choice(coupons) if rng.random() < 0.1 else '',
+                'min_quantity': rng.choice([1, 1, 1, 2, 5]),
+                'starts_at': None,
+                'ends_at': None,
+            })
+
+        start = time.perf_counter()
+        engine = pricing.PricingEngine(rules, timezone.now())
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        product_ids = rng.sample(range(1, products + 1), options['lines'])
+        lines = [
+            (product_id, vendor_of[product_id], Decimal(rng.randint(100, 500000)) / 100, rng.randint(1, 6))
+            for product_id in product_ids
+        ]
+        # Make sure a good share of the cart actually hits rules
+        for rule in rules[:options['lines'] // 2]:
+            if rule['product_id'] is not None:
+                lines[rng.randrange(len(lines))] = (rule['product_id'], vendor_of[rule['product_id']],
+                                                    Decimal('999.99'), 3)
+
+        def best_of(func):
+            timings = []
+            for _ in range(options['repeat']):
+                begin = time.perf_counter()
+                result = func()
+                timings.append(time.perf_counter() - begin)
+            return min(timings) * 1000, result
+
+        fast_ms, priced = best_of(lambda: engine.price(lines, 'SAVE10'))
+        slow_ms, reference = best_of(lambda: naive_price(rules, lines, 'SAVE10'))
+
+        self.stdout.write(f"{len(rules)} rules compiled in {compile_ms:.1f} ms; cart of {len(lines)} lines")
+        self.stdout.write(f"engine:       {fast_ms:.2f} ms  total {priced.total} (discount {priced.discount})")
+        self.stdout.write(f"rule-by-rule: {slow_ms:.2f} ms  total {reference}")
+        if priced.total != reference:
+            self.stderr.write(self.style.ERROR("Totals differ"))
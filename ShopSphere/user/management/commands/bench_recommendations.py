@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from user import recommendations
+
+
+class Command(BaseCommand):
+    help = "Time a co-purchase build, an incremental update and lookups on synthetic orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--products', type=int, default=50_000)
+        parser.add_argument('--max-basket', type=int, default=5)
+        parser.add_argument('--update', type=int, default=500, help="Orders in the incremental batch")
+        parser.add_argument('--k', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        products, k = options['products'], options['k']
+
+        def baskets(count):
+            sizes = rng.integers(1, options['max_basket'] + 1, count)
+            codes = np.repeat(np.arange(count), sizes)
+            # Skewed popularity, like a real catalog
+            return codes, rng.zipf(1.3, len(codes)) % products + 1
+
+        codes, items = baskets(options['orders'])
+        start = time.perf_counter()
+        matrix = recommendations.cooccurrence(codes, items, products + 1)
+        ids, values = recommendations.top_k(recommendations.score_rows(matrix, np.arange(products + 1)), k)
+        build = time.perf_counter() - start
+        self.stdout.write(f"full build: {options['orders']} orders, {len(items)} items, "
+                          f"{matrix.nnz} non-zeros in {build:.2f}s")
+
+        codes, items = baskets(options['update'])
+        start = time.perf_counter()
+        delta = recommendations.cooccurrence(codes, items, products + 1)
+        matrix, ids, values = recommendations.fold_in(matrix, ids, values, delta, k)
+        self.stdout.write(f"incremental: {options['update']} orders folded in {time.perf_counter() - start:.2f}s")
+
+        with tempfile.TemporaryDirectory() as directory:
+            np.save(os.path.join(directory, 'topk_ids.npy'), ids)
+            np.save(os.path.join(directory, 'topk_scores.npy'), values)
+            table = recommendations.NeighbourTable(directory)
+            lookups = rng.integers(1, products + 1, 100_000)
+            start = time.perf_counter()
+            for product_id in lookups:
+                table.similar(int(product_id), 8)
+            per_lookup = (time.perf_counter() - start) / len(lookups) * 1e6
+            del table
+        self.stdout.write(f"lookup: {per_lookup:.1f} us per product (memory-mapped top-{k})")
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from user import snapshot
+
+
+class Command(BaseCommand):
+    help = "Write a new memory-mapped storefront snapshot; running workers switch to it on their next check"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        version, count = snapshot.build()
+        self.stdout.write(self.style.SUCCESS(
+            f"Catalog snapshot v{version} written: {count} products in {time.perf_counter() - start:.2f}s "
+            f"({snapshot.snapshot_path()})"
+        ))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from user import recommendations
+
+
+class Command(BaseCommand):
+    help = "Recompute the frequently-bought-together tables from the whole order history"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        baskets, products = recommendations.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Recommendations rebuilt from {baskets} baskets in {time.perf_counter() - start:.1f}s: "
+            f"{products} products have neighbours"
+        ))
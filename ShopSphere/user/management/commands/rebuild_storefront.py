@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from user import storefront
+
+
+class Command(BaseCommand):
+    help = "Rebuild the storefront product projection from vendor products and vendor profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune-unlinked', action='store_true',
+            help="Also delist storefront rows that are not linked to a vendor product",
+        )
+
+    def handle(self, *args, **options):
+        upserted, delisted = storefront.rebuild(prune_unlinked=options['prune_unlinked'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Storefront rebuilt: {upserted} products listed, {delisted} stale rows delisted"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user import popularity
+
+
+class Command(BaseCommand):
+    help = "Recompute product popularity from the whole order history and the stored product views"
+
+    def handle(self, *args, **options):
+        scored = popularity.rescore()
+        self.stdout.write(self.style.SUCCESS(f"Popularity recomputed for {scored} products"))
@@ -17,9 +17,57 @@ class AuthUser(AbstractUser):
         return f"{self.email} - {self.role}"
 
 
+class ListedProductManager(models.Manager):
+    """Storefront rows that are currently for sale"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_listed=True)
+
+
 class Product(models.Model):
+    """
+    Storefront read model.
+
+    Sellable products (active, unblocked, from approved and unblocked
+    vendors) with the vendor name and stock denormalised, so customer reads
+    never join or filter the vendor moderation columns. Rows linked to a
+    vendor product are maintained by user/signals.py and can be rebuilt with
+    `manage.py rebuild_storefront`.
+
+    A product that stops being sellable keeps its row with ``is_listed``
+    off, so carts, views, flash sales, popularity and recommendations that
+    point at it survive a block/unblock and relisting reuses the same id.
+    ``objects`` only sees listed rows; ``all_objects`` sees every row.
+    """
     name = models.CharField(max_length=200)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    source_product = models.OneToOneField(
+        'vendor.Product', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='storefront_entry'
+    )
+    vendor = models.ForeignKey(
+        'vendor.VendorProfile', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='storefront_products'
+    )
+    vendor_name = models.CharField(max_length=100, blank=True, default='')
+    business_type = models.CharField(max_length=20, blank=True, default='')
+    description = models.TextField(blank=True, default='')
+    stock = models.IntegerField(null=True, blank=True, help_text="None means stock is not tracked")
+    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Indexed for the change checks of the per-process facet and autocomplete indexes
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Log of the forward-decayed sales/views score, see user/popularity.py; 0 = no activity
+    popularity = models.FloatField(default=0)
+    is_listed = models.BooleanField(default=True, db_index=True)
+
+    objects = ListedProductManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        base_manager_name = 'all_objects'
+        indexes = [
+            models.Index(fields=['-popularity', '-id'], name='product_popularity_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -27,6 +75,7 @@ class Product(models.Model):
 
 class Cart(models.Model):
     user = models.OneToOneField(AuthUser, on_delete=models.CASCADE)
+    coupon_code = models.CharField(max_length=30, blank=True, default='')
 
     def __str__(self):
         return f"{self.user.username} Cart"
@@ -40,19 +89,179 @@ class CartItem(models.Model):
     def total_price(self):
         return self.product.price * self.quantity
 
+class Promotion(models.Model):
+    """
+    Discount rule evaluated by user/pricing.py.
+
+    Scope is the most specific target set: a vendor product, a vendor, or
+    neither (whole catalog). A coupon code restricts the rule to carts that
+    applied it; min_quantity turns a rule into a quantity tier. Each cart
+    line gets the single best applicable discount.
+    """
+
+    KIND_CHOICES = (
+        ('percent', 'Percent off'),
+        ('amount', 'Amount off per unit'),
+    )
+
+    name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='percent')
+    value = models.DecimalField(max_digits=10, decimal_places=2, help_text="Percent (12.50) or amount per unit")
+    product = models.ForeignKey(
+        'vendor.Product', on_delete=models.CASCADE, null=True, blank=True, related_name='promotions'
+    )
+    vendor = models.ForeignKey(
+        'vendor.VendorProfile', on_delete=models.CASCADE, null=True, blank=True, related_name='promotions'
+    )
+    coupon_code = models.CharField(max_length=30, blank=True, default='', db_index=True)
+    min_quantity = models.PositiveIntegerField(default=1)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class FlashSale(models.Model):
+    """
+    Puts a storefront product behind the waiting room in user/waiting_room.py:
+    buyers queue for it and are let into add-to-cart/checkout at
+    admit_per_minute.
+    """
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='flash_sale')
+    admit_per_minute = models.PositiveIntegerField(default=120)
+    admission_minutes = models.PositiveIntegerField(default=10, help_text="How long an admitted buyer may shop")
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Flash sale: {self.product}"
+
+
+class Coupon(models.Model):
+    """
+    Redemption limit of a coupon code used by Promotion rules. The counter
+    is split over ``shard_count`` CouponCounterShard rows (see user/coupons.py).
+    """
+
+    code = models.CharField(max_length=30, unique=True)
+    max_redemptions = models.PositiveIntegerField(null=True, blank=True, help_text="Empty means unlimited")
+    shard_count = models.PositiveSmallIntegerField(default=8)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.code
+
+
+class CouponCounterShard(models.Model):
+    """One slice of a coupon's redemption counter; count never exceeds capacity"""
+
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    capacity = models.PositiveIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['coupon', 'shard'], name='coupon_shard_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.coupon_id}#{self.shard}: {self.count}/{self.capacity}"
+
+
+class CouponReservation(models.Model):
+    """A redemption slot held between checkout and payment"""
+
+    STATUS_CHOICES = (
+        ('reserved', 'Reserved'),
+        ('redeemed', 'Redeemed'),
+        ('released', 'Released'),
+    )
+
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='reservations')
+    user = models.ForeignKey(AuthUser, on_delete=models.CASCADE, related_name='coupon_reservations')
+    # None for coupons without a limit
+    shard = models.PositiveSmallIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='reserved')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['coupon', 'status', 'expires_at']),
+            models.Index(fields=['user', 'coupon', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.coupon_id} for {self.user_id} ({self.status})"
+
+
 class Order(models.Model):
+    STATUS_CHOICES = (
+        ('placed', 'Placed'),
+        ('assigned', 'Assigned'),
+        ('picked_up', 'Picked Up'),
+        ('delivered', 'Delivered'),
+    )
+
     user = models.ForeignKey(AuthUser, on_delete=models.CASCADE)
     payment_mode = models.CharField(max_length=50)
     transaction_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
     item_names = models.TextField(default="") # Stores summary/list of item names
     order_date = models.DateTimeField(auto_now_add=True)
+    delivery_address = models.ForeignKey('Address', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='placed')
+    # Orders placed by one payment share it; the basket used for co-purchase recommendations
+    checkout_id = models.UUIDField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return f"Order {self.id} - {self.user.username}"
 
 
+class ProductView(models.Model):
+    """A signed-in customer opened a product; written in batches by user/recently_viewed.py"""
+
+    user = models.ForeignKey(AuthUser, on_delete=models.CASCADE, related_name='product_views')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='views')
+    viewed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-viewed_at']),
+            models.Index(fields=['product', 'viewed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} viewed {self.product_id} at {self.viewed_at}"
+
+
+class OrderEvent(models.Model):
+    """Order status change, pushed to the customer by user/events.py"""
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    # Denormalised from the order so fan-out needs no join
+    user = models.ForeignKey(AuthUser, on_delete=models.CASCADE, related_name='order_events')
+    kind = models.CharField(max_length=20, choices=(('created', 'Created'),) + Order.STATUS_CHOICES[1:])
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id} {self.kind}"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_items')
     product_name = models.CharField(max_length=200)
     quantity = models.IntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -70,4 +279,31 @@ class Address(models.Model):
     state = models.CharField(max_length=100)
 
     def __str__(self):
-        return f"{self.name} - {self.city}"
\ No newline at end of file
+        return f"{self.name} - {self.city}"
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a POST made with an Idempotency-Key header (see user/idempotency.py)"""
+
+    STATE_CHOICES = (
+        ('running', 'Running'),
+        ('done', 'Done'),
+    )
+
+    user = models.ForeignKey(AuthUser, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=64)
+    request_hash = models.CharField(max_length=40)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='running')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Compact JSON body, or the redirect target for HTML form posts
+    body = models.TextField(blank=True, default='')
+    location = models.CharField(max_length=300, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key} ({self.state})"
@@ -0,0 +1,112 @@
+"""
+Time-decayed product popularity kept in an indexed column.
+
+A product's popularity is the sum over its sales and views of
+``weight * 2 ** -(age / HALF_LIFE_DAYS)``. Decaying every row on a schedule
+would rewrite the whole table, so the column stores the score with forward
+decay instead: each event adds ``weight * 2 ** ((t - EPOCH) / half_life)``,
+which ranks products exactly like the decayed score because every row is
+divided by the same factor at any moment. The column holds the logarithm
+of that sum (``np.logaddexp``), so it grows linearly with time and never
+overflows. 0 means no activity; ``current_score`` converts back.
+
+Events arrive in batches: sales through the ORDER_PLACED outbox handler,
+views from the periodic flush in user/recently_viewed.py. Each batch reads
+the affected rows' scores and writes them back with one bulk_update, so
+"sort by popular" is a scan of the (popularity, id) index.
+`manage.py score_popularity` recomputes everything from order history and
+stored ProductView rows.
+"""
+
+import math
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OrderItem, Product, ProductView
+
+DEFAULTS = {
+    'HALF_LIFE_DAYS': 7,
+    'ORDER_WEIGHT': 1.0,
+    'VIEW_WEIGHT': 0.05,
+    'BATCH_SIZE': 500,
+}
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_config():
+    """Return POPULARITY settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'POPULARITY', {}))
+    return config
+
+
+def log_weight(weight, at, config):
+    """log(weight * 2 ** ((at - EPOCH) / half_life)) for weight > 0"""
+    age_days = (at - EPOCH).total_seconds() / 86400
+    return math.log(weight) + age_days / config['HALF_LIFE_DAYS'] * math.log(2)
+
+
+def current_score(popularity, now=None, config=None):
+    """The decayed score a stored popularity stands for at ``now``"""
+    if not popularity:
+        return 0.0
+    config = config or get_config()
+    return math.exp(popularity - log_weight(1.0, now or timezone.now(), config))
+
+
+def apply(events, config=None):
+    """
+    Add ``events`` - {product id: [log weights]} - to the stored scores in
+    one read and one bulk_update per BATCH_SIZE products.
+    """
+    config = config or get_config()
+    product_ids = sorted(events)
+    for start in range(0, len(product_ids), config['BATCH_SIZE']):
+        chunk = product_ids[start:start + config['BATCH_SIZE']]
+        with transaction.atomic():
+            products = list(Product.all_objects.select_for_update().filter(id__in=chunk).only('id', 'popularity'))
+            for product in products:
+                added = float(np.logaddexp.reduce(np.asarray(events[product.id], dtype=np.float64)))
+                product.popularity = float(np.logaddexp(product.popularity, added)) if product.popularity else added
+            Product.all_objects.bulk_update(products, ['popularity'], batch_size=config['BATCH_SIZE'])
+    return len(product_ids)
+
+
+def record_sales(rows, at=None, config=None):
+    """rows: (product id, quantity) pairs sold at ``at``"""
+    config = config or get_config()
+    at = at or timezone.now()
+    events = {}
+    for product_id, quantity in rows:
+        if product_id is not None and quantity > 0:
+            events.setdefault(product_id, []).append(log_weight(config['ORDER_WEIGHT'] * quantity, at, config))
+    return apply(events, config)
+
+
+def record_views(counts, at=None, config=None):
+    """counts: {product id: views} seen at ``at``"""
+    config = config or get_config()
+    at = at or timezone.now()
+    return apply({product_id: [log_weight(config['VIEW_WEIGHT'] * count, at, config)]
+                  for product_id, count in counts.items() if count > 0}, config)
+
+
+def rescore(config=None):
+    """Recompute every score from order history and stored views; returns products scored"""
+    config = config or get_config()
+    events = {}
+    rows = (OrderItem.objects.filter(product__isnull=False, quantity__gt=0)
+            .values_list('product_id', 'quantity', 'order__order_date').iterator(chunk_size=5000))
+    for product_id, quantity, ordered_at in rows:
+        events.setdefault(product_id, []).append(log_weight(config['ORDER_WEIGHT'] * quantity, ordered_at, config))
+    views = ProductView.objects.values_list('product_id', 'viewed_at').iterator(chunk_size=5000)
+    for product_id, viewed_at in views:
+        events.setdefault(product_id, []).append(log_weight(config['VIEW_WEIGHT'], viewed_at, config))
+    with transaction.atomic():
+        Product.all_objects.exclude(popularity=0).update(popularity=0)
+        return apply(events, config)
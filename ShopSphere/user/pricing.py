@@ -0,0 +1,247 @@
+"""
+Cart pricing with compiled promotion rules.
+
+Active Promotion rows are compiled once per process into NumPy columns
+(kind, value, min_quantity, coupon) plus indexes from vendor product id and
+vendor id to rule positions; catalog-wide rules are kept apart. Money is
+fixed-point: prices and amounts in paise (int64), percentages in basis
+points, so totals never drift.
+
+A cart is priced in one pass. Every line gathers its candidate rules from the
+indexes, all (line, rule) pairs are evaluated as arrays, and
+``np.maximum.at`` keeps the best discount per line. Promotion saves and
+deletes bump a cache version so this process recompiles on its next use;
+other processes notice the change through the promotions table's row count
+and latest updated_at (ShopSphere/versions.py), re-read every few seconds.
+The engine also recompiles itself when the next scheduled start or end of a
+rule passes.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from ShopSphere.versions import TableVersion
+from .models import Promotion
+
+
+VERSION_KEY = 'pricing:version'
+KIND_PERCENT, KIND_AMOUNT = 0, 1
+CENTS = Decimal('0.01')
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def to_paise(amount):
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+def from_paise(value):
+    return (Decimal(int(value)) / 100).quantize(CENTS)
+
+
+@dataclass
+class PricedLine:
+    unit_price: Decimal
+    unit_discount: Decimal
+    quantity: int
+    total: Decimal
+    promotion_id: int = None
+
+    @property
+    def discount(self):
+        return self.unit_discount * self.quantity
+
+
+@dataclass
+class CartPricing:
+    lines: list = field(default_factory=list)
+    subtotal: Decimal = Decimal('0.00')
+    discount: Decimal = Decimal('0.00')
+    total: Decimal = Decimal('0.00')
+    coupon: str = ''
+    coupon_valid: bool = False
+
+
+class PricingEngine:
+    """Compiled, immutable view of the promotions active at build time"""
+
+    def __init__(self, rules, now=None):
+        """``rules`` are dicts with the Promotion fields used below (values() rows)"""
+        now = now or timezone.now()
+        live = []
+        next_change = None
+        for rule in rules:
+            starts, ends = rule.get('starts_at'), rule.get('ends_at')
+            for moment in (starts, ends):
+                if moment is not None and moment > now and (next_change is None or moment < next_change):
+                    next_change = moment
+            if (starts is None or starts <= now) and (ends is None or ends > now):
+                live.append(rule)
+        self.next_change = next_change
+
+        self.coupon_ids = {}
+        self.ids = np.array([rule['id'] for rule in live], dtype=np.int64)
+        self.kind = np.array([KIND_AMOUNT if rule['kind'] == 'amount' else KIND_PERCENT for rule in live],
+                             dtype=np.int64)
+        # Basis points for percentages, paise for amounts
+        self.value = np.array([to_paise(rule['value']) for rule in live], dtype=np.int64)
+        self.min_quantity = np.array([max(rule['min_quantity'], 1) for rule in live], dtype=np.int64)
+        self.coupon = np.array([self._coupon_id(rule['coupon_code']) for rule in live], dtype=np.int64)
+
+        by_product, by_vendor, catalog = {}, {}, []
+        for position, rule in enumerate(live):
+            if rule['product_id'] is not None:
+                by_product.setdefault(rule['product_id'], []).append(position)
+            elif rule['vendor_id'] is not None:
+                by_vendor.setdefault(rule['vendor_id'], []).append(position)
+            else:
+                catalog.append(position)
+        self.by_product = {key: np.array(value, dtype=np.int64) for key, value in by_product.items()}
+        self.by_vendor = {key: np.array(value, dtype=np.int64) for key, value in by_vendor.items()}
+        self.catalog = np.array(catalog, dtype=np.int64)
+
+    def _coupon_id(self, code):
+        code = (code or '').strip().upper()
+        if not code:
+            return 0
+        return self.coupon_ids.setdefault(code, len(self.coupon_ids) + 1)
+
+    def is_stale(self, now=None):
+        return self.next_change is not None and (now or timezone.now()) >= self.next_change
+
+    def coupon_exists(self, code):
+        return (code or '').strip().upper() in self.coupon_ids
+
+    def price(self, lines, coupon=''):
+        """
+        ``lines``: sequence of (vendor_product_id, vendor_id, unit_price, quantity).
+        Returns a CartPricing with one PricedLine per input line.
+        """
+        code = (coupon or '').strip().upper()
+        coupon_id = self.coupon_ids.get(code, -1)
+        n = len(lines)
+        price = np.fromiter((to_paise(line[2]) for line in lines), dtype=np.int64, count=n)
+        quantity = np.fromiter((line[3] for line in lines), dtype=np.int64, count=n)
+
+        # Candidate (line, rule) pairs from the indexes
+        line_parts, rule_parts = [], []
+        for position, (product_id, vendor_id, _, _) in enumerate(lines):
+            for candidates in (self.by_product.get(product_id, _EMPTY),
+                               self.by_vendor.get(vendor_id, _EMPTY),
+                               self.catalog):
+                if len(candidates):
+                    rule_parts.append(candidates)
+                    line_parts.append(np.full(len(candidates), position, dtype=np.int64))
+
+        best = np.zeros(n, dtype=np.int64)
+        best_rule = np.full(n, -1, dtype=np.int64)
+        if rule_parts:
+            pair_line = np.concatenate(line_parts)
+            pair_rule = np.concatenate(rule_parts)
+            unit = price[pair_line]
+            value = self.value[pair_rule]
+            discount = np.where(
+                self.kind[pair_rule] == KIND_PERCENT,
+                unit * value // 10000,
+                np.minimum(value, unit),
+            )
+            rule_coupon = self.coupon[pair_rule]
+            eligible = (
+                (quantity[pair_line] >= self.min_quantity[pair_rule])
+                & ((rule_coupon == 0) | (rule_coupon == coupon_id))
+            )
+            discount = np.where(eligible, discount, 0)
+            np.maximum.at(best, pair_line, discount)
+            # Which rule won, for display and audits
+            winners = eligible & (discount == best[pair_line]) & (discount > 0)
+            best_rule[pair_line[winners]] = self.ids[pair_rule[winners]]
+
+        line_totals = (price - best) * quantity
+        result = CartPricing(
+            subtotal=from_paise(int((price * quantity).sum())),
+            discount=from_paise(int((best * quantity).sum())),
+            total=from_paise(int(line_totals.sum())),
+            coupon=code,
+            coupon_valid=bool(code) and coupon_id > 0,
+        )
+        result.lines = [
+            PricedLine(
+                unit_price=from_paise(price[i]),
+                unit_discount=from_paise(best[i]),
+                quantity=int(quantity[i]),
+                total=from_paise(line_totals[i]),
+                promotion_id=int(best_rule[i]) if best_rule[i] >= 0 else None,
+            )
+            for i in range(n)
+        ]
+        return result
+
+
+# ============================================================================
+# PROCESS-WIDE ENGINE
+# ============================================================================
+
+_engine = None
+_engine_version = None
+_engine_lock = threading.Lock()
+_table_version = TableVersion(lambda: Promotion.objects.all())
+
+RULE_FIELDS = ('id', 'kind', 'value', 'product_id', 'vendor_id', 'coupon_code', 'min_quantity',
+               'starts_at', 'ends_at')
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version, _table_version.get()
+
+
+def get_engine():
+    """This process' engine, recompiled when promotions change or a rule window opens/closes"""
+    global _engine, _engine_version
+    version = _current_version()
+    if _engine is None or _engine_version != version or _engine.is_stale():
+        with _engine_lock:
+            if _engine is None or _engine_version != version or _engine.is_stale():
+                now = timezone.now()
+                rules = (Promotion.objects
+                         .filter(is_active=True)
+                         .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+                         .values(*RULE_FIELDS))
+                _engine, _engine_version = PricingEngine(list(rules), now), version
+    return _engine
+
+
+def invalidate():
+    """Make every process recompile on its next pricing call"""
+    global _engine
+    _engine = None
+    _table_version.expire()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
+
+
+def price_cart_items(cart_items, coupon=''):
+    """Price CartItem rows (storefront products) in one pass"""
+    lines = [
+        (item.product.source_product_id, item.product.vendor_id, item.product.price, item.quantity)
+        for item in cart_items
+    ]
+    return get_engine().price(lines, coupon)
+
+
+def price_cart(cart):
+    """Price a Cart's listed items with its applied coupon; one query for the items"""
+    # Items of delisted products stay in the cart and come back when the product is relisted
+    items = list(cart.items.filter(product__is_listed=True).select_related('product'))
+    return items, price_cart_items(items, cart.coupon_code)
@@ -0,0 +1,145 @@
+"""
+Per-customer "recently viewed" list.
+
+Each signed-in customer has a ring of the last RING_SIZE products they
+opened, kept in the cache under ``recently_viewed:<user id>`` as small
+dicts (id, name, price, image, vendor name), most recent first. Opening a
+product moves it to the front; opening the product already at the front
+again (a reload, back-and-forth between tabs) is a no-op, so it neither
+reorders the ring nor counts as another view. The read endpoint returns
+the ring as stored and never touches the database.
+
+Views are not written per request. Each process queues the
+(user, product, time) views, anonymous ones included, in a WriteBuffer
+(ShopSphere/buffers.py), and every FLUSH_INTERVAL seconds or BATCH_SIZE
+views writes the signed-in ones with one ``bulk_create`` and adds the
+per-product counts to product popularity (user/popularity.py) in one
+batch, in one transaction. A failed write keeps the views queued and never
+fails the product page that triggered it. Stored ProductView rows feed
+``manage.py score_popularity`` and, with RECOMMENDATIONS['INCLUDE_VIEWS'],
+the co-occurrence matrix.
+
+Two views of one customer racing in different workers can drop one of them
+from the ring (the last cache write wins); the persisted rows are not
+affected.
+"""
+
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ShopSphere.buffers import WriteBuffer
+from . import popularity
+from .models import Product, ProductView
+
+DEFAULTS = {
+    'RING_SIZE': 20,
+    'RING_TTL': 60 * 60 * 24 * 30,
+    'FLUSH_INTERVAL': 30,
+    'BATCH_SIZE': 1000,
+}
+
+SUMMARY_FIELDS = ('id', 'name', 'price', 'image', 'vendor_name')
+
+
+def get_config():
+    """Return RECENTLY_VIEWED settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'RECENTLY_VIEWED', {}))
+    return config
+
+
+def _key(user_id):
+    return f"recently_viewed:{user_id}"
+
+
+def summary(row):
+    """The part of a ProductSerializer row the ring keeps"""
+    return {field: row.get(field) for field in SUMMARY_FIELDS}
+
+
+# ============================================================================
+# RING
+# ============================================================================
+
+def push(user_id, item, config=None):
+    """
+    Put ``item`` at the front of the customer's ring. Returns False when it
+    was already at the front.
+    """
+    config = config or get_config()
+    ring = cache.get(_key(user_id)) or []
+    if ring and ring[0]['id'] == item['id']:
+        return False
+    ring = [item] + [entry for entry in ring if entry['id'] != item['id']]
+    cache.set(_key(user_id), ring[:config['RING_SIZE']], config['RING_TTL'])
+    return True
+
+
+def recent_for(user_id, limit=None):
+    """The customer's ring, most recent first"""
+    ring = cache.get(_key(user_id)) or []
+    return ring if limit is None else ring[:limit]
+
+
+# ============================================================================
+# VIEW BUFFER
+# ============================================================================
+
+def write_views(views):
+    """
+    Store queued (user id or None, product id, ts) views and add their
+    counts to product popularity, all or nothing
+    """
+    counts = Counter(product_id for _, product_id, _ in views)
+    with transaction.atomic():
+        # Products deleted since they were viewed have nothing to point at
+        listed = set(Product.all_objects.filter(id__in=list(counts)).values_list('id', flat=True))
+        ProductView.objects.bulk_create(
+            [
+                ProductView(
+                    user_id=user_id,
+                    product_id=product_id,
+                    viewed_at=datetime.fromtimestamp(ts, tz=dt_timezone.utc),
+                )
+                for user_id, product_id, ts in views
+                if user_id is not None and product_id in listed
+            ],
+            batch_size=get_config()['BATCH_SIZE'],
+        )
+        popularity.record_views({product_id: counts[product_id] for product_id in listed})
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Process-wide WriteBuffer of unsaved views"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = get_config()
+                _buffer = WriteBuffer(write_views, config['BATCH_SIZE'], config['FLUSH_INTERVAL'],
+                                      label='product views', atexit=True)
+    return _buffer
+
+
+def record(product_row, user=None):
+    """
+    A product page was opened. ``product_row`` is its ProductSerializer
+    row; ``user`` the viewer, None or anonymous for guests, whose views
+    only count towards popularity.
+    """
+    user_id = None
+    if user is not None and user.is_authenticated:
+        if not push(user.pk, summary(product_row)):
+            return
+        user_id = user.pk
+    get_buffer().add((user_id, product_row['id'], time.time()))
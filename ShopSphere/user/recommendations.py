@@ -0,0 +1,322 @@
+"""
+"Frequently bought together" from a sparse co-purchase matrix.
+
+A basket is every item of one checkout (orders sharing ``checkout_id``).
+With B the binary basket x product incidence matrix, C = B.T @ B holds
+co-purchase counts off the diagonal and product frequencies on it. Each
+product's neighbours are ranked by cosine similarity
+C[i, j] / sqrt(C[i, i] * C[j, j]) and the top K are kept.
+
+Everything lives in RECOMMENDATIONS['DIRECTORY']:
+
+* ``cooccurrence.npz`` - C as CSR (int32), the state incremental updates add to;
+* ``topk_ids.npy`` / ``topk_scores.npy`` - (max product id + 1, K) arrays
+  indexed by storefront product id, read through a memory map, so a
+  lookup is one row read whatever the catalog size;
+* ``meta.json`` - last order folded in by a full build and the recently
+  applied outbox event ids.
+
+``rebuild`` recomputes from all OrderItem rows (`manage.py
+build_recommendations`); with INCLUDE_VIEWS each customer's ProductView
+rows of one day count as one more basket. New checkouts arrive through the ORDER_PLACED
+outbox handler: their baskets are added to C and only the rows whose
+scores changed are re-ranked. Writers serialise on a lock file; files are
+swapped with os.replace and readers reopen them when they change.
+"""
+
+import fcntl
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from .models import OrderItem, ProductView
+
+
+DEFAULTS = {
+    'DIRECTORY': 'var/recommendations',
+    'TOP_K': 20,
+    'MIN_COUNT': 1,
+    'RELOAD_CHECK': 5,
+    'APPLIED_EVENTS': 10000,
+    'INCLUDE_VIEWS': False,
+}
+
+
+def get_config():
+    """Return RECOMMENDATIONS settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'RECOMMENDATIONS', {}))
+    return config
+
+
+# ============================================================================
+# MATRIX MATH (pure NumPy/SciPy)
+# ============================================================================
+
+def cooccurrence(basket_codes, product_ids, size):
+    """
+    C = B.T @ B for parallel arrays of basket codes (0..n-1) and product ids
+    (< size). A product bought twice in one basket counts once.
+    """
+    basket_codes = np.asarray(basket_codes, dtype=np.int64)
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    baskets = int(basket_codes.max()) + 1 if len(basket_codes) else 0
+    incidence = sparse.csr_matrix(
+        (np.ones(len(product_ids), dtype=np.int32), (basket_codes, product_ids)), shape=(baskets, size))
+    incidence.sum_duplicates()
+    incidence.data[:] = 1
+    return (incidence.T @ incidence).tocsr().astype(np.int32)
+
+
+def score_rows(matrix, rows, min_count=1):
+    """Cosine scores of ``rows`` against every product, self pairs and rare pairs dropped"""
+    rows = np.asarray(rows, dtype=np.int64)
+    frequency = matrix.diagonal().astype(np.float64)
+    block = matrix[rows].tocoo()
+    keep = (block.col != rows[block.row]) & (block.data >= min_count)
+    row, col, count = block.row[keep], block.col[keep], block.data[keep]
+    denominator = np.sqrt(frequency[rows[row]] * frequency[col])
+    score = (count / np.maximum(denominator, 1)).astype(np.float32)
+    return sparse.csr_matrix((score, (row, col)), shape=(len(rows), matrix.shape[1]))
+
+
+def top_k(scores, k):
+    """Best ``k`` columns per row of a CSR matrix: (ids int32, scores float32), 0-padded"""
+    scores = scores.tocsr()
+    n = scores.shape[0]
+    ids = np.zeros((n, k), dtype=np.int32)
+    values = np.zeros((n, k), dtype=np.float32)
+    if scores.nnz == 0:
+        return ids, values
+    rows = np.repeat(np.arange(n), np.diff(scores.indptr))
+    # Row first, then best score, then lowest id for stable ties
+    order = np.lexsort((scores.indices, -scores.data, rows))
+    rank = np.arange(len(order)) - scores.indptr[rows[order]]
+    keep = rank < k
+    chosen, rank = order[keep], rank[keep]
+    ids[rows[chosen], rank] = scores.indices[chosen]
+    values[rows[chosen], rank] = scores.data[chosen]
+    return ids, values
+
+
+def _grow(array, rows):
+    if array.shape[0] >= rows:
+        return array
+    grown = np.zeros((rows,) + array.shape[1:], dtype=array.dtype)
+    grown[:array.shape[0]] = array
+    return grown
+
+
+def fold_in(matrix, ids, values, delta, k, min_count=1):
+    """Add ``delta`` to the matrix and re-rank only the rows it affects"""
+    size = max(matrix.shape[0], delta.shape[0])
+    matrix = matrix.copy()
+    matrix.resize((size, size))
+    delta = delta.copy()
+    delta.resize((size, size))
+    matrix = (matrix + delta).tocsr()
+    ids, values = _grow(ids, size), _grow(values, size)
+
+    touched = np.unique(delta.tocoo().row)
+    if len(touched):
+        # A touched product's frequency rescales its neighbours' scores too
+        affected = np.union1d(touched, matrix[touched].indices)
+        ids[affected], values[affected] = top_k(score_rows(matrix, affected, min_count), k)
+    return matrix, ids, values
+
+
+# ============================================================================
+# STORAGE
+# ============================================================================
+
+FILES = ('cooccurrence.npz', 'topk_ids.npy', 'topk_scores.npy', 'meta.json')
+
+
+def _directory(config):
+    return os.path.join(settings.BASE_DIR, config['DIRECTORY'])
+
+
+@contextmanager
+def _writer_lock(directory):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'w') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _load_state(directory):
+    try:
+        matrix = sparse.load_npz(os.path.join(directory, 'cooccurrence.npz')).tocsr()
+        ids = np.load(os.path.join(directory, 'topk_ids.npy'))
+        values = np.load(os.path.join(directory, 'topk_scores.npy'))
+        with open(os.path.join(directory, 'meta.json')) as fh:
+            meta = json.load(fh)
+    except FileNotFoundError:
+        return None
+    return matrix, ids, values, meta
+
+
+def _save_state(directory, matrix, ids, values, meta):
+    tmp = {name: os.path.join(directory, f".{name}.tmp") for name in FILES}
+    # File objects keep numpy from appending its own extension to the temp names
+    with open(tmp['cooccurrence.npz'], 'wb') as fh:
+        sparse.save_npz(fh, matrix)
+    with open(tmp['topk_ids.npy'], 'wb') as fh:
+        np.save(fh, ids)
+    with open(tmp['topk_scores.npy'], 'wb') as fh:
+        np.save(fh, values)
+    with open(tmp['meta.json'], 'w') as fh:
+        json.dump(meta, fh)
+    # The id table goes last: readers reopen when its mtime changes
+    for name in ('cooccurrence.npz', 'meta.json', 'topk_scores.npy', 'topk_ids.npy'):
+        os.replace(tmp[name], os.path.join(directory, name))
+
+
+def _basket_rows(items):
+    """(checkout_id, order_id, product_id) rows -> basket codes and product ids"""
+    baskets, codes, products = {}, [], []
+    for checkout_id, order_id, product_id in items:
+        key = checkout_id or order_id
+        codes.append(baskets.setdefault(key, len(baskets)))
+        products.append(product_id)
+    return np.array(codes, dtype=np.int64), np.array(products, dtype=np.int64)
+
+
+def _view_rows():
+    """ProductView rows as (basket key, None, product id), one basket per customer and day"""
+    views = (ProductView.objects.order_by()
+             .values_list('user_id', 'viewed_at__date', 'product_id')
+             .distinct()
+             .iterator(chunk_size=5000))
+    for user_id, day, product_id in views:
+        yield ('viewed', user_id, day), None, product_id
+
+
+def rebuild(config=None):
+    """Recompute everything from the order history; returns (baskets, products with neighbours)"""
+    config = config or get_config()
+    directory = _directory(config)
+    with _writer_lock(directory):
+        last_order = OrderItem.objects.order_by('-order_id').values_list('order_id', flat=True).first() or 0
+        items = (OrderItem.objects
+                 .filter(product__isnull=False, order_id__lte=last_order)
+                 .values_list('order__checkout_id', 'order_id', 'product_id')
+                 .iterator(chunk_size=5000))
+        if config['INCLUDE_VIEWS']:
+            items = itertools.chain(items, _view_rows())
+        codes, products = _basket_rows(items)
+        size = int(products.max()) + 1 if len(products) else 1
+        matrix = cooccurrence(codes, products, size)
+        ids, values = top_k(score_rows(matrix, np.arange(size), config['MIN_COUNT']), config['TOP_K'])
+        _save_state(directory, matrix, ids, values, {'built_through_order': last_order, 'applied_events': []})
+    return (int(codes.max()) + 1 if len(codes) else 0), int((ids[:, 0] > 0).sum())
+
+
+def apply_events(batch, config=None):
+    """Fold ORDER_PLACED events into the matrix; events already counted are skipped"""
+    config = config or get_config()
+    directory = _directory(config)
+    with _writer_lock(directory):
+        state = _load_state(directory)
+        if state is None:
+            matrix = sparse.csr_matrix((1, 1), dtype=np.int32)
+            ids = np.zeros((1, config['TOP_K']), dtype=np.int32)
+            values = np.zeros((1, config['TOP_K']), dtype=np.float32)
+            meta = {'built_through_order': 0, 'applied_events': []}
+        else:
+            matrix, ids, values, meta = state
+
+        applied = set(meta['applied_events'])
+        events = [
+            event for event in batch
+            if event.id not in applied and max(event.payload['order_ids'], default=0) > meta['built_through_order']
+        ]
+        if not events:
+            return 0
+        basket_of = {order_id: event.id for event in events for order_id in event.payload['order_ids']}
+        items = OrderItem.objects.filter(order_id__in=list(basket_of), product__isnull=False).values_list(
+            'order_id', 'product_id')
+        codes, products = _basket_rows((basket_of[order_id], order_id, product_id) for order_id, product_id in items)
+        if len(products):
+            delta = cooccurrence(codes, products, int(products.max()) + 1)
+            matrix, ids, values = fold_in(matrix, ids, values, delta, ids.shape[1], config['MIN_COUNT'])
+
+        meta['applied_events'] = (meta['applied_events'] + [event.id for event in events])[-config['APPLIED_EVENTS']:]
+        _save_state(directory, matrix, ids, values, meta)
+    return len(events)
+
+
+# ============================================================================
+# SERVING
+# ============================================================================
+
+class NeighbourTable:
+    """Memory-mapped top-K arrays of one build"""
+
+    def __init__(self, directory):
+        path = os.path.join(directory, 'topk_ids.npy')
+        self.stamp = os.stat(path).st_mtime_ns
+        self.ids = np.load(path, mmap_mode='r')
+        self.scores = np.load(os.path.join(directory, 'topk_scores.npy'), mmap_mode='r')
+
+    def similar(self, product_id, k):
+        """[(product id, score)] best first; O(1) row read"""
+        if not 0 < product_id < self.ids.shape[0]:
+            return []
+        ids, scores = self.ids[product_id, :k], self.scores[product_id, :k]
+        return [(int(i), float(s)) for i, s in zip(ids, scores) if i]
+
+    def for_basket(self, product_ids, k):
+        """Neighbours of several products, scores summed, the products themselves left out"""
+        combined = {}
+        for product_id in product_ids:
+            for neighbour, score in self.similar(product_id, self.ids.shape[1]):
+                combined[neighbour] = combined.get(neighbour, 0.0) + score
+        for product_id in product_ids:
+            combined.pop(product_id, None)
+        return sorted(combined.items(), key=lambda pair: (-pair[1], pair[0]))[:k]
+
+
+_table = None
+_checked_at = 0.0
+_table_lock = threading.Lock()
+
+
+def get_table():
+    """This process' table, reopened when a writer swaps the files; None before the first build"""
+    global _table, _checked_at
+    config = get_config()
+    now = time.monotonic()
+    if _table is not None and now - _checked_at < config['RELOAD_CHECK']:
+        return _table
+    with _table_lock:
+        _checked_at = now
+        directory = _directory(config)
+        try:
+            stamp = os.stat(os.path.join(directory, 'topk_ids.npy')).st_mtime_ns
+        except FileNotFoundError:
+            _table = None
+            return None
+        if _table is None or _table.stamp != stamp:
+            _table = NeighbourTable(directory)
+    return _table
+
+
+def similar_ids(product_id, k=None):
+    table = get_table()
+    return [] if table is None else [pid for pid, _ in table.similar(product_id, k or get_config()['TOP_K'])]
+
+
+def basket_ids(product_ids, k=None):
+    table = get_table()
+    return [] if table is None else [pid for pid, _ in table.for_basket(product_ids, k or get_config()['TOP_K'])]
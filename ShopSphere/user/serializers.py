@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import AuthUser, Product, Cart, CartItem, Order, OrderItem
+from . import pricing
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -15,7 +16,8 @@ class RegisterSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = '__all__'
+        # Customer-facing columns only: listing state, ranking score and the vendor-side link stay internal
+        fields = ['id', 'name', 'price', 'vendor', 'vendor_name', 'business_type', 'description', 'stock', 'image']
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -29,28 +31,55 @@ class OrderSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Order
-        fields = ['id', 'user', 'payment_mode', 'transaction_id', 'item_names', 'order_date', 'items']
+        fields = ['id', 'user', 'payment_mode', 'transaction_id', 'item_names', 'order_date', 'status', 'items']
 
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
+    unit_discount = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
 
     class Meta:
         model = CartItem
-        fields = ['id', 'product', 'quantity', 'total_price']
+        fields = ['id', 'product', 'quantity', 'unit_discount', 'total_price']
+
+    def _line(self, obj):
+        return self.context.get('priced_lines', {}).get(obj.id)
+
+    def get_unit_discount(self, obj):
+        line = self._line(obj)
+        return line.unit_discount if line else 0
 
     def get_total_price(self, obj):
-        return obj.total_price()
+        line = self._line(obj)
+        return line.total if line else obj.total_price()
 
 
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+    """Cart priced by user/pricing.py in a single pass"""
+    items = serializers.SerializerMethodField()
+    subtotal = serializers.SerializerMethodField()
+    discount = serializers.SerializerMethodField()
     total_cart_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'items', 'total_cart_price']
+        fields = ['id', 'user', 'coupon_code', 'items', 'subtotal', 'discount', 'total_cart_price']
+
+    def to_representation(self, instance):
+        self._priced = pricing.price_cart(instance)
+        return super().to_representation(instance)
+
+    def get_items(self, obj):
+        items, priced = self._priced
+        context = dict(self.context, priced_lines={item.id: line for item, line in zip(items, priced.lines)})
+        return CartItemSerializer(items, many=True, context=context).data
+
+    def get_subtotal(self, obj):
+        return self._priced[1].subtotal
+
+    def get_discount(self, obj):
+        return self._priced[1].discount
 
     def get_total_cart_price(self, obj):
-        return sum(item.total_price() for item in obj.items.all())
\ No newline at end of file
+        return self._priced[1].total
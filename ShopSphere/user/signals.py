@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ShopSphere import fragments
+from vendor.models import Product as VendorProduct, VendorProfile
+from .models import Coupon, FlashSale, Product, Promotion
+from . import coupons, pricing, storefront, waiting_room
+
+
+# ============================================================================
+# STOREFRONT PROJECTION - keep user.Product in step with vendor product edits
+# (vendor-level changes arrive through the outbox, see user/handlers.py)
+# ============================================================================
+
+@receiver(post_save, sender=VendorProduct)
+def sync_storefront_product(sender, instance, raw=False, **kwargs):
+    """Product edits, status changes and blocks"""
+    if raw:
+        return
+    storefront.sync_product(instance)
+
+
+# ============================================================================
+# PRICING - recompile promotion rules in every process after a change
+# ============================================================================
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def invalidate_pricing(sender, **kwargs):
+    transaction.on_commit(pricing.invalidate)
+
+
+# ============================================================================
+# COUPONS - split a coupon's redemption limit over its counter shards
+# ============================================================================
+
+@receiver(post_save, sender=Coupon)
+def configure_coupon_shards(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    coupons.configure(instance)
+
+
+# ============================================================================
+# FLASH SALES - reload the waiting-room sale table in every process
+# ============================================================================
+
+@receiver(post_save, sender=FlashSale)
+@receiver(post_delete, sender=FlashSale)
+def invalidate_flash_sales(sender, **kwargs):
+    transaction.on_commit(waiting_room.invalidate)
+
+
+# ============================================================================
+# TEMPLATE FRAGMENTS - drop cached rows whose change kept updated_at
+# (saves that bump updated_at get a new key anyway, see ShopSphere/fragments.py)
+# ============================================================================
+
+FRAGMENTS = {
+    Product: fragments.PRODUCT_CARD,
+    VendorProduct: fragments.VENDOR_PRODUCT_CARD,
+    VendorProfile: fragments.VENDOR_ROW,
+}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=VendorProduct)
+@receiver(post_delete, sender=VendorProduct)
+@receiver(post_save, sender=VendorProfile)
+@receiver(post_delete, sender=VendorProfile)
+def invalidate_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.invalidate(FRAGMENTS[sender], instance)
@@ -0,0 +1,265 @@
+"""
+Memory-mapped storefront snapshot shared by all worker processes.
+
+The builder writes the storefront product list into one binary file:
+
+    header   magic, version, product count, build time, JSON length
+    ids      int64[count], ascending
+    price    int64[count], paise
+    vendor   int64[count], 0 for none
+    stock    int32[count], -1 when stock is not tracked
+    offsets  uint64[count + 1], row boundaries inside the JSON blob
+    json     the ``home`` API response body: one JSON array whose elements
+             are the ProductSerializer rows, in id order
+
+Workers map the file read-only and never parse it: ``home_api`` returns the
+JSON blob as is, a product lookup is a ``searchsorted`` on the id column
+plus a slice of the blob, and the numeric columns are NumPy views on the
+mapping. The pages live once in the OS page cache however many workers
+there are.
+
+Storefront changes schedule a rebuild. Changes are debounced, so a burst
+costs one rebuild, which then runs in a background thread. A rebuild still
+pending when the process exits (a management command such as
+`dispatch_outbox --once` ending within REBUILD_DELAY) runs at exit instead of
+dying with its daemon thread. The new file is
+written next to the old one and swapped in with os.replace. Workers check
+the file's identity at most every RELOAD_CHECK seconds and remap it, while
+requests already running keep the old mapping until they finish.
+"""
+
+import atexit
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.utils.encoders import JSONEncoder
+
+from ShopSphere.projections import ValuesProjection
+from .models import Product
+from .serializers import ProductSerializer
+
+
+logger = logging.getLogger('shopsphere.snapshot')
+
+DEFAULTS = {
+    'PATH': 'var/catalog/catalog.snap',
+    'RELOAD_CHECK': 1,
+    'REBUILD_DELAY': 1,
+}
+
+MAGIC = b'SSCATLG1'
+HEADER = struct.Struct('<8sQQdQ')
+HEADER_SIZE = 64
+
+
+def get_config():
+    """Return CATALOG_SNAPSHOT settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'CATALOG_SNAPSHOT', {}))
+    return config
+
+
+def snapshot_path(config=None):
+    return os.path.join(settings.BASE_DIR, (config or get_config())['PATH'])
+
+
+def _layout(count):
+    """Byte offsets of every section for ``count`` products"""
+    offsets = {'ids': HEADER_SIZE}
+    offsets['price'] = offsets['ids'] + 8 * count
+    offsets['vendor'] = offsets['price'] + 8 * count
+    offsets['stock'] = offsets['vendor'] + 8 * count
+    offsets['offsets'] = offsets['stock'] + 4 * count + (4 * count) % 8
+    offsets['json'] = offsets['offsets'] + 8 * (count + 1)
+    return offsets
+
+
+# ============================================================================
+# BUILDER
+# ============================================================================
+
+@contextmanager
+def _writer_lock(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", 'w') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _previous_version(path):
+    try:
+        with open(path, 'rb') as fh:
+            magic, version, *_ = HEADER.unpack(fh.read(HEADER.size))
+    except (FileNotFoundError, struct.error):
+        return 0
+    return version if magic == MAGIC else 0
+
+
+def build(config=None):
+    """Write a new snapshot from the storefront table; returns (version, product count)"""
+    config = config or get_config()
+    path = snapshot_path(config)
+    with _writer_lock(path):
+        rows = ValuesProjection(ProductSerializer).serialize(Product.objects.order_by('id'))
+        count = len(rows)
+
+        blobs = [json.dumps(row, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+                 for row in rows]
+        # '[' + rows joined by ',' + ']': row i spans offsets[i] .. offsets[i + 1] - 1
+        offsets = np.zeros(count + 1, dtype=np.uint64)
+        position = 1
+        for index, blob in enumerate(blobs):
+            offsets[index] = position
+            position += len(blob) + 1
+        offsets[count] = position
+        body = b'[' + b','.join(blobs) + b']'
+
+        ids = np.array([row['id'] for row in rows], dtype=np.int64)
+        price = np.array([int(Decimal(row['price']) * 100) for row in rows], dtype=np.int64)
+        vendor = np.array([row['vendor'] or 0 for row in rows], dtype=np.int64)
+        stock = np.array([-1 if row['stock'] is None else row['stock'] for row in rows], dtype=np.int32)
+
+        version = _previous_version(path) + 1
+        layout = _layout(count)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as fh:
+            fh.write(HEADER.pack(MAGIC, version, count, time.time(), len(body)).ljust(HEADER_SIZE, b'\0'))
+            for name, column in (('ids', ids), ('price', price), ('vendor', vendor), ('stock', stock),
+                                 ('offsets', offsets)):
+                fh.seek(layout[name])
+                fh.write(column.tobytes())
+            fh.seek(layout['json'])
+            fh.write(body)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+    return version, count
+
+
+_rebuild_timer = None
+_last_timer = None
+_rebuild_pending = False
+_rebuild_guard = threading.Lock()
+
+
+def _rebuild_in_background():
+    global _rebuild_timer, _rebuild_pending
+    with _rebuild_guard:
+        _rebuild_timer = None
+        _rebuild_pending = False
+    try:
+        build()
+    except Exception:
+        logger.exception("Catalog snapshot rebuild failed")
+    finally:
+        close_old_connections()
+
+
+def schedule_rebuild():
+    """Rebuild after REBUILD_DELAY seconds, folding any further changes into the same run"""
+    global _rebuild_timer, _last_timer, _rebuild_pending
+    with _rebuild_guard:
+        if _rebuild_timer is not None:
+            return
+        _rebuild_pending = True
+        _rebuild_timer = _last_timer = threading.Timer(get_config()['REBUILD_DELAY'], _rebuild_in_background)
+        _rebuild_timer.daemon = True
+        _rebuild_timer.start()
+
+
+@atexit.register
+def flush_pending_rebuild():
+    """Run a scheduled rebuild now, or wait for the one in progress; called at interpreter exit"""
+    global _rebuild_timer
+    with _rebuild_guard:
+        timer, _rebuild_timer = _last_timer, None
+    if timer is None:
+        return
+    timer.cancel()
+    timer.join()
+    if _rebuild_pending:
+        _rebuild_in_background()
+
+
+# ============================================================================
+# READER
+# ============================================================================
+
+class CatalogSnapshot:
+    """Read-only view of one snapshot file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            stat = os.fstat(fh.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns)
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, count, self.built_at, json_length = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        layout = _layout(count)
+        self.count = count
+        self.ids = np.frombuffer(self._map, dtype=np.int64, count=count, offset=layout['ids'])
+        self.price = np.frombuffer(self._map, dtype=np.int64, count=count, offset=layout['price'])
+        self.vendor = np.frombuffer(self._map, dtype=np.int64, count=count, offset=layout['vendor'])
+        self.stock = np.frombuffer(self._map, dtype=np.int32, count=count, offset=layout['stock'])
+        self.offsets = np.frombuffer(self._map, dtype=np.uint64, count=count + 1, offset=layout['offsets'])
+        self._json = memoryview(self._map)[layout['json']:layout['json'] + json_length]
+
+    def home_json(self):
+        """The whole product list as a JSON array; a read-only view of the mapping"""
+        return self._json
+
+    def position(self, product_id):
+        index = int(np.searchsorted(self.ids, product_id))
+        if index < self.count and self.ids[index] == product_id:
+            return index
+        return None
+
+    def product_json(self, product_id):
+        """One product's JSON object, or None"""
+        index = self.position(product_id)
+        if index is None:
+            return None
+        return self._json[int(self.offsets[index]):int(self.offsets[index + 1]) - 1]
+
+
+_snapshot = None
+_checked_at = 0.0
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """This process' mapping of the current snapshot file, or None when there is none"""
+    global _snapshot, _checked_at
+    config = get_config()
+    now = time.monotonic()
+    if _snapshot is not None and now - _checked_at < config['RELOAD_CHECK']:
+        return _snapshot
+    with _snapshot_lock:
+        _checked_at = now
+        path = snapshot_path(config)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            _snapshot = None
+            return None
+        if _snapshot is None or _snapshot.identity != (stat.st_ino, stat.st_mtime_ns):
+            try:
+                _snapshot = CatalogSnapshot(path)
+            except (OSError, ValueError, struct.error):
+                logger.exception("Could not map catalog snapshot %s", path)
+    return _snapshot
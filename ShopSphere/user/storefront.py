@@ -0,0 +1,123 @@
+"""
+Maintenance of the storefront read model (user.models.Product).
+
+``sync_product`` / ``sync_vendor`` apply one vendor-side change
+incrementally and are called from user/signals.py; ``rebuild`` recomputes
+the whole projection and is used by `manage.py rebuild_storefront`.
+
+Rows are never deleted here: a product that stops being sellable is
+delisted (``is_listed`` off) and upserting it again relists the same row.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from vendor.models import Product as VendorProduct
+from .models import Product
+from . import autocomplete, facets, snapshot
+
+
+SYNCED_FIELDS = [
+    'name', 'price', 'vendor', 'vendor_name', 'business_type', 'description', 'stock', 'image', 'updated_at',
+    'is_listed',
+]
+
+
+def vendor_is_listable(vendor):
+    """Approved vendors that are not blocked can sell"""
+    return vendor.approval_status == 'approved' and not vendor.is_blocked
+
+
+def product_is_listable(product, vendor):
+    """Active, unblocked products of a listable vendor are sellable"""
+    return product.status == 'active' and not product.is_blocked and vendor_is_listable(vendor)
+
+
+def listable_products():
+    """Vendor products that belong in the storefront"""
+    return (VendorProduct.objects
+            .filter(status='active', is_blocked=False,
+                    vendor__approval_status='approved', vendor__is_blocked=False)
+            .select_related('vendor'))
+
+
+def _entry_for(product, vendor):
+    return Product(
+        source_product=product,
+        name=product.name,
+        price=product.price,
+        vendor=vendor,
+        vendor_name=vendor.shop_name,
+        business_type=vendor.business_type,
+        description=product.description,
+        stock=product.quantity,
+        image=product.image.name if product.image else None,
+        updated_at=timezone.now(),
+        is_listed=True,
+    )
+
+
+def _upsert(entries, notify=True):
+    Product.all_objects.bulk_create(
+        entries,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['source_product'],
+        update_fields=SYNCED_FIELDS,
+    )
+    if not notify:
+        return
+    source_ids = [entry.source_product_id for entry in entries]
+    changed = list(Product.objects.filter(source_product__in=source_ids).values_list('id', flat=True))
+    transaction.on_commit(lambda: facets.products_changed(changed))
+    transaction.on_commit(lambda: autocomplete.products_changed(changed))
+    transaction.on_commit(snapshot.schedule_rebuild)
+
+
+def _delist(queryset):
+    removed = list(queryset.values_list('id', flat=True))
+    if removed:
+        Product.all_objects.filter(id__in=removed).update(is_listed=False, updated_at=timezone.now())
+        transaction.on_commit(lambda: facets.products_removed(removed))
+        transaction.on_commit(lambda: autocomplete.products_changed(removed))
+        transaction.on_commit(snapshot.schedule_rebuild)
+
+
+def sync_product(product):
+    """Insert, refresh and relist, or delist the storefront row of one vendor product"""
+    vendor = product.vendor
+    if product_is_listable(product, vendor):
+        _upsert([_entry_for(product, vendor)])
+    else:
+        _delist(Product.objects.filter(source_product=product))
+
+
+def sync_vendor(vendor):
+    """Re-evaluate every product of a vendor after a vendor-level change"""
+    if not vendor_is_listable(vendor):
+        _delist(Product.objects.filter(vendor=vendor))
+        return
+
+    with transaction.atomic():
+        sellable = list(vendor.products.filter(status='active', is_blocked=False))
+        _delist(Product.objects.filter(vendor=vendor).exclude(source_product__in=sellable))
+        if sellable:
+            _upsert([_entry_for(product, vendor) for product in sellable])
+
+
+def rebuild(prune_unlinked=False):
+    """Recompute the storefront from vendor data; returns (upserted, delisted)"""
+    with transaction.atomic():
+        entries = [_entry_for(product, product.vendor) for product in listable_products().iterator()]
+        stale = Product.objects.filter(source_product__isnull=False).exclude(
+            source_product__in=listable_products().values('id')
+        )
+        if prune_unlinked:
+            stale = stale | Product.objects.filter(source_product__isnull=True)
+        delisted = stale.update(is_listed=False, updated_at=timezone.now())
+        if entries:
+            _upsert(entries, notify=False)
+        transaction.on_commit(facets.invalidate)
+        transaction.on_commit(autocomplete.invalidate)
+        transaction.on_commit(snapshot.build)
+    return len(entries), delisted
@@ -1,3 +1,683 @@
-from django.test import TestCase
+import random
+from decimal import ROUND_FLOOR, Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from ShopSphere import fragments
+from ShopSphere.buffers import WriteBuffer
+from ShopSphere.projections import ValuesProjection
+from vendor.models import Product as VendorProduct, VendorProfile
+from . import (
+    autocomplete, checks, coupons, facets, idempotency, popularity, pricing, recently_viewed, snapshot, storefront,
+    waiting_room,
+)
+from .models import (
+    AuthUser, Cart, CartItem, Coupon, CouponReservation, FlashSale, IdempotencyKey, Product, ProductView, Promotion,
+)
+from .serializers import ProductSerializer
+
+
+def make_vendor(username='vendor', **fields):
+    user = User.objects.create_user(username, password='x')
+    fields.setdefault('approval_status', 'approved')
+    fields.setdefault('business_type', 'retail')
+    return VendorProfile.objects.create(
+        user=user, shop_name=f"{username} shop", shop_description='-', address='-', **fields)
+
+
+def make_vendor_product(vendor, name='Lamp', price='100.00', **fields):
+    return VendorProduct.objects.create(
+        vendor=vendor, name=name, description='-', price=Decimal(price), quantity=10, **fields)
+
+
+def make_customer(email='customer@example.com'):
+    return AuthUser.objects.create_user(username=email.split('@')[0], email=email, password='x')
+
+
+class StorefrontSyncTests(TestCase):
+    def setUp(self):
+        self.vendor = make_vendor()
+        self.vendor_product = make_vendor_product(self.vendor)
+        self.customer = make_customer()
+
+    def test_listable_product_is_projected(self):
+        entry = Product.objects.get(source_product=self.vendor_product)
+        self.assertEqual((entry.name, entry.vendor_name, entry.stock), ('Lamp', 'vendor shop', 10))
+
+    def test_customer_rows_leave_out_internal_columns(self):
+        entry = Product.objects.get(source_product=self.vendor_product)
+        projected = ValuesProjection(ProductSerializer).serialize(Product.objects.filter(id=entry.id))
+        for row in (ProductSerializer(entry).data, projected[0]):
+            self.assertFalse({'popularity', 'is_listed', 'source_product', 'updated_at'} & set(row))
+
+    def test_block_and_unblock_keep_the_row_and_its_references(self):
+        entry = Product.objects.get(source_product=self.vendor_product)
+        cart = Cart.objects.create(user=self.customer)
+        CartItem.objects.create(cart=cart, product=entry)
+        ProductView.objects.create(user=self.customer, product=entry, viewed_at=timezone.now())
+
+        self.vendor_product.is_blocked = True
+        self.vendor_product.save()
+        self.assertFalse(Product.objects.filter(id=entry.id).exists())
+        self.assertFalse(Product.all_objects.get(id=entry.id).is_listed)
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 1)
+        self.assertEqual(ProductView.objects.filter(product_id=entry.id).count(), 1)
+        items, priced = pricing.price_cart(cart)
+        self.assertEqual((items, priced.total), ([], Decimal('0.00')))
+
+        self.vendor_product.is_blocked = False
+        self.vendor_product.save()
+        self.assertEqual(Product.objects.get(source_product=self.vendor_product).id, entry.id)
+        items, _ = pricing.price_cart(cart)
+        self.assertEqual([item.product_id for item in items], [entry.id])
+
+    def test_vendor_block_delists_and_unblock_relists_same_ids(self):
+        other = make_vendor_product(self.vendor, name='Chair')
+        ids = set(Product.objects.filter(vendor=self.vendor).values_list('id', flat=True))
+        self.assertEqual(len(ids), 2)
+
+        self.vendor.is_blocked = True
+        self.vendor.save()
+        storefront.sync_vendor(self.vendor)
+        self.assertFalse(Product.objects.filter(vendor=self.vendor).exists())
+        self.assertEqual(Product.all_objects.filter(vendor=self.vendor).count(), 2)
+
+        self.vendor.is_blocked = False
+        self.vendor.save()
+        other.status = 'inactive'
+        other.save()
+        storefront.sync_vendor(self.vendor)
+        listed = set(Product.objects.filter(vendor=self.vendor).values_list('id', flat=True))
+        self.assertEqual(listed, ids - {other.storefront_entry.id})
+
+    def test_rebuild_delists_instead_of_deleting(self):
+        entry = Product.objects.get(source_product=self.vendor_product)
+        unlinked = Product.objects.create(name='Legacy', price=Decimal('1.00'))
+        VendorProduct.objects.filter(id=self.vendor_product.id).update(status='inactive')
+
+        self.assertEqual(storefront.rebuild(prune_unlinked=True), (0, 2))
+        self.assertEqual(set(Product.all_objects.filter(is_listed=False).values_list('id', flat=True)),
+                         {entry.id, unlinked.id})
+
+        VendorProduct.objects.filter(id=self.vendor_product.id).update(status='active')
+        self.assertEqual(storefront.rebuild(), (1, 0))
+        self.assertEqual(Product.objects.get(source_product=self.vendor_product).id, entry.id)
+
+
+class FragmentInvalidationTests(TestCase):
+    def setUp(self):
+        self.cache = caches[fragments.get_config()['CACHE']]
+        self.cache.clear()
+        self.vendor_product = make_vendor_product(make_vendor())
+        self.product = Product.objects.get(source_product=self.vendor_product)
+
+    def test_change_that_keeps_updated_at_drops_the_fragment(self):
+        key = fragments.fragment_key(fragments.PRODUCT_CARD, self.product)
+        self.cache.set(key, 'stale card')
+        self.product.name = 'Desk lamp'
+        self.product.save(update_fields=['name'])
+        self.assertIsNone(self.cache.get(key))
+
+    def test_delete_drops_the_fragment(self):
+        key = fragments.fragment_key(fragments.VENDOR_PRODUCT_CARD, self.vendor_product)
+        self.cache.set(key, 'stale card')
+        self.vendor_product.delete()
+        self.assertIsNone(self.cache.get(key))
+
+
+class FacetIndexTests(SimpleTestCase):
+    def _index(self, count):
+        index = facets.FacetIndex()
+        index.upsert((product_id, 1, 'Shop', 'retail', Decimal('10.00'), 5) for product_id in range(count))
+        return index
+
+    def test_query_ignores_upserts_made_while_it_runs(self):
+        index = self._index(10)
+        new_ids = iter(range(1000, 2000))
+
+        def popcount_with_concurrent_upsert(bitmap):
+            # Another thread lists a product of a new vendor mid-count
+            product_id = next(new_ids)
+            index.upsert([(product_id, product_id, 'New', 'retail', Decimal('10.00'), 5)])
+            return bitmap.bit_count()
+
+        with mock.patch.object(facets, '_popcount', popcount_with_concurrent_upsert):
+            _, counts = index.query({})
+        self.assertEqual(counts['vendor'], {1: 10})
+
+    def test_removed_positions_trigger_compaction(self):
+        index = self._index(facets.MIN_COMPACTION * 2 + 2)
+        index.remove(range(facets.MIN_COMPACTION))
+        self.assertFalse(index.needs_compaction())
+        index.remove([facets.MIN_COMPACTION, facets.MIN_COMPACTION + 1])
+        self.assertTrue(index.needs_compaction())
+
+    def test_page_ids_skip_positions_freed_after_the_query(self):
+        index = self._index(4)
+        matching, _ = index.query({})
+        index.remove([2])
+        self.assertEqual(index.page_ids(matching, 0, 10), [3, 1, 0])
+
+
+
+@override_settings(TABLE_VERSION_INTERVAL=0)
+class FacetCatchUpTests(TestCase):
+    def setUp(self):
+        facets._index = None
+        self.vendor = make_vendor()
+        self.lamp = Product.objects.get(source_product=make_vendor_product(self.vendor, price='100.00'))
+        self.chair = Product.objects.get(source_product=make_vendor_product(self.vendor, name='Chair'))
+
+    def _ids(self):
+        index = facets.get_index()
+        matching, counts = index.query({})
+        return set(index.page_ids(matching, 0, 100)), counts
+
+    def test_changes_made_by_another_process_are_caught_up(self):
+        index = facets.get_index()
+        # Saved elsewhere: no on_commit hook and no cache bump reach this process
+        Product.all_objects.filter(id=self.lamp.id).update(price=Decimal('700.00'), updated_at=timezone.now())
+        Product.all_objects.filter(id=self.chair.id).update(is_listed=False, updated_at=timezone.now())
+        ids, counts = self._ids()
+        self.assertIs(facets.get_index(), index)
+        self.assertEqual(ids, {self.lamp.id})
+        self.assertEqual(counts['price'], {'500-1000': 1})
+
+    def test_deleted_rows_force_a_rebuild(self):
+        index = facets.get_index()
+        self.chair.source_product.delete()
+        ids, _ = self._ids()
+        self.assertIsNot(facets.get_index(), index)
+        self.assertEqual(ids, {self.lamp.id})
+
+
+
+@override_settings(TABLE_VERSION_INTERVAL=0)
+class AutocompleteCatchUpTests(TestCase):
+    def setUp(self):
+        autocomplete._index = None
+        self.vendor = make_vendor()
+        self.lamp = Product.objects.get(source_product=make_vendor_product(self.vendor, name='Desk lamp'))
+
+    def _labels(self, text):
+        return [match['label'] for match in autocomplete.search(text)]
+
+    def test_changes_made_by_another_process_are_caught_up(self):
+        self.assertEqual(self._labels('desk'), ['Desk lamp'])
+        index = autocomplete.get_index()
+        Product.all_objects.filter(id=self.lamp.id).update(name='Floor lamp', updated_at=timezone.now())
+        self.assertEqual(self._labels('desk'), [])
+        self.assertEqual(self._labels('floor'), ['Floor lamp'])
+        self.assertIs(autocomplete.get_index(), index)
+
+        Product.all_objects.filter(id=self.lamp.id).update(is_listed=False, updated_at=timezone.now())
+        self.assertEqual(self._labels('floor'), [])
+        self.assertEqual(self._labels('vendor'), [])
+
+    @override_settings(AUTOCOMPLETE={'MAX_CATCH_UP_ROWS': 1})
+    def test_large_changes_rebuild(self):
+        index = autocomplete.get_index()
+        make_vendor_product(self.vendor, name='Chair')
+        make_vendor_product(self.vendor, name='Table')
+        self.assertEqual(self._labels('chair'), ['Chair'])
+        self.assertIsNot(autocomplete.get_index(), index)
+
+
+
+@override_settings(CATALOG_SNAPSHOT={'REBUILD_DELAY': 60})
+class SnapshotRebuildTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(snapshot, build=mock.DEFAULT, close_old_connections=mock.DEFAULT)
+        self.patched = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(snapshot.flush_pending_rebuild)
+
+    def test_pending_rebuild_runs_at_exit(self):
+        snapshot.schedule_rebuild()
+        snapshot.schedule_rebuild()
+        self.patched['build'].assert_not_called()
+        snapshot.flush_pending_rebuild()
+        self.patched['build'].assert_called_once_with()
+        self.assertIsNone(snapshot._rebuild_timer)
+
+    def test_finished_rebuild_is_not_repeated(self):
+        with override_settings(CATALOG_SNAPSHOT={'REBUILD_DELAY': 0}):
+            snapshot.schedule_rebuild()
+            snapshot._last_timer.join()
+        snapshot.flush_pending_rebuild()
+        self.patched['build'].assert_called_once_with()
+
+
+
+class PopularSortTests(TestCase):
+    def setUp(self):
+        facets._index = None
+        retail, wholesale = make_vendor('retail'), make_vendor('wholesale', business_type='wholesale')
+        for number, (vendor, price, quantity) in enumerate([
+                (retail, '99.00', 5), (retail, '500.00', 0), (retail, '4999.99', 3),
+                (wholesale, '5000.00', 1), (wholesale, '750.00', 0), (wholesale, '20.00', 9)]):
+            product = make_vendor_product(vendor, name=f"Item {number}", price=price)
+            Product.objects.filter(source_product=product).update(stock=quantity, popularity=number % 4)
+        self.vendors = (retail.id, wholesale.id)
+
+    def test_selection_filter_matches_the_bitmaps(self):
+        index = facets.FacetIndex()
+        index.upsert(facets._rows(Product.objects.order_by('id')))
+        selections = [
+            {},
+            {'vendor': {self.vendors[0]}},
+            {'business_type': {'wholesale'}, 'in_stock': {'yes'}},
+            {'price': {'500-1000', '5000+'}},
+            {'price': {'0-500'}, 'in_stock': {'no'}},
+            {'price': {'not-a-band'}},
+            {'in_stock': {'yes', 'no'}, 'vendor': set(self.vendors)},
+        ]
+        for selected in selections:
+            matching, _ = index.query(selected)
+            expected = set(index.page_ids(matching, 0, 100))
+            actual = set(Product.objects.filter(facets.selection_filter(selected)).values_list('id', flat=True))
+            self.assertEqual(actual, expected, selected)
+
+    def test_popular_page_is_filtered_and_ordered(self):
+        from .views import catalog_api
+
+        request = APIRequestFactory().get('/api/catalog/', {'sort': 'popular', 'in_stock': 'yes', 'page_size': 2})
+        force_authenticate(request, user=make_customer())
+        response = catalog_api(request)
+        in_stock = Product.objects.filter(Q(stock__isnull=True) | Q(stock__gt=0))
+        ranked = list(in_stock.order_by('-popularity', '-id').values_list('id', flat=True))
+        self.assertEqual([row['id'] for row in response.data['results']], ranked[:2])
+        self.assertEqual(response.data['count'], 4)
+
+
+
+class RecentlyViewedBufferTests(TransactionTestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.product = Product.objects.get(source_product=make_vendor_product(make_vendor()))
+        self.row = {'id': self.product.id, 'name': 'Lamp', 'price': '100.00', 'image': None, 'vendor_name': 'Shop'}
+        self.buffer = WriteBuffer(recently_viewed.write_views, batch_size=100, flush_interval=3600)
+        patcher = mock.patch.object(recently_viewed, '_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(recently_viewed.cache.delete, f"recently_viewed:{self.customer.pk}")
+
+    def test_views_are_written_with_their_popularity(self):
+        recently_viewed.record(self.row, self.customer)
+        recently_viewed.record(self.row, self.customer)
+        recently_viewed.record(self.row)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(ProductView.objects.filter(user=self.customer, product=self.product).count(), 1)
+        self.assertGreater(Product.objects.get(id=self.product.id).popularity, 0)
+
+    def test_failed_write_keeps_views_and_does_not_raise(self):
+        recently_viewed.record(self.row, self.customer)
+        with mock.patch.object(popularity, 'record_views', side_effect=RuntimeError("database is down")):
+            with self.assertLogs('shopsphere.buffers', 'ERROR'):
+                self.assertEqual(self.buffer.flush(), 0)
+        # The rows written before the failure were rolled back with it
+        self.assertFalse(ProductView.objects.exists())
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(ProductView.objects.count(), 1)
+
+
+def rule(rule_id, kind='percent', value='10.00', product_id=None, vendor_id=None, coupon_code='', min_quantity=1,
+         **fields):
+    return dict(id=rule_id, kind=kind, value=Decimal(value), product_id=product_id, vendor_id=vendor_id,
+                coupon_code=coupon_code, min_quantity=min_quantity, **fields)
+
+
+def reference_discount(rules, line, coupon):
+    """Best per-unit discount of one line, computed with Decimal"""
+    product_id, vendor_id, price, quantity = line
+    best = Decimal('0.00')
+    for candidate in rules:
+        if candidate['product_id'] is not None and candidate['product_id'] != product_id:
+            continue
+        if candidate['product_id'] is None and candidate['vendor_id'] not in (None, vendor_id):
+            continue
+        if quantity < candidate['min_quantity'] or candidate['coupon_code'] not in ('', coupon):
+            continue
+        if candidate['kind'] == 'percent':
+            discount = (price * candidate['value'] / 100).quantize(pricing.CENTS, rounding=ROUND_FLOOR)
+        else:
+            discount = min(candidate['value'], price)
+        best = max(best, discount)
+    return best
+
+
+class PricingEngineTests(SimpleTestCase):
+    def test_matches_decimal_arithmetic(self):
+        rng = random.Random(7)
+        rules = [
+            rule(1, value='12.50'),
+            rule(2, kind='amount', value='35.00', vendor_id=2),
+            rule(3, value='33.33', product_id=5, min_quantity=3),
+            rule(4, kind='amount', value='999.99', product_id=6, coupon_code='BIG'),
+        ]
+        engine = pricing.PricingEngine(rules)
+        for coupon in ('', 'BIG'):
+            lines = [
+                (rng.randint(1, 8), rng.randint(1, 3), Decimal(rng.randint(1, 500000)) / 100, rng.randint(1, 5))
+                for _ in range(200)
+            ]
+            result = engine.price(lines, coupon)
+            expected_total = Decimal('0.00')
+            for line, priced in zip(lines, result.lines):
+                unit_discount = reference_discount(rules, line, coupon)
+                self.assertEqual(priced.unit_discount, unit_discount, line)
+                self.assertEqual(priced.total, (line[2] - unit_discount) * line[3])
+                expected_total += priced.total
+            self.assertEqual(result.total, expected_total)
+            self.assertEqual(result.subtotal - result.discount, result.total)
+
+    def test_rule_windows(self):
+        now = timezone.now()
+        engine = pricing.PricingEngine([
+            rule(1, starts_at=now + timezone.timedelta(hours=1)),
+            rule(2, value='5.00', ends_at=now - timezone.timedelta(hours=1)),
+        ], now)
+        self.assertEqual(engine.price([(1, 1, Decimal('100.00'), 1)]).discount, Decimal('0.00'))
+        self.assertFalse(engine.is_stale(now))
+        self.assertTrue(engine.is_stale(now + timezone.timedelta(hours=1)))
+
+
+@override_settings(TABLE_VERSION_INTERVAL=0)
+class PricingInvalidationTests(TestCase):
+    def setUp(self):
+        self.vendor = make_vendor()
+        self.line = (1, self.vendor.id, Decimal('200.00'), 1)
+
+    def test_promotion_changed_by_another_process_is_picked_up(self):
+        promotion = Promotion.objects.create(name='Sale', value=Decimal('10.00'), vendor=self.vendor)
+        self.assertEqual(pricing.get_engine().price([self.line]).discount, Decimal('20.00'))
+
+        # No signal and no cache bump reach this process: only the row changes
+        Promotion.objects.filter(id=promotion.id).update(value=Decimal('25.00'), updated_at=timezone.now())
+        self.assertEqual(pricing.get_engine().price([self.line]).discount, Decimal('50.00'))
+
+        Promotion.objects.filter(id=promotion.id).delete()
+        self.assertEqual(pricing.get_engine().price([self.line]).discount, Decimal('0.00'))
+
+    def test_version_is_reread_only_after_the_interval(self):
+        Promotion.objects.create(name='Sale', value=Decimal('10.00'), vendor=self.vendor)
+        with override_settings(TABLE_VERSION_INTERVAL=60):
+            engine = pricing.get_engine()
+            Promotion.objects.update(value=Decimal('25.00'), updated_at=timezone.now())
+            with self.assertNumQueries(0):
+                self.assertIs(pricing.get_engine(), engine)
+
+
+class CouponLimitTests(TestCase):
+    def setUp(self):
+        self.coupon = Coupon.objects.create(code='SAVE', max_redemptions=3, shard_count=2)
+        self.customers = [make_customer(f"c{number}@example.com") for number in range(5)]
+
+    def test_limit_is_never_exceeded(self):
+        results = [coupons.redeem(self.coupon, customer) for customer in self.customers]
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual((coupons.redeemed_count(self.coupon), coupons.remaining(self.coupon)), (3, 0))
+
+    def test_reserve_reuses_the_active_reservation(self):
+        first = coupons.reserve(self.coupon, self.customers[0])
+        self.assertEqual(coupons.reserve(self.coupon, self.customers[0]).id, first.id)
+        self.assertEqual(coupons.redeemed_count(self.coupon), 1)
+
+    def test_expired_reservations_free_their_slots(self):
+        for customer in self.customers[:3]:
+            coupons.reserve(self.coupon, customer)
+        CouponReservation.objects.filter(user=self.customers[0]).update(
+            expires_at=timezone.now() - timezone.timedelta(seconds=1))
+        self.assertIsNotNone(coupons.reserve(self.coupon, self.customers[3]))
+        self.assertEqual(CouponReservation.objects.get(user=self.customers[0]).status, 'released')
+        self.assertEqual(coupons.redeemed_count(self.coupon), 3)
+
+    def test_release_skips_a_reservation_extended_after_it_was_read(self):
+        reservation = coupons.reserve(self.coupon, self.customers[0])
+        # release_expired read the row while it was expired; reserve() extended it since
+        self.assertFalse(coupons.release(reservation, expired_by=timezone.now()))
+        self.assertEqual(CouponReservation.objects.get(id=reservation.id).status, 'reserved')
+        self.assertEqual(coupons.redeemed_count(self.coupon), 1)
+
+    def test_redeem_reserves_again_when_its_reservation_is_released(self):
+        reserve = coupons.reserve
+
+        def reserve_then_lose_it(coupon, user):
+            reservation = reserve(coupon, user)
+            if not CouponReservation.objects.filter(status='released').exists():
+                coupons.release(reservation)
+            return reservation
+
+        with mock.patch.object(coupons, 'reserve', reserve_then_lose_it):
+            self.assertTrue(coupons.redeem(self.coupon, self.customers[0]))
+        statuses = sorted(CouponReservation.objects.values_list('status', flat=True))
+        self.assertEqual(statuses, ['redeemed', 'released'])
+        self.assertEqual(coupons.redeemed_count(self.coupon), 1)
+
+    def test_redeem_fails_when_the_released_slot_was_taken(self):
+        self.coupon.max_redemptions = 1
+        self.coupon.save()
+        reserve = coupons.reserve
+
+        def reserve_then_lose_it(coupon, user):
+            reservation = reserve(coupon, user)
+            if user == self.customers[0] and reservation is not None:
+                coupons.release(reservation)
+                reserve(coupon, self.customers[1])
+            return reservation
+
+        with mock.patch.object(coupons, 'reserve', reserve_then_lose_it):
+            self.assertFalse(coupons.redeem(self.coupon, self.customers[0]))
+        self.assertEqual(coupons.redeemed_count(self.coupon), 1)
+        self.assertFalse(CouponReservation.objects.filter(status='redeemed').exists())
+
+
+@override_settings(IDEMPOTENCY={'PURGE_INTERVAL': 10 ** 9, 'LOCK_TIMEOUT': 30, 'WAIT_TIMEOUT': 0.2})
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.calls = []
+        self.outcome = 201
+
+        @api_view(['POST'])
+        @idempotency.idempotent
+        def checkout(request):
+            self.calls.append(request.data)
+            if self.outcome is RuntimeError:
+                raise RuntimeError("payment gateway down")
+            return Response({'order': len(self.calls)}, status=self.outcome)
+
+        self.view = checkout
+
+    def _post(self, data=None, key='key-1'):
+        request = APIRequestFactory().post('/checkout/', data or {'amount': '10.00'}, format='json',
+                                           HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, user=self.customer)
+        return self.view(request)
+
+    def test_retry_replays_the_stored_response(self):
+        first, second = self._post(), self._post()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual((second.status_code, second.data), (201, {'order': 1}))
+        self.assertEqual(second[idempotency.REPLAY_HEADER], 'true')
+        self.assertNotIn(idempotency.REPLAY_HEADER, first)
+
+    def test_other_keys_and_requests_without_a_key_run(self):
+        self._post(key='key-1')
+        self._post(key='key-2')
+        request = APIRequestFactory().post('/checkout/', {}, format='json')
+        force_authenticate(request, user=self.customer)
+        self.view(request)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_key_reused_for_another_payload_is_rejected(self):
+        self._post()
+        self.assertEqual(self._post({'amount': '99.00'}).status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_server_errors_and_exceptions_release_the_key(self):
+        self.outcome = 503
+        self.assertEqual(self._post().status_code, 503)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.outcome = RuntimeError
+        with self.assertRaises(RuntimeError):
+            self._post()
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.outcome = 201
+        self.assertEqual(self._post().status_code, 201)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_request_waits_for_a_running_claim_then_gives_up(self):
+        self._post()
+        IdempotencyKey.objects.update(state='running')
+        self.assertEqual(self._post().status_code, 409)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_abandoned_claim_is_taken_over(self):
+        self._post()
+        IdempotencyKey.objects.update(state='running', created_at=timezone.now() - timezone.timedelta(minutes=5))
+        self.assertEqual(self._post().data, {'order': 2})
+        self.assertEqual(IdempotencyKey.objects.get().state, 'done')
+
+
+class WaitingRoomQueueTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.sale = waiting_room.Sale(id=1, product_id=7, rate=2.0, admission_seconds=600)
+        self.now = 1000.0
+        patcher = mock.patch.object(waiting_room.time, 'time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _queue(self, count):
+        cache.set(self.sale.key('tail'), count, None)
+        cache.set(self.sale.key('gate'), (0, self.now), None)
+
+    def test_gate_moves_at_the_sale_rate(self):
+        self._queue(10)
+        self.now += 0.4
+        self.assertEqual(waiting_room._advance(self.sale), 0)
+        self.now += 0.6
+        self.assertEqual(waiting_room._advance(self.sale), 2)
+        self.now += 1
+        self.assertEqual(waiting_room._advance(self.sale), 4)
+
+    def test_idle_credit_is_capped_and_head_stops_at_the_tail(self):
+        self._queue(10)
+        self.now += 3600
+        self.assertEqual(waiting_room._advance(self.sale), 2)
+        self.now += 3600
+        self.assertEqual(waiting_room._advance(self.sale), 4)
+        for _ in range(10):
+            self.now += 10
+            waiting_room._advance(self.sale)
+        self.assertEqual(waiting_room._advance(self.sale), 10)
+
+    def test_gate_is_not_moved_while_another_poller_holds_the_lock(self):
+        self._queue(10)
+        cache.add(self.sale.key('gate_lock'), 1, 1)
+        self.now += 0.9
+        self.assertEqual(waiting_room._advance(self.sale), 0)
+
+    def test_status_reports_the_position_then_admits(self):
+        self._queue(0)
+        first = waiting_room.status(self.sale, user_id=1)
+        second = waiting_room.status(self.sale, user_id=2)
+        self.assertEqual((first['admitted'], first['position']), (False, 1))
+        self.assertEqual((second['position'], second['estimated_wait']), (2, 1))
+
+        self.now += 1
+        admitted = waiting_room.status(self.sale, user_id=1)
+        self.assertTrue(admitted['admitted'])
+        self.assertEqual(admitted['expires_in'], 600)
+        self.assertTrue(waiting_room.check_pass(admitted['token'], self.sale, 1))
+        self.assertFalse(waiting_room.check_pass(admitted['token'], self.sale, 2))
+        # Polling again keeps the place in line
+        self.assertEqual(waiting_room.status(self.sale, user_id=2)['admitted'], True)
+        self.assertEqual(cache.get(self.sale.key('tail')), 2)
+
+    def test_used_up_admission_goes_to_the_back_of_the_line(self):
+        self._queue(0)
+        waiting_room.status(self.sale, user_id=1)
+        self.now += 1
+        token = waiting_room.status(self.sale, user_id=1)['token']
+        # Twenty more buyers join while the first one shops
+        cache.incr(self.sale.key('tail'), 20)
+
+        self.now += 600
+        self.assertFalse(waiting_room.check_pass(token, self.sale, 1))
+        again = waiting_room.status(self.sale, user_id=1)
+        self.assertFalse(again['admitted'])
+        self.assertEqual(cache.get(self.sale.key('user:1'))['ticket'], 22)
+
+
+class AdmissionRequiredTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = make_customer()
+        self.product = Product.objects.get(source_product=make_vendor_product(make_vendor()))
+        self.other = Product.objects.get(source_product=make_vendor_product(make_vendor('other'), name='Desk'))
+        self.flash_sale = FlashSale.objects.create(product=self.product, admission_minutes=10)
+        waiting_room.invalidate()
+
+        @api_view(['POST'])
+        @waiting_room.admission_required(lambda request, product_id: [product_id])
+        def add(request, product_id):
+            return Response({'added': product_id})
+
+        self.view = add
+
+    def _post(self, product_id, user=None, accept='application/json', **headers):
+        request = APIRequestFactory().post('/cart/', HTTP_ACCEPT=accept, **headers)
+        force_authenticate(request, user=user or self.customer)
+        return self.view(request, product_id)
+
+    def test_buyer_without_a_pass_is_sent_to_the_queue(self):
+        response = self._post(self.product.id)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.data['queue'], f"/flash/{self.product.id}/queue")
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(self._post(self.product.id, accept='text/html').status_code, 302)
+
+    def test_pass_in_header_or_cookie_is_accepted(self):
+        sale = waiting_room.sale_for(self.product.id)
+        token = waiting_room.make_pass(sale, self.customer.pk, waiting_room.time.time())
+        self.assertEqual(self._post(self.product.id, HTTP_ADMISSION_TOKEN=f"junk, {token}").status_code, 200)
+
+        request = APIRequestFactory().post('/cart/', HTTP_ACCEPT='application/json')
+        request.COOKIES[waiting_room.cookie_name(self.product.id)] = token
+        force_authenticate(request, user=self.customer)
+        self.assertEqual(self.view(request, self.product.id).status_code, 200)
+
+        # Passes are per user
+        other = make_customer('other@example.com')
+        self.assertEqual(self._post(self.product.id, user=other, HTTP_ADMISSION_TOKEN=token).status_code, 429)
+
+    def test_products_without_a_live_sale_are_not_gated(self):
+        self.assertEqual(self._post(self.other.id).status_code, 200)
+        FlashSale.objects.filter(id=self.flash_sale.id).update(
+            starts_at=timezone.now() + timezone.timedelta(hours=1), updated_at=timezone.now())
+        waiting_room.invalidate()
+        self.assertEqual(self._post(self.product.id).status_code, 200)
+
+    def test_sale_changed_by_another_process_is_picked_up(self):
+        self.assertEqual(self._post(self.product.id).status_code, 429)
+        # No signal and no cache bump reach this process: only the row changes
+        with override_settings(TABLE_VERSION_INTERVAL=0):
+            FlashSale.objects.filter(id=self.flash_sale.id).update(is_active=False, updated_at=timezone.now())
+            self.assertEqual(self._post(self.product.id).status_code, 200)
+
+    def test_active_sale_on_a_per_process_cache_fails_the_checks(self):
+        with override_settings(DEBUG=False):
+            self.assertEqual([error.id for error in checks.check_flash_sale_cache(None)], ['user.E001'])
+        FlashSale.objects.update(is_active=False)
+        self.assertEqual(checks.check_flash_sale_cache(None), [])
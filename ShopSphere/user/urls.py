@@ -7,12 +7,20 @@ urlpatterns = [
     path('register/', views.register_api, name='register'),
     path('login', views.login_api, name='login'),
     path('home', views.home_api, name='home'),
+    path('catalog', views.catalog_api, name='catalog'),
+    path('autocomplete', views.autocomplete_api, name='autocomplete'),
     path('logout', views.logout_api, name='logout'),
+    path('products/<int:product_id>', views.product_detail, name='product_detail'),
+    path('recently_viewed', views.recently_viewed_api, name='recently_viewed'),
+    path('products/<int:product_id>/recommendations', views.product_recommendations, name='product_recommendations'),
     path('add_to_cart/<int:product_id>', views.add_to_cart, name='add_to_cart'),
+    path('flash/<int:product_id>/queue', views.flash_queue, name='flash_queue'),
     path('cart', views.cart_view, name='cart'),
+    path('cart/coupon', views.apply_coupon, name='apply_coupon'),
     path('checkout', views.checkout_view, name='checkout'),
     path('process_payment', views.process_payment, name='process_payment'),
     path('my_orders/', views.my_orders, name='my_orders'),
+    path('my_orders/events', views.order_events, name='order_events'),
     path('address/', views.address_page, name="address_page"),
     path('delete-address/<int:id>/', views.delete_address, name="delete_address"),
 ]
\ No newline at end of file
@@ -1,11 +1,24 @@
+import json
+import uuid
+
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
 from rest_framework_simplejwt.tokens import RefreshToken
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import authenticate, login ,logout
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import AuthUser, Product, Cart, CartItem, Order, OrderItem
+from .models import AuthUser, Product, Cart, CartItem, Order, OrderItem, Address
 from .serializers import RegisterSerializer, ProductSerializer, CartSerializer, OrderSerializer
+from ShopSphere.projections import ValuesProjection
+from superAdmin import outbox
+from . import autocomplete, coupons, events, facets, pricing, recently_viewed, recommendations, snapshot, waiting_room
+from .idempotency import idempotent
 
 
 # 🔹 REGISTER
@@ -62,12 +75,17 @@ def login_api(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def home_api(request):
+    # Storefront read model: every row is sellable, no moderation filters needed
     products = Product.objects.all()
     
     # API / JSON Response
     if 'application/json' in request.headers.get('Accept', ''):
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        # Shared memory-mapped snapshot: the body is already rendered
+        catalog = snapshot.get_snapshot()
+        if catalog is not None:
+            return HttpResponse(catalog.home_json(), content_type='application/json')
+        # values() fast path: same shape as ProductSerializer, no model instances
+        return Response(ValuesProjection(ProductSerializer).serialize(products))
         
     # HTML Response
     cart_count = 0
@@ -85,16 +103,130 @@ def home_api(request):
         "user": request.user
     })
 
+# 🔹 PRODUCT DETAIL
+@api_view(['GET'])
+def product_detail(request, product_id):
+    catalog = snapshot.get_snapshot()
+    if catalog is not None:
+        body = catalog.product_json(product_id)
+        if body is not None:
+            recently_viewed.record(json.loads(bytes(body)), request.user)
+            return HttpResponse(body, content_type='application/json')
+    rows = ValuesProjection(ProductSerializer).serialize(Product.objects.filter(id=product_id))
+    if not rows:
+        return Response({"error": "Product not found"}, status=404)
+    recently_viewed.record(rows[0], request.user)
+    return Response(rows[0])
+
+
+# 🔹 RECENTLY VIEWED
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def recently_viewed_api(request):
+    """The customer's last viewed products, most recent first; served from the cache alone"""
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), recently_viewed.get_config()['RING_SIZE'])
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=400)
+    return Response(recently_viewed.recent_for(request.user.pk, limit))
+
+
+# 🔹 AUTOCOMPLETE
+@api_view(['GET'])
+def autocomplete_api(request):
+    """?q=iph&limit=8 -> product and shop suggestions from the in-process prefix index"""
+    try:
+        limit = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=400)
+    return Response(autocomplete.search(request.query_params.get('q', ''), limit))
+
+
+# 🔹 CATALOG (faceted browsing)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def catalog_api(request):
+    """
+    Filter by ?vendor=1,2&business_type=retail&price=0-500&in_stock=yes
+    (comma separated values are OR-ed, facets are AND-ed). Counts and the
+    page come from the in-memory facet bitmaps; the only query loads the
+    rows of the requested page. ?sort=popular reads the page from the
+    popularity index instead, with the same filters applied in SQL.
+    """
+    selected = {}
+    for facet in facets.FACETS:
+        raw = request.query_params.get(facet, '')
+        values = {value.strip() for value in raw.split(',') if value.strip()}
+        if facet == 'vendor':
+            values = {int(value) for value in values if value.isdigit()}
+        selected[facet] = values
+
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = min(max(int(request.query_params.get('page_size', 20)), 1), 100)
+    except ValueError:
+        return Response({"error": "page and page_size must be integers"}, status=400)
+
+    index = facets.get_index()
+    matching, counts = index.query(selected)
+    if request.query_params.get('sort') == 'popular':
+        ids = _popular_page_ids(selected, (page - 1) * page_size, page_size)
+    else:
+        ids = index.page_ids(matching, (page - 1) * page_size, page_size)
+
+    rows = ValuesProjection(ProductSerializer).serialize(Product.objects.filter(id__in=ids))
+    by_id = {row['id']: row for row in rows}
+
+    labels = {'vendor': index.vendor_names}
+    facet_payload = {
+        facet: [
+            {
+                'value': value,
+                'label': labels.get(facet, {}).get(value, value),
+                'count': count,
+                'selected': value in selected[facet],
+            }
+            for value, count in sorted(counts[facet].items(), key=lambda item: -item[1])
+        ]
+        for facet in facets.FACETS
+    }
+
+    return Response({
+        'count': matching.bit_count(),
+        'page': page,
+        'page_size': page_size,
+        'results': [by_id[product_id] for product_id in ids if product_id in by_id],
+        'facets': facet_payload,
+    })
+
+
+def _popular_page_ids(selected, offset, limit):
+    """Most popular products matching the facet selection, read in (popularity, id) index order"""
+    ranked = Product.objects.filter(facets.selection_filter(selected)).order_by('-popularity', '-id')
+    return list(ranked.values_list('id', flat=True)[offset:offset + limit])
+
+
 # 🔹 ADD TO CART
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@waiting_room.admission_required(lambda request, product_id: [product_id])
+@idempotent
 def add_to_cart(request, product_id):
+    # Storefront row: only sellable products exist, stock is already denormalised
     product = get_object_or_404(Product, id=product_id)
     cart, created = Cart.objects.get_or_create(user=request.user)
     
-    cart_item, item_created = CartItem.objects.get_or_create(cart=cart, product=product)
+    cart_item = CartItem.objects.filter(cart=cart, product=product).first()
+    in_cart = cart_item.quantity if cart_item else 0
+    
+    if product.stock is not None and in_cart >= product.stock:
+        if 'application/json' in request.headers.get('Accept', ''):
+            return Response({"error": "Not enough stock", "available": product.stock}, status=400)
+        return redirect('home')
     
-    if not item_created:
+    if cart_item is None:
+        CartItem.objects.create(cart=cart, product=product)
+    else:
         cart_item.quantity += 1
         cart_item.save()
     
@@ -104,56 +236,155 @@ def add_to_cart(request, product_id):
     return redirect('home')
 
 
+# 🔹 FLASH SALE QUEUE
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def flash_queue(request, product_id):
+    """Join or poll the waiting room of a flash-sale product"""
+    sale = waiting_room.sale_for(product_id)
+    if sale is None:
+        if 'application/json' in request.headers.get('Accept', ''):
+            return Response({"admitted": True, "flash_sale": False})
+        return redirect('add_to_cart', product_id=product_id)
+
+    state = waiting_room.status(sale, request.user.pk)
+    if 'application/json' in request.headers.get('Accept', ''):
+        response = Response(state)
+        if not state['admitted']:
+            response['Retry-After'] = str(state['retry_after'])
+    elif state['admitted']:
+        response = redirect('add_to_cart', product_id=product_id)
+    else:
+        response = render(request, "waiting_room.html", {"product_id": product_id, **state})
+    if state['admitted']:
+        response.set_cookie(waiting_room.cookie_name(product_id), state['token'],
+                            max_age=state['expires_in'], httponly=True, samesite='Lax')
+    return response
+
+
+# 🔹 FREQUENTLY BOUGHT TOGETHER
+@api_view(['GET'])
+def product_recommendations(request, product_id):
+    ids = recommendations.similar_ids(product_id, _recommendation_count(request))
+    return Response(_products_in_order(ids))
+
+
+def _recommendation_count(request):
+    try:
+        return min(max(int(request.query_params.get('limit', 8)), 1), recommendations.get_config()['TOP_K'])
+    except ValueError:
+        return 8
+
+
+def _products_in_order(ids):
+    """Storefront rows for ``ids``, keeping their order and skipping ones no longer listed"""
+    rows = ValuesProjection(ProductSerializer).serialize(Product.objects.filter(id__in=ids))
+    by_id = {row['id']: row for row in rows}
+    return [by_id[product_id] for product_id in ids if product_id in by_id]
+
+
 # 🔹 VIEW CART
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def cart_view(request):
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all()
     
     if 'application/json' in request.headers.get('Accept', ''):
         serializer = CartSerializer(cart)
         return Response(serializer.data)
         
-    total_price = sum(item.total_price() for item in cart_items)
+    cart_items, priced = pricing.price_cart(cart)
+    for item, line in zip(cart_items, priced.lines):
+        item.line = line
+    suggested = recommendations.basket_ids([item.product_id for item in cart_items], 4)
     
     return render(request, "cart.html", {
+        "recommendations": _products_in_order(suggested),
         "cart_items": cart_items, 
-        "total_cart_price": total_price
+        "subtotal": priced.subtotal,
+        "discount": priced.discount,
+        "coupon_code": priced.coupon if priced.coupon_valid else '',
+        "total_cart_price": priced.total
     })
 
 
+# 🔹 APPLY / REMOVE COUPON
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def apply_coupon(request):
+    code = (request.data.get('coupon_code') or '').strip().upper()
+    if code and not pricing.get_engine().coupon_exists(code):
+        if 'application/json' in request.headers.get('Accept', ''):
+            return Response({"error": "Invalid or expired coupon"}, status=400)
+        return redirect('cart')
+
+    limited = coupons.get_coupon(code)
+    if limited is not None and coupons.remaining(limited) == 0:
+        if 'application/json' in request.headers.get('Accept', ''):
+            return Response({"error": "Coupon sold out"}, status=409)
+        return redirect('cart')
+
+    cart, created = Cart.objects.get_or_create(user=request.user)
+    cart.coupon_code = code
+    cart.save(update_fields=['coupon_code'])
+
+    if 'application/json' in request.headers.get('Accept', ''):
+        return Response(CartSerializer(cart).data)
+    return redirect('cart')
+
+
 # 🔹 CHECKOUT
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def checkout_view(request):
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all()
+    cart_items, priced = pricing.price_cart(cart)
     
     if not cart_items:
         if 'application/json' in request.headers.get('Accept', ''):
              return Response({"message": "Cart is empty"}, status=400)
         return redirect('cart')
+
+    # Hold a slot of a limited coupon until payment; drop the coupon when none are left
+    coupon_error = ''
+    limited = coupons.get_coupon(priced.coupon) if priced.coupon_valid else None
+    if limited is not None and coupons.reserve(limited, request.user) is None:
+        cart.coupon_code = ''
+        cart.save(update_fields=['coupon_code'])
+        cart_items, priced = pricing.price_cart(cart)
+        coupon_error = "Coupon sold out"
         
-    total_price = sum(item.total_price() for item in cart_items)
     items_count = sum(item.quantity for item in cart_items)
     
     if 'application/json' in request.headers.get('Accept', ''):
         return Response({
-            "total_price": total_price,
+            "subtotal": priced.subtotal,
+            "discount": priced.discount,
+            "total_price": priced.total,
             "items_count": items_count,
+            "coupon_error": coupon_error,
             "cart_items": CartSerializer(cart).data
         })
     
     return render(request, "checkout.html", {
-        "total_price": total_price,
-        "items_count": items_count
+        "subtotal": priced.subtotal,
+        "discount": priced.discount,
+        "total_price": priced.total,
+        "items_count": items_count,
+        "coupon_error": coupon_error
     })
 
 
 # 🔹 PROCESS PAYMENT
+def _cart_product_ids(request):
+    return CartItem.objects.filter(cart__user=request.user).values_list('product_id', flat=True)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@waiting_room.admission_required(_cart_product_ids)
+@idempotent
+@transaction.atomic
 def process_payment(request):
     payment_mode = request.data.get('payment_mode')
     transaction_id = request.data.get('transaction_id')
@@ -164,10 +395,20 @@ def process_payment(request):
             return Response({"error": "Payment mode required"}, status=400)
         return redirect('checkout')
 
+    # Delivery address: explicit address_id, otherwise the customer's latest address
+    addresses = Address.objects.filter(user=request.user)
+    address_id = request.data.get('address_id')
+    delivery_address = (addresses.filter(id=address_id) if address_id else addresses.order_by('-id')).first()
+    
     created_orders = []
+    checkout_id = uuid.uuid4()
     
     # CASE 1: Items are passed directly in the request (Frontend Redux state)
     if items_from_request:
+        # Link lines that carry a storefront product id, for recommendations
+        product_ids = {item_data.get('product_id') or item_data.get('id') for item_data in items_from_request}
+        known = set(Product.objects.filter(id__in=[pid for pid in product_ids if isinstance(pid, int)])
+                    .values_list('id', flat=True))
         for item_data in items_from_request:
             name = item_data.get('name')
             quantity = item_data.get('quantity', 1)
@@ -179,11 +420,15 @@ def process_payment(request):
                 user=request.user,
                 payment_mode=payment_mode,
                 transaction_id=transaction_id,
-                item_names=item_name_str
+                item_names=item_name_str,
+                delivery_address=delivery_address,
+                checkout_id=checkout_id
             )
             
+            product_id = item_data.get('product_id') or item_data.get('id')
             OrderItem.objects.create(
                 order=order,
+                product_id=product_id if product_id in known else None,
                 product_name=name,
                 quantity=quantity,
                 price=price
@@ -201,7 +446,7 @@ def process_payment(request):
     else:
         try:
             cart = Cart.objects.get(user=request.user)
-            cart_items = cart.items.all()
+            cart_items, priced = pricing.price_cart(cart)
         except Cart.DoesNotExist:
             if 'application/json' in request.headers.get('Accept', ''):
                  return Response({"error": "Cart not found and no items provided"}, status=404)
@@ -211,26 +456,43 @@ def process_payment(request):
             if 'application/json' in request.headers.get('Accept', ''):
                  return Response({"error": "Cart is empty"}, status=400)
             return redirect('home')
+
+        # Redeem before any order is written; the slot commits with the orders
+        limited = coupons.get_coupon(priced.coupon) if priced.coupon_valid and priced.discount else None
+        if limited is not None and not coupons.redeem(limited, request.user):
+            if 'application/json' in request.headers.get('Accept', ''):
+                return Response({"error": "Coupon sold out"}, status=409)
+            return redirect('cart')
         
-        for item in cart_items:
+        for item, line in zip(cart_items, priced.lines):
             item_name_str = f"{item.quantity} x {item.product.name}"
             
             order = Order.objects.create(
                 user=request.user,
                 payment_mode=payment_mode,
                 transaction_id=transaction_id,
-                item_names=item_name_str
+                item_names=item_name_str,
+                delivery_address=delivery_address,
+                checkout_id=checkout_id
             )
             
             OrderItem.objects.create(
                 order=order,
+                product=item.product,
                 product_name=item.product.name,
                 quantity=item.quantity,
-                price=item.product.price
+                price=line.unit_price - line.unit_discount
             )
             created_orders.append(order)
             item.delete()
 
+        if cart.coupon_code:
+            cart.coupon_code = ''
+            cart.save(update_fields=['coupon_code'])
+
+    if created_orders:
+        outbox.emit(outbox.ORDER_PLACED, user_id=request.user.id, order_ids=[order.id for order in created_orders])
+
     if 'application/json' in request.headers.get('Accept', ''):
         return Response({
             "success": True, 
@@ -254,6 +516,37 @@ def my_orders(request):
     return render(request, "my_orders.html", {"orders": orders})
 
 
+# 🔹 ORDER STATUS STREAM (server-sent events, serve through ShopSphere.asgi)
+async def order_events(request):
+    user = await _stream_user(request)
+    if user is None:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    response = StreamingHttpResponse(
+        events.stream(user.id, request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _stream_user(request):
+    """Session user, or a JWT from the Authorization header / ?token= (EventSource cannot set headers)"""
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+    jwt = JWTAuthentication()
+    raw = request.GET.get('token') or jwt.get_raw_token(jwt.get_header(request) or b'')
+
+    def validate():
+        try:
+            return jwt.get_user(jwt.get_validated_token(raw))
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+    return await sync_to_async(validate)() if raw else None
+
+
 # 🔹 LOGOUT
 @api_view(['POST', 'GET'])
 @permission_classes([IsAuthenticated])
@@ -0,0 +1,278 @@
+"""
+Virtual waiting room for flash-sale products.
+
+While a FlashSale is live, add-to-cart and payment for its product only go
+through for buyers holding an admission pass. Everyone else is sent to the
+queue endpoint, which hands out FIFO tickets from a cache counter and lets
+them in at ``admit_per_minute``:
+
+* ``tail`` - last ticket handed out (``cache.incr``);
+* ``gate`` - (head, at): tickets <= head are admitted. The head is advanced
+  lazily by whoever polls, under a short cache lock, like a token bucket
+  whose idle credit is capped at one second of admissions.
+
+An admitted buyer gets a signed pass (product, user, admission time) that
+is checked without touching the cache or the database, so the hot path of
+an admitted checkout costs an HMAC. Passes are valid for
+``admission_minutes``; after that the buyer has to queue again.
+
+Only buyers of the flash-sale product ever wait or hit the queue keys, so
+the rest of the catalog keeps its normal latency. The sale table itself is
+cached per process and reloaded when the cache version is bumped or the
+flash_sales table changes (ShopSphere/versions.py). The queue counters live
+in the default cache, so it must be shared (Redis, Memcached) when more than
+one process serves the site; user/checks.py reports a FlashSale running on
+a per-process cache.
+"""
+
+import functools
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.response import Response
+
+from ShopSphere.versions import TableVersion
+from .models import FlashSale
+
+
+DEFAULTS = {
+    'PASS_HEADER': 'Admission-Token',
+    'POLL_SECONDS': 2,
+    'TICKET_TTL': 60 * 60,
+}
+
+VERSION_KEY = 'flash_sales:version'
+SALT = 'user.waiting_room'
+
+
+def get_config():
+    """Return FLASH_SALES settings merged over the defaults"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'FLASH_SALES', {}))
+    return config
+
+
+@dataclass(frozen=True)
+class Sale:
+    id: int
+    product_id: int
+    rate: float                 # admissions per second
+    admission_seconds: int
+    starts_at: datetime = None
+    ends_at: datetime = None
+
+    def is_live(self, now):
+        return (self.starts_at is None or self.starts_at <= now) and (self.ends_at is None or self.ends_at > now)
+
+    def key(self, name):
+        return f"flash:{self.id}:{name}"
+
+
+# ============================================================================
+# PROCESS-WIDE SALE TABLE
+# ============================================================================
+
+_sales = None
+_sales_version = None
+_sales_lock = threading.Lock()
+_table_version = TableVersion(lambda: FlashSale.objects.all())
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version, _table_version.get()
+
+
+def get_sales():
+    """product id -> Sale for every active flash sale, reloaded when one changes"""
+    global _sales, _sales_version
+    version = _current_version()
+    if _sales is None or _sales_version != version:
+        with _sales_lock:
+            if _sales is None or _sales_version != version:
+                rows = FlashSale.objects.filter(is_active=True).values(
+                    'id', 'product_id', 'admit_per_minute', 'admission_minutes', 'starts_at', 'ends_at')
+                _sales = {
+                    row['product_id']: Sale(
+                        id=row['id'],
+                        product_id=row['product_id'],
+                        rate=max(row['admit_per_minute'], 1) / 60,
+                        admission_seconds=row['admission_minutes'] * 60,
+                        starts_at=row['starts_at'],
+                        ends_at=row['ends_at'],
+                    )
+                    for row in rows
+                }
+                _sales_version = version
+    return _sales
+
+
+def invalidate():
+    """Make every process reload the sale table on its next request"""
+    global _sales
+    _sales = None
+    _table_version.expire()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
+
+
+def sale_for(product_id, now=None):
+    """The live flash sale of a storefront product, or None"""
+    sale = get_sales().get(product_id)
+    if sale is None or not sale.is_live(now or timezone.now()):
+        return None
+    return sale
+
+
+# ============================================================================
+# QUEUE
+# ============================================================================
+
+def _advance(sale):
+    """Move the gate forward for the time elapsed since the last move; returns the head"""
+    head, at = cache.get(sale.key('gate'), (0, 0.0))
+    tail = cache.get(sale.key('tail'), 0)
+    if head >= tail or not cache.add(sale.key('gate_lock'), 1, 1):
+        return head
+    try:
+        head, at = cache.get(sale.key('gate'), (0, 0.0))
+        now = time.time()
+        at = max(at, now - 1.0)
+        moved = min(int((now - at) * sale.rate), tail - head)
+        if moved > 0:
+            head += moved
+            at += moved / sale.rate
+            cache.set(sale.key('gate'), (head, at), None)
+        return head
+    finally:
+        cache.delete(sale.key('gate_lock'))
+
+
+def _ticket(sale, user_id, ttl):
+    """The user's place in line; joining again keeps the same ticket"""
+    user_key = sale.key(f"user:{user_id}")
+    entry = cache.get(user_key)
+    if entry is None:
+        cache.add(sale.key('tail'), 0, None)
+        entry = {'ticket': cache.incr(sale.key('tail')), 'admitted_at': None}
+        cache.set(user_key, entry, ttl)
+    return user_key, entry
+
+
+def make_pass(sale, user_id, admitted_at):
+    return signing.dumps({'s': sale.id, 'p': sale.product_id, 'u': user_id, 'a': admitted_at}, salt=SALT)
+
+
+def check_pass(token, sale, user_id, now=None):
+    try:
+        data = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        return False
+    return (data.get('s') == sale.id and data.get('p') == sale.product_id and data.get('u') == user_id
+            and (now or time.time()) - data.get('a', 0) < sale.admission_seconds)
+
+
+def status(sale, user_id):
+    """
+    Join the queue (or look up the existing ticket) and report. Returns a
+    dict with ``admitted`` and either ``token``/``expires_in`` or
+    ``position``/``retry_after``.
+    """
+    config = get_config()
+    now = time.time()
+    user_key, entry = _ticket(sale, user_id, max(config['TICKET_TTL'], sale.admission_seconds))
+    if entry['admitted_at'] is not None and now - entry['admitted_at'] >= sale.admission_seconds:
+        # Shopping window used up: back of the line
+        cache.delete(user_key)
+        user_key, entry = _ticket(sale, user_id, max(config['TICKET_TTL'], sale.admission_seconds))
+
+    if entry['admitted_at'] is None:
+        head = _advance(sale)
+        if entry['ticket'] > head:
+            position = entry['ticket'] - head
+            return {
+                'admitted': False,
+                'position': position,
+                'retry_after': max(config['POLL_SECONDS'], 1),
+                'estimated_wait': int(position / sale.rate),
+            }
+        entry['admitted_at'] = now
+        cache.set(user_key, entry, max(config['TICKET_TTL'], sale.admission_seconds))
+
+    return {
+        'admitted': True,
+        'token': make_pass(sale, user_id, entry['admitted_at']),
+        'expires_in': int(entry['admitted_at'] + sale.admission_seconds - now),
+    }
+
+
+# ============================================================================
+# VIEW GATE
+# ============================================================================
+
+def cookie_name(product_id):
+    return f"flash_pass_{product_id}"
+
+
+def _passes(request, config):
+    tokens = [token.strip() for token in request.headers.get(config['PASS_HEADER'], '').split(',')]
+    return [token for token in tokens if token]
+
+
+def blocked_sale(request, product_ids):
+    """First live sale among ``product_ids`` the request has no valid pass for"""
+    sales = get_sales()
+    if not sales:
+        return None
+    now = timezone.now()
+    config = get_config()
+    header_tokens = None
+    for product_id in product_ids:
+        sale = sales.get(product_id)
+        if sale is None or not sale.is_live(now):
+            continue
+        if header_tokens is None:
+            header_tokens = _passes(request, config)
+        tokens = header_tokens + [request.COOKIES.get(cookie_name(product_id), '')]
+        if not any(check_pass(token, sale, request.user.pk) for token in tokens if token):
+            return sale
+    return None
+
+
+def admission_required(product_ids_of):
+    """
+    Send buyers without a pass for a live flash sale to the queue.
+    ``product_ids_of(request, *args, **kwargs)`` names the storefront
+    products the request touches; it is only called while a sale exists.
+    Place it above @idempotent so a queued attempt is not stored as the
+    key's answer.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if get_sales() and request.user.is_authenticated:
+                sale = blocked_sale(request, product_ids_of(request, *args, **kwargs))
+                if sale is not None:
+                    queue_url = reverse('flash_queue', args=[sale.product_id])
+                    if 'application/json' in request.headers.get('Accept', ''):
+                        response = Response({"error": "This product is in a flash sale, join the queue",
+                                             "queue": queue_url}, status=429)
+                        response['Retry-After'] = str(get_config()['POLL_SECONDS'])
+                        return response
+                    return redirect(queue_url)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator